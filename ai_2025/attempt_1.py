@@ -1,4 +1,6 @@
-from common import *
+from loguru import logger
+
+from ai_2025.common import call_ai_model, prompt_for_json
 
 if __name__ == '__main__':
     prompt = prompt_for_json('What is the capital of Myanmar?', required_key='capital')
@@ -0,0 +1,240 @@
+"""
+Large batch jobs: automatic splitting, concurrent submission, merging and failed-only resubmission.
+
+The input JSONL is split into parts within the provider limits (`MAX_REQUESTS` lines, `MAX_BYTES` bytes per file),
+the parts are uploaded and started concurrently and followed by a `BatchPoller`. When all are done, requests that
+failed (error file, non-200 responses) or never ran (expired/cancelled batches) are collected and only those are
+submitted again, up to `max_rounds` times. Finally all outputs are merged into one file, in input `custom_id` order.
+
+Job progress is kept in `<work_dir>/job.json`, so an interrupted job continues with the batches already submitted;
+each batch id is saved as soon as the batch is created, and a resumed job creates only the missing ones.
+
+    merged = asyncio.run(ChunkedBatchJob('big_eval.jsonl', model='gpt-simple').run())
+"""
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from loguru import logger
+from pydantic import BaseModel
+
+from ai_2025.batch_poller import BatchPoller
+from ai_2025.batch_results import BatchResult, BatchResultsFile
+from ai_2025.common import AI_MODELS, model_async_client
+from ai_2025.uploads import default_uploads
+
+MAX_REQUESTS = 50_000  # per batch input file (openai)
+MAX_BYTES = 200 * 2 ** 20  # per batch input file (openai)
+
+
+def _custom_id(line: bytes) -> str:
+    return json.loads(line)['custom_id']
+
+
+def iter_lines(path: str | Path) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield line if line.endswith(b'\n') else line + b'\n'
+
+
+def split_requests(lines: Iterable[bytes], out_dir: str | Path, prefix: str = 'part',
+                   max_requests: int = MAX_REQUESTS, max_bytes: int = MAX_BYTES) -> list[Path]:
+    """
+    Streams JSONL request lines into as few part files as the limits allow.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    parts, f, n, size = [], None, 0, 0
+    try:
+        for line in lines:
+            if len(line) > max_bytes:
+                raise ValueError(f'request {_custom_id(line)} alone exceeds {max_bytes} bytes')
+            if f is None or n == max_requests or size + len(line) > max_bytes:
+                if f is not None:
+                    f.close()
+                parts.append(out_dir / f'{prefix}-{len(parts):04d}.jsonl')
+                f, n, size = open(parts[-1], 'wb'), 0, 0
+            f.write(line)
+            n += 1
+            size += len(line)
+    finally:
+        if f is not None:
+            f.close()
+    return parts
+
+
+class JobRound(BaseModel):
+    parts: list[str]
+    batches: dict[str, str] = {}  # part -> batch id, saved as soon as the batch is created
+
+    @property
+    def batch_ids(self) -> list[str]:
+        return [self.batches[p] for p in self.parts if p in self.batches]
+
+
+class JobState(BaseModel):
+    input_file: str
+    model: str
+    rounds: list[JobRound] = []
+
+
+class ChunkedBatchJob:
+    def __init__(self, input_file: str | Path, model: str = 'gpt-simple', work_dir: str | Path = None,
+                 max_requests: int = MAX_REQUESTS, max_bytes: int = MAX_BYTES, max_parallel: int = 4,
+                 max_rounds: int = 3, endpoint: str = '/v1/chat/completions'):
+        """
+        :param input_file: batch input JSONL with unique `custom_id`s
+        :param model: key of AI_MODELS (decides the client/account)
+        :param work_dir: parts, state and downloads; defaults to `<input_file>.job/`
+        :param max_parallel: concurrent uploads / batch creations
+        :param max_rounds: submission rounds including the first one
+        :param endpoint: url of the requests in the input file
+        """
+        self.input_file = Path(input_file)
+        self.model = model
+        self.work_dir = Path(work_dir) if work_dir else self.input_file.with_name(self.input_file.name + '.job')
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.max_parallel = max_parallel
+        self.max_rounds = max_rounds
+        self.endpoint = endpoint
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.state = self._load()
+        self.poller = BatchPoller(state_file=self.work_dir / 'batches.json', download_dir=self.work_dir)
+
+    # STATE
+
+    def _state_file(self) -> Path:
+        return self.work_dir / 'job.json'
+
+    def _load(self) -> JobState:
+        if self._state_file().exists():
+            return JobState.model_validate_json(self._state_file().read_text())
+        return JobState(input_file=str(self.input_file), model=self.model)
+
+    def _save(self) -> None:
+        tmp = self._state_file().with_suffix('.tmp')
+        tmp.write_text(self.state.model_dump_json(indent=2))
+        os.replace(tmp, self._state_file())
+
+    # SUBMISSION
+
+    async def _submit_part(self, r: JobRound, part: str, semaphore: asyncio.Semaphore) -> None:
+        client = model_async_client(AI_MODELS[self.model])
+        async with semaphore:
+            uploaded = await default_uploads().aupload(client, part, purpose='batch')
+            batch = await client.batches.create(input_file_id=uploaded.id, endpoint=self.endpoint,
+                                                completion_window='24h',
+                                                metadata={'description': f'{self.input_file.name} {Path(part).name}'})
+        r.batches[part] = batch.id  # recorded at once: an interrupted job must not create it again
+        self._save()
+        self.poller.track(batch.id, model=self.model, description=self.input_file.name)
+        logger.info(f'{part} -> {batch.id}')
+
+    async def _submit_round(self, r: JobRound) -> None:
+        """
+        Submits the parts without a batch yet; all of them are tried before the first error is raised.
+        """
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        res = await asyncio.gather(*(self._submit_part(r, p, semaphore) for p in r.parts if p not in r.batches),
+                                   return_exceptions=True)
+        if errors := [e for e in res if isinstance(e, Exception)]:
+            raise errors[0]
+
+    # RESULTS
+
+    def _round_results(self, r: JobRound) -> list[BatchResultsFile]:
+        files = []
+        for batch_id in r.batch_ids:
+            b = self.poller.batches[batch_id]
+            files += [BatchResultsFile(p) for p in (b.output_path, b.error_path) if p]
+        return files
+
+    @staticmethod
+    def _lookup(files: list[BatchResultsFile], custom_id: str) -> BatchResult | None:
+        found = None
+        for f in files:
+            if (r := f.get(custom_id)) is not None:
+                if r.ok:
+                    return r
+                found = r
+        return found
+
+    def _failed_ids(self, r: JobRound) -> set[str]:
+        files = self._round_results(r)
+        try:
+            failed = set()
+            for part in r.parts:
+                for line in iter_lines(part):
+                    cid = _custom_id(line)
+                    res = self._lookup(files, cid)
+                    if res is None or not res.ok:
+                        failed.add(cid)
+            return failed
+        finally:
+            for f in files:
+                f.close()
+
+    def merge(self, path: str | Path = None) -> Path:
+        """
+        Writes one output file in input order; for each request the latest successful result wins.
+        """
+        path = Path(path) if path else self.work_dir / 'merged.jsonl'
+        rounds = [self._round_results(r) for r in reversed(self.state.rounds)]  # newest first
+        missing = 0
+        try:
+            with open(path, 'w', encoding='utf-8') as out:
+                for line in iter_lines(self.input_file):
+                    cid = _custom_id(line)
+                    best = None
+                    for files in rounds:
+                        res = self._lookup(files, cid)
+                        if res is not None and (res.ok or best is None):
+                            best = res
+                        if best is not None and best.ok:
+                            break
+                    if best is None:
+                        missing += 1
+                        continue
+                    out.write(best.model_dump_json() + '\n')
+        finally:
+            for files in rounds:
+                for f in files:
+                    f.close()
+        logger.info(f'merged results into {path} ({missing} requests without any result)')
+        return path
+
+    # RUN
+
+    async def run(self) -> Path:
+        if not self.state.rounds:
+            parts = split_requests(iter_lines(self.input_file), self.work_dir, 'round0',
+                                   self.max_requests, self.max_bytes)
+            self.state.rounds.append(JobRound(parts=[str(p) for p in parts]))
+            self._save()
+            logger.info(f'{self.input_file} split into {len(parts)} parts')
+
+        while True:
+            r = self.state.rounds[-1]
+            await self._submit_round(r)
+            await self.poller.run()
+            failed = self._failed_ids(r)
+            n_round = len(self.state.rounds)
+            if not failed or n_round >= self.max_rounds:
+                if failed:
+                    logger.warning(f'{len(failed)} requests still failing after {n_round} rounds')
+                break
+            logger.warning(f'resubmitting {len(failed)} failed/expired requests (round {n_round})')
+            retry_lines = (line for part in r.parts for line in iter_lines(part) if _custom_id(line) in failed)
+            parts = split_requests(retry_lines, self.work_dir, f'round{n_round}', self.max_requests, self.max_bytes)
+            self.state.rounds.append(JobRound(parts=[str(p) for p in parts]))
+            self._save()
+
+        return self.merge()
+
+
+if __name__ == '__main__':
+    asyncio.run(ChunkedBatchJob('q1.jsonl', model='gpt-simple').run())
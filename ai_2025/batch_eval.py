@@ -0,0 +1,134 @@
+"""
+Running a challenge suite through the Batch API (about half the price of synchronous calls).
+
+suite -> batch JSONL (`prompt_for_json` messages, challenge id as `custom_id`) -> upload + create batch -> wait ->
+output JSONL -> `parse_structured` -> `AiChallengeScore` per challenge id. Requests carry the same `response_format`
+as synchronous calls of the model, and costs count cached input tokens.
+
+`submit_suite` only creates the batch; to follow it with the poller, `BatchPoller().track` it.
+
+Works with openai provider only (others have other batch api).
+"""
+import json
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from loguru import logger
+from openai.types import Batch
+
+from ai_2025.ai_challenge import AiChallengeScore
+from ai_2025.batch_results import BatchResult, BatchResultsFile, download_file
+from ai_2025.common import AI_MODELS, CallCost, model_client, prompt_for_json
+from ai_2025.simple_batch_request import create_batch, upload_input_file, wait_for_batch
+from ai_2025.structured import StructureError, parse_structured, response_format
+from ai_2025.suite import ChallengeData, Suite
+
+CHAT_COMPLETIONS_URL = '/v1/chat/completions'
+
+
+def batch_request(ch: ChallengeData, model: str, required_key: str = 'answer') -> dict:
+    """
+    One line of the batch input file for `AI_MODELS[model]`.
+    """
+    config = AI_MODELS[model]
+    body = {"model": config.model_name, "messages": prompt_for_json(ch.prompt, required_key=required_key)}
+    if rf := response_format(config.json_mode, config.json_schema, None):
+        body["response_format"] = rf
+    return {
+        "custom_id": ch.id,
+        "method": "POST",
+        "url": CHAT_COMPLETIONS_URL,
+        "body": body,
+    }
+
+
+def compile_batch(challenges: Iterable[ChallengeData], model: str, path: str | Path) -> int:
+    """
+    Writes the batch input file for running `challenges` on `AI_MODELS[model]`.
+    :return: number of requests written
+    """
+    seen = set()
+    with open(path, 'w', encoding='utf-8') as f:
+        for ch in challenges:
+            if not ch.id or ch.id in seen:
+                raise ValueError(f'batch challenges need unique, non-empty ids (got {ch.id!r})')
+            seen.add(ch.id)
+            f.write(json.dumps(batch_request(ch, model), ensure_ascii=False) + '\n')
+    logger.info(f'compiled {len(seen)} requests into {path}')
+    return len(seen)
+
+
+def submit_suite(challenges: Iterable[ChallengeData], model: str = 'gpt-simple',
+                 path: str | Path = 'suite_batch.jsonl') -> Batch:
+    """
+    Compiles, uploads and creates the batch; tracking it (e.g. `BatchPoller().track`) is up to the caller.
+    """
+    compile_batch(challenges, model, path)
+    client = model_client(AI_MODELS[model])
+    input_file = upload_input_file(client, str(path))
+    batch = create_batch(client, input_file.id, description=f'challenge suite on {model}')
+    logger.info(f'batch processing started, id={batch.id}')
+    return batch
+
+
+def score_record(record: BatchResult, ch: ChallengeData,
+                 required_key: str = 'answer') -> tuple[AiChallengeScore, CallCost | None]:
+    """
+    Scores one line of the batch output file against its challenge.
+    """
+    if not record.ok:
+        logger.error(f'{ch.id}: request failed: {record.error or record.response}')
+        return AiChallengeScore(score=0, format_error=0, transport_error=1), None
+
+    cost = CallCost.from_batch_usage(record.response.body.get('usage'))
+    try:
+        answer = parse_structured(record.content(), required_key)
+    except StructureError as e:
+        logger.error(f'{ch.id}: {e}')
+        return AiChallengeScore(score=0, format_error=1), cost
+    return AiChallengeScore(score=1 if ch.is_correct(answer) else 0, format_error=0), cost
+
+
+def score_output(records: Iterable[BatchResult],
+                 challenges: Iterable[ChallengeData]) -> Iterator[tuple[str, AiChallengeScore, CallCost | None]]:
+    """
+    Yields (challenge id, score, cost) for every output record whose `custom_id` is one of `challenges`.
+    """
+    by_id = {ch.id: ch for ch in challenges}
+    for record in records:
+        ch = by_id.get(record.custom_id)
+        if ch is None:
+            logger.warning(f'unknown custom_id {record.custom_id} in batch output')
+            continue
+        score, cost = score_record(record, ch)
+        yield ch.id, score, cost
+
+
+def run_suite_batch(suite: Suite, model: str = 'gpt-simple', batch_id: str = None) -> dict[str, AiChallengeScore]:
+    """
+    Submits the suite as one batch (or resumes waiting for `batch_id`), waits for it, and scores the output.
+    """
+    client = model_client(AI_MODELS[model])
+    if batch_id is None:
+        batch_id = submit_suite(suite, model).id
+    batch = wait_for_batch(client, batch_id)
+
+    results, costs = {}, []
+    if batch.output_file_id:
+        with BatchResultsFile(download_file(client, batch.output_file_id)) as output:
+            for cid, score, cost in score_output(output, suite):
+                logger.info(f'{cid:<24} {score}')
+                results[cid] = score
+                if cost:
+                    costs.append(cost)
+    if batch.error_file_id:
+        with BatchResultsFile(download_file(client, batch.error_file_id)) as errors:
+            for record in errors:
+                results[record.custom_id] = AiChallengeScore(score=0, format_error=0, transport_error=1)
+    correct = sum(s.score for s in results.values())
+    logger.warning(f'{model}: {correct}/{len(results)} correct, cost: {CallCost.total(costs)}')
+    return results
+
+
+if __name__ == '__main__':
+    run_suite_batch(Suite(), model='gpt-simple')
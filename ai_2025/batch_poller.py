@@ -0,0 +1,193 @@
+"""
+Tracking many batches at once from a local state file.
+
+Every tracked batch is stored in a json state file (`batch_state.json`), so a restarted process picks up where the
+previous one stopped - batch ids no longer have to be pasted into comments. Each batch is polled on its own schedule:
+the interval follows the observed `request_counts` progress (check again around when the batch should be done,
+bounded by `min_interval`/`max_interval`), grows while nothing moves, and never overshoots `expires_at`.
+As soon as a batch reaches a terminal state its output and error files are downloaded.
+
+    poller = BatchPoller()
+    poller.track(batch.id, model='gpt-simple')
+    asyncio.run(poller.run())
+"""
+import asyncio
+import inspect
+import json
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+from loguru import logger
+from pydantic import BaseModel
+
+from ai_2025.batch_results import BATCH_DIR, download_file
+from ai_2025.common import AI_MODELS, model_async_client, model_client
+
+if TYPE_CHECKING:
+    from openai.types import Batch
+
+STATE_FILE = Path('batch_state.json')
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class TrackedBatch(BaseModel):
+    batch_id: str
+    model: str  # key of AI_MODELS, decides which client/account is used
+    status: str = 'unknown'
+    description: str = ''
+    expires_at: float | None = None
+    started_at: float | None = None  # in_progress_at (or created_at) reported by the provider
+    completed: int = 0
+    failed: int = 0
+    total: int = 0
+    last_checked: float = 0.0
+    last_progress_at: float = 0.0  # when completed+failed last changed
+    interval: float = 0.0  # last polling interval used
+    next_check: float = 0.0
+    output_file_id: str | None = None
+    error_file_id: str | None = None
+    output_path: str | None = None
+    error_path: str | None = None
+    done: bool = False  # terminal and downloaded
+
+    def update(self, batch: 'Batch', now: float) -> None:
+        counts = batch.request_counts
+        if counts is not None:
+            if counts.completed + counts.failed != self.completed + self.failed:
+                self.last_progress_at = now
+            self.completed, self.failed, self.total = counts.completed, counts.failed, counts.total
+        self.status = batch.status
+        self.expires_at = batch.expires_at
+        self.started_at = float(batch.in_progress_at or batch.created_at)
+        self.output_file_id = batch.output_file_id
+        self.error_file_id = batch.error_file_id
+        self.last_checked = now
+
+
+class BatchPoller:
+    def __init__(self, state_file: str | Path = STATE_FILE, download_dir: str | Path = BATCH_DIR,
+                 on_complete: Callable[[TrackedBatch], Awaitable[None] | None] = None,
+                 min_interval: float = 10.0, max_interval: float = 1800.0):
+        """
+        :param on_complete: called (or awaited) once per batch, after its files are downloaded
+        :param min_interval: shortest polling interval (seconds)
+        :param max_interval: longest polling interval (seconds)
+        """
+        self.state_file = Path(state_file)
+        self.download_dir = Path(download_dir)
+        self.on_complete = on_complete
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.batches: dict[str, TrackedBatch] = self._load()
+
+    # STATE
+
+    def _load(self) -> dict[str, TrackedBatch]:
+        if not self.state_file.exists():
+            return {}
+        data = json.loads(self.state_file.read_text())
+        return {k: TrackedBatch.model_validate(v) for k, v in data.items()}
+
+    def save(self) -> None:
+        tmp = self.state_file.with_suffix('.tmp')
+        tmp.write_text(json.dumps({k: v.model_dump() for k, v in self.batches.items()}, indent=2))
+        os.replace(tmp, self.state_file)
+
+    def track(self, batch_id: str, model: str = 'gpt-simple', description: str = '') -> TrackedBatch:
+        if batch_id not in self.batches:
+            self.batches[batch_id] = TrackedBatch(batch_id=batch_id, model=model, description=description)
+            self.save()
+            logger.info(f'tracking batch {batch_id} ({model})')
+        return self.batches[batch_id]
+
+    def pending(self) -> list[TrackedBatch]:
+        return [b for b in self.batches.values() if not b.done]
+
+    # SCHEDULE
+
+    def next_interval(self, b: TrackedBatch, now: float) -> float:
+        if b.status == 'finalizing':
+            interval = self.min_interval
+        elif b.total and b.completed + b.failed > 0 and b.last_progress_at > 0:
+            # half of the estimated remaining time at the average rate observed so far
+            elapsed = max(1.0, b.last_progress_at - (b.started_at or b.last_progress_at))
+            rate = (b.completed + b.failed) / elapsed
+            interval = (b.total - b.completed - b.failed) / rate / 2
+            if now - b.last_progress_at > interval:  # stalled since last progress
+                interval = max(interval, b.interval * 2)
+        else:
+            interval = b.interval * 2 if b.interval else self.min_interval * 3
+        interval = min(self.max_interval, max(self.min_interval, interval))
+        if b.expires_at and b.expires_at > now:
+            interval = min(interval, max(self.min_interval, b.expires_at - now + 5))
+        return interval
+
+    # POLLING
+
+    async def _download(self, b: TrackedBatch) -> None:
+        client = model_client(AI_MODELS[b.model])
+        if b.output_file_id and not b.output_path:
+            path = await asyncio.to_thread(download_file, client, b.output_file_id,
+                                           self.download_dir / f'{b.batch_id}.output.jsonl')
+            b.output_path = str(path)
+        if b.error_file_id and not b.error_path:
+            path = await asyncio.to_thread(download_file, client, b.error_file_id,
+                                           self.download_dir / f'{b.batch_id}.errors.jsonl')
+            b.error_path = str(path)
+
+    def _retry_later(self, b: TrackedBatch, what: str, e: Exception) -> None:
+        b.interval = min(self.max_interval, max(self.min_interval, b.interval * 2))
+        b.next_check = time.time() + b.interval
+        logger.warning(f'{b.batch_id}: {what} failed ({e}), retrying in {b.interval:.0f}s')
+
+    async def _follow(self, b: TrackedBatch) -> None:
+        client = model_async_client(AI_MODELS[b.model])
+        while not b.done:
+            if (wait := b.next_check - time.time()) > 0:
+                await asyncio.sleep(wait)
+            try:
+                batch = await client.batches.retrieve(b.batch_id)
+            except Exception as e:
+                self._retry_later(b, 'status check', e)
+                continue
+            now = time.time()
+            b.update(batch, now)
+            if b.status in TERMINAL_STATUSES:
+                try:
+                    await self._download(b)
+                except Exception as e:
+                    self._retry_later(b, 'download', e)
+                    self.save()
+                    continue
+                b.done = True
+                self.save()
+                logger.warning(f'{b.batch_id}: {b.status}, {b.completed}/{b.total} ok, {b.failed} failed')
+                if self.on_complete is not None:
+                    res = self.on_complete(b)
+                    if inspect.isawaitable(res):
+                        await res
+                return
+            b.interval = self.next_interval(b, now)
+            b.next_check = now + b.interval
+            self.save()
+            logger.info(f'{b.batch_id}: {b.status} {b.completed + b.failed}/{b.total}, next check in {b.interval:.0f}s')
+
+    async def run(self) -> list[TrackedBatch]:
+        """
+        Follows all unfinished batches until every one of them is done; batches tracked while running are not picked up.
+        A batch whose following fails (e.g. in `on_complete`) is logged and doesn't stop the others.
+        :return: the batches finished in this run
+        """
+        todo = self.pending()
+        logger.info(f'following {len(todo)} batches')
+        results = await asyncio.gather(*(self._follow(b) for b in todo), return_exceptions=True)
+        for b, res in zip(todo, results):
+            if isinstance(res, Exception):
+                logger.opt(exception=res).error(f'{b.batch_id}: following failed')
+        return [b for b in todo if b.done]
+
+
+if __name__ == '__main__':
+    asyncio.run(BatchPoller().run())
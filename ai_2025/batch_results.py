@@ -0,0 +1,168 @@
+"""
+Batch output files: streamed download and memory-mapped, line-at-a-time reading.
+
+The output of a batch is JSONL (one result per line) and can be gigabytes long, so it is never held in memory:
+`download_file` streams it to disk in chunks and `BatchResultsFile` maps it and parses one line at a time.
+`BatchResultsFile.get(custom_id)` looks results up through a byte-offset index built in one pass.
+"""
+import json
+import mmap
+import os
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
+
+from loguru import logger
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletion
+
+BATCH_DIR = Path('batch_results')
+
+_CUSTOM_ID = re.compile(rb'"custom_id"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+# MODEL
+
+
+class BatchResponse(BaseModel):
+    status_code: int
+    request_id: str | None = None
+    body: dict
+
+
+class BatchError(BaseModel):
+    code: str | None = None
+    message: str | None = None
+
+
+class BatchResult(BaseModel):
+    id: str | None = None
+    custom_id: str
+    response: BatchResponse | None = None
+    error: BatchError | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.response is not None and self.response.status_code == 200
+
+    def chat_completion(self) -> 'ChatCompletion | None':
+        from openai.types.chat import ChatCompletion
+
+        return ChatCompletion.model_validate(self.response.body) if self.ok else None
+
+    def content(self) -> str | None:
+        """
+        Text of the first choice of a successful /v1/chat/completions result.
+        """
+        return self.response.body['choices'][0]['message']['content'] if self.ok else None
+
+    def output_text(self) -> str | None:
+        """
+        Text output of a successful /v1/responses result.
+        """
+        if not self.ok:
+            return None
+        return ''.join(c.get('text', '') for item in self.response.body.get('output', [])
+                       if item.get('type') == 'message' for c in item.get('content', [])
+                       if c.get('type') == 'output_text')
+
+
+# DOWNLOAD
+
+
+def download_file(client, file_id: str, path: str | Path = None, chunk_size: int = 2 ** 20) -> Path:
+    """
+    Streams a remote file (e.g. `Batch.output_file_id`) to disk without loading it into memory.
+    :param path: defaults to `BATCH_DIR/<file_id>.jsonl`; an already complete download is reused
+    """
+    path = Path(path) if path is not None else BATCH_DIR / f'{file_id}.jsonl'
+    if path.exists():
+        logger.debug(f'{file_id} already downloaded to {path}')
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + '.part')
+    n = 0
+    with client.files.with_streaming_response.content(file_id) as response, open(tmp, 'wb') as f:
+        for chunk in response.iter_bytes(chunk_size):
+            f.write(chunk)
+            n += len(chunk)
+    os.replace(tmp, path)
+    logger.info(f'downloaded {file_id} ({n} bytes) to {path}')
+    return path
+
+
+# READER
+
+
+class BatchResultsFile:
+    """
+    Memory-mapped batch output (or error) file.
+
+        with BatchResultsFile(download_file(client, batch.output_file_id)) as results:
+            for r in results:
+                ...
+            results.get('request-7')
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._index: dict[str, int] | None = None
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _lines(self) -> Iterator[tuple[int, bytes]]:
+        mm = self._mm
+        if mm is None:
+            return
+        pos, end = 0, len(mm)
+        while pos < end:
+            nl = mm.find(b'\n', pos)
+            stop = end if nl == -1 else nl
+            line = mm[pos:stop]
+            if line.strip():
+                yield pos, line
+            pos = stop + 1
+
+    def __iter__(self) -> Iterator[BatchResult]:
+        for _, line in self._lines():
+            yield BatchResult.model_validate_json(line)
+
+    def index(self) -> dict[str, int]:
+        """
+        custom_id -> byte offset of its line; built on first use.
+        """
+        if self._index is None:
+            index = {}
+            for pos, line in self._lines():
+                m = _CUSTOM_ID.search(line)
+                cid = json.loads(b'"' + m.group(1) + b'"') if m else json.loads(line)['custom_id']
+                index[cid] = pos
+            self._index = index
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self.index())
+
+    def __contains__(self, custom_id: str) -> bool:
+        return custom_id in self.index()
+
+    def get(self, custom_id: str) -> BatchResult | None:
+        pos = self.index().get(custom_id)
+        if pos is None:
+            return None
+        nl = self._mm.find(b'\n', pos)
+        return BatchResult.model_validate_json(self._mm[pos:nl if nl != -1 else len(self._mm)])
@@ -0,0 +1,174 @@
+"""
+Latency / throughput benchmark of `AI_MODELS` entries (or of the local stand-in).
+
+Runs a fixed suite against the chosen models, `repeat` times, with bounded concurrency per model, and reports per
+model: p50/p95/p99 of latency and time to first byte, tokens per second, throughput, retries and errors. Results are
+stored as json; `--compare` prints the change against an earlier result file.
+
+    python -m ai_2025.benchmark --models gemini-simple grok-simple gpt-simple --out bench.json
+    python -m ai_2025.benchmark --models gpt-simple --standin lognormal:0.8:0.4 --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from loguru import logger
+from pydantic import BaseModel
+
+from ai_2025.common import CallCost, call_ai_model_async, prompt_for_json
+from ai_2025.suite import DEFAULT_SUITE, ChallengeData, Suite
+
+
+class ModelBenchmark(BaseModel):
+    model: str
+    calls: int = 0
+    errors: int = 0
+    wall_time: float = 0.0
+    throughput: float = 0.0  # successful calls per second of wall time
+    latency_p50: float | None = None
+    latency_p95: float | None = None
+    latency_p99: float | None = None
+    ttfb_p50: float | None = None
+    ttfb_p95: float | None = None
+    ttfb_p99: float | None = None
+    queue_time_mean: float | None = None
+    tokens_per_second_mean: float | None = None
+    retries: int = 0
+    prompt_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class BenchmarkRun(BaseModel):
+    started_at: str
+    suite: str
+    repeat: int
+    concurrency: int
+    standin: str | None = None
+    models: dict[str, ModelBenchmark]
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """
+    Linear-interpolated percentile, `q` in [0, 100].
+    """
+    if not values:
+        return None
+    xs = sorted(values)
+    k = (len(xs) - 1) * q / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    return xs[lo] + (xs[hi] - xs[lo]) * (k - lo)
+
+
+def _mean(values: list[float]) -> float | None:
+    return sum(values) / len(values) if values else None
+
+
+def summarize(model: str, costs: list[CallCost], errors: int, wall_time: float) -> ModelBenchmark:
+    timings = [c.timing for c in costs if c.timing is not None]
+    latencies = [t.latency for t in timings]
+    ttfbs = [t.ttfb for t in timings if t.ttfb is not None]
+    return ModelBenchmark(
+        model=model, calls=len(costs) + errors, errors=errors, wall_time=wall_time,
+        throughput=len(costs) / wall_time if wall_time > 0 else 0.0,
+        latency_p50=percentile(latencies, 50), latency_p95=percentile(latencies, 95),
+        latency_p99=percentile(latencies, 99),
+        ttfb_p50=percentile(ttfbs, 50), ttfb_p95=percentile(ttfbs, 95), ttfb_p99=percentile(ttfbs, 99),
+        queue_time_mean=_mean([t.queue_time for t in timings]),
+        tokens_per_second_mean=_mean([t.tokens_per_second for t in timings if t.tokens_per_second is not None]),
+        retries=sum(t.retries for t in timings),
+        prompt_tokens=sum(c.prompt_tokens for c in costs),
+        cached_prompt_tokens=sum(c.cached_prompt_tokens for c in costs),
+        completion_tokens=sum(c.completion_tokens for c in costs),
+    )
+
+
+async def bench_model(model: str, challenges: list[ChallengeData], repeat: int, concurrency: int) -> ModelBenchmark:
+    semaphore = asyncio.Semaphore(concurrency)
+    costs, errors = [], 0
+
+    async def one(ch: ChallengeData):
+        nonlocal errors
+        async with semaphore:
+            try:
+                _, cost = await call_ai_model_async(model, prompt_for_json(ch.prompt, required_key='answer'),
+                                                    required_key='answer', cache_mode='bypass')
+                costs.append(cost)
+            except Exception as e:
+                logger.warning(f'{model}: {type(e).__name__}: {e}')
+                errors += 1
+
+    st = time.perf_counter()
+    await asyncio.gather(*(one(ch) for _ in range(repeat) for ch in challenges))
+    return summarize(model, costs, errors, time.perf_counter() - st)
+
+
+async def run_benchmark(models: list[str], suite: Suite, repeat: int = 3, concurrency: int = 4,
+                        standin: str = None) -> BenchmarkRun:
+    challenges = list(suite)  # a benchmark suite is small and must be identical for every model
+    started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    results = await asyncio.gather(*(bench_model(m, challenges, repeat, concurrency) for m in models))
+    return BenchmarkRun(started_at=started_at, suite=str(suite.path), repeat=repeat, concurrency=concurrency,
+                        standin=standin, models={r.model: r for r in results})
+
+
+def _fmt(x: float | None, unit: str = 's') -> str:
+    return '-' if x is None else f'{x:.3f}{unit}'
+
+
+def report(run: BenchmarkRun, previous: BenchmarkRun = None) -> str:
+    lines = [f'{"model":<16}{"calls":>6}{"err":>5}{"p50":>10}{"p95":>10}{"p99":>10}{"ttfb50":>10}{"tok/s":>9}'
+             f'{"calls/s":>9}{"retries":>8}']
+    for m, r in run.models.items():
+        lines.append(f'{m:<16}{r.calls:>6}{r.errors:>5}{_fmt(r.latency_p50):>10}{_fmt(r.latency_p95):>10}'
+                     f'{_fmt(r.latency_p99):>10}{_fmt(r.ttfb_p50):>10}{_fmt(r.tokens_per_second_mean, ""):>9}'
+                     f'{r.throughput:>9.2f}{r.retries:>8}')
+        if previous is not None and (p := previous.models.get(m)) is not None:
+            for field in ('latency_p50', 'latency_p95', 'latency_p99'):
+                new, old = getattr(r, field), getattr(p, field)
+                if new is not None and old:
+                    change = (new - old) / old * 100
+                    flag = '  <-- regression' if change > 10 else ''
+                    lines.append(f'{"":<16}{field}: {_fmt(old)} -> {_fmt(new)} ({change:+.1f}%){flag}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='latency / throughput benchmark of AI_MODELS entries')
+    parser.add_argument('--models', nargs='+', default=['gemini-simple', 'grok-simple', 'gpt-simple'])
+    parser.add_argument('--suite', default=str(DEFAULT_SUITE))
+    parser.add_argument('--tags', nargs='*', default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=4, help='requests in flight per model')
+    parser.add_argument('--standin', default=None, metavar='LATENCY',
+                        help='run against a local stand-in with this latency spec, e.g. lognormal:0.8:0.4')
+    parser.add_argument('--out', default=None, help='write results json here')
+    parser.add_argument('--compare', default=None, help='earlier results json to compare with')
+    args = parser.parse_args()
+
+    server = None
+    if args.standin:
+        from ai_2025.standin_server import Latency, StandinConfig, serve_in_background, use_standin
+
+        server, base_url = serve_in_background(StandinConfig(latency=Latency.parse(args.standin),
+                                                             suite=args.suite, seed=0))
+        use_standin(base_url, args.models)
+
+    run = asyncio.run(run_benchmark(args.models, Suite(args.suite, tags=args.tags), repeat=args.repeat,
+                                    concurrency=args.concurrency, standin=args.standin))
+    if server is not None:
+        server.shutdown()
+
+    previous = BenchmarkRun.model_validate_json(Path(args.compare).read_text()) if args.compare else None
+    print(report(run, previous))
+    if args.out:
+        Path(args.out).write_text(run.model_dump_json(indent=2))
+        logger.info(f'results written to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
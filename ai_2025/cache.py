@@ -0,0 +1,134 @@
+"""
+Content-addressed on-disk cache of model responses.
+
+Entries are keyed by sha256 of (model_name, messages, request params) and stored one json file per entry under
+`<directory>/<2 hex chars>/<hash>.json`. Eviction is by age (`max_age`) and by total size (`max_bytes`, oldest
+entries go first).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Literal
+
+from loguru import logger
+from pydantic import BaseModel
+
+CacheMode = Literal['use', 'bypass', 'refresh']  # read+write / ignore cache / skip read, overwrite entry
+
+
+class CacheEntry(BaseModel):
+    key: str
+    model_name: str
+    content: str
+    cost: dict  # CallCost of the original call
+    created_at: float
+
+
+class ResponseCache:
+    def __init__(self, directory: str | Path = '.ai_cache', max_bytes: int = 256 * 2 ** 20,
+                 max_age: float = 30 * 24 * 3600):
+        """
+        :param directory: where the entries live; created if missing
+        :param max_bytes: total size above which the oldest entries are evicted
+        :param max_age: entries older than that (seconds) are treated as missing and removed
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._size: int | None = None  # computed lazily, then tracked on put
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_name: str, messages: list[dict], params: dict = None) -> str:
+        payload = json.dumps([model_name, messages, params or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f'{key}.json'
+
+    def get(self, key: str) -> CacheEntry | None:
+        path = self._path(key)
+        try:
+            entry = CacheEntry.model_validate_json(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.warning(f'dropping corrupted cache entry {path}')
+            self._remove(path)
+            return None
+        if time.time() - entry.created_at > self.max_age:
+            self._remove(path)
+            return None
+        return entry
+
+    def put(self, entry: CacheEntry) -> None:
+        path = self._path(entry.key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = entry.model_dump_json().encode('utf-8')
+        tmp = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp.write_bytes(data)
+        with self._lock:  # replaced under the lock, so an overwritten entry (refresh, racing writers) is counted once
+            try:
+                old = path.stat().st_size
+            except FileNotFoundError:
+                old = 0
+            os.replace(tmp, path)  # atomic; concurrent writers of the same key just race to identical content
+            if self._size is not None:
+                self._size += len(data) - old
+        if self.size() > self.max_bytes:
+            self.evict()
+
+    def size(self) -> int:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(p.stat().st_size for p in self._entries())
+            return self._size
+
+    def _entries(self):
+        return self.directory.glob('??/*.json') if self.directory.exists() else iter(())
+
+    def _remove(self, path: Path) -> None:
+        with self._lock:
+            try:
+                n = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                return
+            if self._size is not None:
+                self._size -= n
+
+    def evict(self) -> int:
+        """
+        Removes expired entries, then the oldest ones until the cache fits in 90% of `max_bytes`.
+        :return: number of removed entries
+        """
+        now = time.time()
+        files = []
+        for p in self._entries():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        files.sort()
+        total = sum(f[1] for f in files)
+        removed = 0
+        for mtime, size, p in files:
+            if now - mtime <= self.max_age and total <= 0.9 * self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        with self._lock:
+            self._size = total
+        logger.debug(f'cache eviction removed {removed} entries, {total} bytes left')
+        return removed
+
+    def clear(self) -> None:
+        for p in list(self._entries()):
+            p.unlink(missing_ok=True)
+        with self._lock:
+            self._size = 0
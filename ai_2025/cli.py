@@ -0,0 +1,245 @@
+"""
+Command line entry point of the workflows: `ai2025 <command>` (installed with the package) or `python -m ai_2025.cli`.
+
+    ai2025 ask 'What is the capital of Myanmar?' --model sonar --key capital
+    ai2025 challenge gpt-simple gemini-simple --tags networking --budget 1
+    ai2025 batch submit --model gpt-simple        # the default suite, compiled into a batch
+    ai2025 batch submit q1.jsonl                  # a ready batch input file
+    ai2025 batch status                           # tracked batches, from the local state file (no network)
+    ai2025 batch poll                             # follow them until done, outputs go to batch_results/
+    ai2025 batch fetch batch_abc123
+    ai2025 extract invoices/ --out invoices.db
+    ai2025 startup                                # startup time of the CLI and import time of the modules
+
+Only argparse is imported up front and every command imports what it needs when it runs; the provider SDK is loaded
+with the first client. `--help`, argument errors and `batch status` return at once, so the CLI can be called from
+cron or a shell loop without paying for imports it doesn't use.
+"""
+import argparse
+import sys
+
+STARTUP_MODULES = ['ai_2025.cli', 'ai_2025.common', 'ai_2025.ai_challenge', 'ai_2025.batch_poller', 'ai_2025.runner',
+                   'ai_2025.invoices', 'openai']
+
+
+# COMMANDS
+
+
+def _ask(args) -> None:
+    import json
+
+    from loguru import logger
+
+    from ai_2025.common import call_ai_model, prompt_for_json
+
+    answer, cost = call_ai_model(args.model, prompt_for_json(args.question, args.key), args.key, stream=args.stream,
+                                 cache_mode=args.cache)
+    print(answer if isinstance(answer, str) else json.dumps(answer, ensure_ascii=False))
+    logger.info(f'cost: {cost}')
+
+
+def _challenge(args) -> None:
+    import asyncio
+
+    from ai_2025.runner import sweep
+    from ai_2025.score_table import ScoreTable
+    from ai_2025.suite import DEFAULT_SUITE, Suite
+
+    suite = Suite(args.suite or DEFAULT_SUITE, ids=args.ids, tags=args.tags)
+    if args.db:
+        from ai_2025.results_store import ResultsStore
+
+        with ResultsStore(args.db) as store:
+            results = asyncio.run(sweep(args.models, suite, budget_usd=args.budget, store=store, run_name=args.run))
+    else:
+        results = asyncio.run(sweep(args.models, suite, budget_usd=args.budget))
+    print(ScoreTable.from_results(results).report())
+
+
+def _batch_submit(args) -> None:
+    from ai_2025.batch_eval import submit_suite
+    from ai_2025.batch_poller import BatchPoller
+    from ai_2025.common import AI_MODELS, model_client
+    from ai_2025.simple_batch_request import create_batch, upload_input_file
+    from ai_2025.suite import DEFAULT_SUITE, Suite
+
+    if args.input is None:
+        batch = submit_suite(Suite(args.suite or DEFAULT_SUITE, tags=args.tags), model=args.model)
+        description = args.description or f'suite on {args.model}'
+    else:
+        client = model_client(AI_MODELS[args.model])
+        input_file = upload_input_file(client, args.input)
+        description = args.description or args.input
+        batch = create_batch(client, input_file.id, description=description, endpoint=args.endpoint)
+    BatchPoller().track(batch.id, model=args.model, description=description)
+    print(batch.id)
+
+
+def _batch_status(args) -> None:
+    from ai_2025.batch_poller import BatchPoller
+
+    for b in BatchPoller().batches.values():
+        if b.done and not args.all:
+            continue
+        output = f' -> {b.output_path}' if b.output_path else ''
+        print(f'{b.batch_id}  {b.model:<14}{b.status:<12}{b.completed + b.failed}/{b.total} ({b.failed} failed)'
+              f'{output}  {b.description}')
+
+
+def _batch_poll(args) -> None:
+    import asyncio
+
+    from ai_2025.batch_poller import BatchPoller
+
+    for b in asyncio.run(BatchPoller(min_interval=args.min_interval).run()):
+        print(f'{b.batch_id}  {b.status}  {b.output_path or "-"}  {b.error_path or "-"}')
+
+
+def _batch_fetch(args) -> None:
+    from ai_2025.batch_poller import BatchPoller
+    from ai_2025.batch_results import download_file
+    from ai_2025.common import AI_MODELS, model_client
+
+    tracked = BatchPoller().batches.get(args.batch_id)
+    client = model_client(AI_MODELS[tracked.model if tracked is not None else args.model])
+    batch = client.batches.retrieve(args.batch_id)
+    if batch.output_file_id is None and batch.error_file_id is None:
+        sys.exit(f'{args.batch_id} is {batch.status}, no output yet')
+    if batch.output_file_id is not None:
+        print(download_file(client, batch.output_file_id, args.out))
+    if batch.error_file_id is not None:
+        print(download_file(client, batch.error_file_id))
+
+
+def _extract(args) -> None:
+    import asyncio
+
+    from ai_2025.invoices import InvoicePipeline
+
+    pipeline = InvoicePipeline(args.source, args.out, model=args.model, concurrency=args.concurrency)
+    print(asyncio.run(pipeline.run_batch() if args.batch else pipeline.run()))
+
+
+# STARTUP BENCHMARK
+
+
+HEAVY_PACKAGES = ('openai', 'httpx', 'dotenv', 'numpy')
+_LOADED = f"import sys; print(' '.join(m for m in {HEAVY_PACKAGES} if m in sys.modules))"
+
+
+def _best_time(argv: list[str], repeat: int) -> tuple[float, str]:
+    """
+    Best wall time (seconds) of a fresh interpreter run with `argv`, and its output.
+    """
+    import subprocess
+    import time
+
+    best, out = float('inf'), ''
+    for _ in range(repeat):
+        st = time.perf_counter()
+        out = subprocess.run([sys.executable, *argv], capture_output=True, text=True, check=True).stdout
+        best = min(best, time.perf_counter() - st)
+    return best, out
+
+
+def startup_benchmark(modules: list[str] = None, repeat: int = 5) -> dict[str, dict]:
+    """
+    Startup cost, each in a fresh interpreter: a bare one, `ai2025 --help`, and importing each of `modules`.
+    :return: name -> {'seconds': best of `repeat` runs, 'over_bare': seconds above the bare interpreter,
+        'loaded': HEAVY_PACKAGES it pulled in}
+    """
+    seconds, _ = _best_time(['-c', 'pass'], repeat)
+    res = {'python': {'seconds': seconds, 'loaded': []}}
+    seconds, _ = _best_time(['-m', 'ai_2025.cli', '--help'], repeat)
+    res['ai2025 --help'] = {'seconds': seconds, 'loaded': []}
+    for m in modules or STARTUP_MODULES:
+        seconds, out = _best_time(['-c', f'import {m}; {_LOADED}'], repeat)
+        res[m] = {'seconds': seconds, 'loaded': out.split()}
+    for r in res.values():
+        r['over_bare'] = r['seconds'] - res['python']['seconds']
+    return res
+
+
+def _startup(args) -> None:
+    import json
+    from pathlib import Path
+
+    res = startup_benchmark(args.modules, repeat=args.repeat)
+    for name, r in res.items():
+        print(f'{name:<24}{r["seconds"] * 1000:>8.0f} ms {r["over_bare"] * 1000:>+8.0f} ms  {" ".join(r["loaded"])}')
+    if args.out:
+        Path(args.out).write_text(json.dumps(res, indent=2))
+    if args.limit is not None and res['ai2025 --help']['seconds'] > args.limit:
+        sys.exit(f'ai2025 --help took {res["ai2025 --help"]["seconds"]:.2f}s, over the limit of {args.limit}s')
+
+
+# PARSER
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='ai2025', description='AI model challenges, batches and extraction')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('ask', help='ask a model one question, print the answer')
+    p.add_argument('question')
+    p.add_argument('--model', default='gpt-simple', help='key of AI_MODELS or MODEL_GROUPS')
+    p.add_argument('--key', default='answer', help='json key of the answer')
+    p.add_argument('--stream', action='store_true', help='stop reading as soon as the answer is complete')
+    p.add_argument('--cache', default='use', choices=['use', 'bypass', 'refresh'], help='response cache mode')
+    p.set_defaults(handler=_ask)
+
+    p = commands.add_parser('challenge', help='run models on the challenge suite, print a score report')
+    p.add_argument('models', nargs='+', help='keys of AI_MODELS or MODEL_GROUPS')
+    p.add_argument('--suite', default=None, help='suite file or directory (default: the default suite)')
+    p.add_argument('--ids', nargs='*', default=None)
+    p.add_argument('--tags', nargs='*', default=None)
+    p.add_argument('--budget', type=float, default=None, help='$ limit of the whole run')
+    p.add_argument('--db', default=None, help='also record the results in this results store')
+    p.add_argument('--run', default='', help='run name in the results store')
+    p.set_defaults(handler=_challenge)
+
+    batch = commands.add_parser('batch', help='batch API jobs').add_subparsers(dest='batch_command', required=True)
+    p = batch.add_parser('submit', help='upload an input file (or compile the suite), create a batch, track it')
+    p.add_argument('input', nargs='?', default=None, help='batch input .jsonl (default: compile the suite)')
+    p.add_argument('--model', default='gpt-simple', help='key of AI_MODELS, decides the account')
+    p.add_argument('--suite', default=None)
+    p.add_argument('--tags', nargs='*', default=None)
+    p.add_argument('--endpoint', default='/v1/chat/completions')
+    p.add_argument('--description', default=None)
+    p.set_defaults(handler=_batch_submit)
+    p = batch.add_parser('status', help='tracked batches as last seen (no network)')
+    p.add_argument('--all', action='store_true', help='include finished batches')
+    p.set_defaults(handler=_batch_status)
+    p = batch.add_parser('poll', help='follow the tracked batches until all are done, download their files')
+    p.add_argument('--min-interval', type=float, default=10.0, help='shortest polling interval (seconds)')
+    p.set_defaults(handler=_batch_poll)
+    p = batch.add_parser('fetch', help='download the output (and error) file of a finished batch')
+    p.add_argument('batch_id')
+    p.add_argument('--model', default='gpt-simple', help='account of an untracked batch')
+    p.add_argument('--out', default=None, help='output path (default: batch_results/<file id>.jsonl)')
+    p.set_defaults(handler=_batch_fetch)
+
+    p = commands.add_parser('extract', help='extract invoice data from PDFs')
+    p.add_argument('source', help='directory of PDFs or manifest (paths, one per line)')
+    p.add_argument('--out', default='invoices.jsonl', help='.jsonl or .db output (and checkpoint)')
+    p.add_argument('--model', default='gpt-simple')
+    p.add_argument('--concurrency', type=int, default=8)
+    p.add_argument('--batch', action='store_true', help='go through the batch API')
+    p.set_defaults(handler=_extract)
+
+    p = commands.add_parser('startup', help='measure the startup time of the CLI and the import time of modules')
+    p.add_argument('modules', nargs='*', default=None, help=f'default: {" ".join(STARTUP_MODULES)}')
+    p.add_argument('--repeat', type=int, default=5, help='runs of each, the best is reported')
+    p.add_argument('--limit', type=float, default=None, help='fail if `ai2025 --help` takes longer (seconds)')
+    p.add_argument('--out', default=None, help='write results json here')
+    p.set_defaults(handler=_startup)
+    return parser
+
+
+def main(argv: list[str] = None) -> None:
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
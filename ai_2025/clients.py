@@ -0,0 +1,171 @@
+"""
+Process-wide registry of provider clients.
+
+A fresh `OpenAI(...)` per call means a fresh connection pool (and TLS handshake) per call. Here clients are created
+once per (base_url, key_name) pair and reused by every caller; API keys are resolved from the environment (and .env)
+only once per process. Async clients are bound to an event loop, so they are kept per running loop as well: each
+`asyncio.run` gets its own, and the ones of closed loops are dropped.
+"""
+import asyncio
+import os
+import threading
+import time
+from functools import cache
+from typing import TYPE_CHECKING
+
+from pydantic import BaseModel
+
+if TYPE_CHECKING:  # httpx, openai and dotenv are imported when the first client is created
+    import httpx
+    from openai import AsyncOpenAI, OpenAI
+
+
+# MODEL
+
+
+class PoolConfig(BaseModel):
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0  # seconds an idle connection is kept open
+    timeout: float = 600.0  # seconds; reasoning models can be slow
+    connect_timeout: float = 10.0
+    max_retries: int = 0  # retries are done by ratelimit.ProviderScheduler
+
+    def limits(self) -> 'httpx.Limits':
+        import httpx
+
+        return httpx.Limits(max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_keepalive_connections,
+                            keepalive_expiry=self.keepalive_expiry)
+
+    def timeouts(self) -> 'httpx.Timeout':
+        import httpx
+
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+
+_pool_config = PoolConfig()
+_sync_clients: dict[tuple[str, str], 'OpenAI'] = {}
+_async_clients: dict[asyncio.AbstractEventLoop, dict[tuple[str, str], 'AsyncOpenAI']] = {}
+_lock = threading.Lock()
+
+
+# TIMING
+
+
+def _mark_sent(request: 'httpx.Request') -> None:
+    request.extensions['t_sent'] = time.perf_counter()
+
+
+def _mark_headers(response: 'httpx.Response') -> None:
+    response.request.extensions['t_headers'] = time.perf_counter()
+
+
+async def _amark_sent(request: 'httpx.Request') -> None:
+    _mark_sent(request)
+
+
+async def _amark_headers(response: 'httpx.Response') -> None:
+    _mark_headers(response)
+
+
+def time_to_first_byte(response: 'httpx.Response') -> float | None:
+    """
+    Seconds between sending the request and receiving the response headers (for responses of registry clients).
+    """
+    ext = response.request.extensions
+    if 't_sent' in ext and 't_headers' in ext:
+        return ext['t_headers'] - ext['t_sent']
+    return None
+
+
+# KEYS
+
+
+@cache
+def _load_env() -> None:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+
+@cache
+def resolve_key(key_name: str) -> str | None:
+    """
+    Returns the API key stored under `key_name` (environment or .env file); looked up once per process.
+    """
+    _load_env()
+    return os.getenv(key_name)
+
+
+# REGISTRY
+
+
+def configure_pool(config: PoolConfig) -> None:
+    """
+    Sets keep-alive / connection limits for clients created from now on. Call it before the first request;
+    already created clients are closed so that the next call picks up the new settings.
+    """
+    global _pool_config
+    close_clients()
+    _pool_config = config
+
+
+def get_client(base_url: str, key_name: str) -> 'OpenAI':
+    """
+    Returns the shared synchronous client for the given provider endpoint and key.
+    :param base_url: e.g. `AI_Model.base_url`
+    :param key_name: name of the env variable holding the key, e.g. `AI_Model.key_name`
+    """
+    k = (base_url, key_name)
+    client = _sync_clients.get(k)
+    if client is None:
+        with _lock:
+            client = _sync_clients.get(k)
+            if client is None:
+                import httpx
+                from openai import OpenAI
+
+                http_client = httpx.Client(limits=_pool_config.limits(), timeout=_pool_config.timeouts(),
+                                           event_hooks={'request': [_mark_sent], 'response': [_mark_headers]})
+                client = OpenAI(api_key=resolve_key(key_name), base_url=base_url, http_client=http_client,
+                                max_retries=_pool_config.max_retries)
+                _sync_clients[k] = client
+    return client
+
+
+def get_async_client(base_url: str, key_name: str) -> 'AsyncOpenAI':
+    """
+    Returns the shared asyncio client for the given provider endpoint and key, in the running event loop (a client
+    can't be used from another loop - its connections belong to the loop it was created in).
+    """
+    loop = asyncio.get_running_loop()
+    k = (base_url, key_name)
+    client = _async_clients.get(loop, {}).get(k)
+    if client is None:
+        with _lock:
+            for closed in [lp for lp in _async_clients if lp.is_closed()]:  # their pools died with them
+                del _async_clients[closed]
+            clients = _async_clients.setdefault(loop, {})
+            client = clients.get(k)
+            if client is None:
+                import httpx
+                from openai import AsyncOpenAI
+
+                http_client = httpx.AsyncClient(limits=_pool_config.limits(), timeout=_pool_config.timeouts(),
+                                                event_hooks={'request': [_amark_sent], 'response': [_amark_headers]})
+                client = AsyncOpenAI(api_key=resolve_key(key_name), base_url=base_url, http_client=http_client,
+                                     max_retries=_pool_config.max_retries)
+                clients[k] = client
+    return client
+
+
+def close_clients() -> None:
+    """
+    Closes and forgets all sync clients; async clients are only forgotten (their pools die with their event loop).
+    """
+    with _lock:
+        for client in _sync_clients.values():
+            client.close()
+        _sync_clients.clear()
+        _async_clients.clear()
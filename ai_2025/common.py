@@ -1,13 +1,24 @@
+import asyncio
 import json
-import os
 import re
+import time
+from typing import TYPE_CHECKING
 
-from dotenv import load_dotenv
 from loguru import logger
-from openai import OpenAI
-from openai.types import CompletionUsage
 from pydantic import BaseModel
 
+from ai_2025.cache import CacheEntry, CacheMode, ResponseCache
+from ai_2025.clients import get_async_client, get_client, time_to_first_byte
+from ai_2025.json_stream import KeyExtractor
+from ai_2025.pricing import DOWNGRADES, BudgetExceeded, active_budget
+from ai_2025.ratelimit import CallTrace, ProviderScheduler, estimate_tokens, get_scheduler
+from ai_2025.singleflight import default_flights, flight_key
+from ai_2025.structured import StructureError, parse_structured, repair_messages, response_format
+
+if TYPE_CHECKING:  # the SDK is imported when the first client is created (see `clients`)
+    from openai import AsyncOpenAI, OpenAI
+    from openai.types import CompletionUsage
+
 
 # MODEL
 
@@ -17,16 +28,60 @@ class AI_Model(BaseModel):
     model_name: str
     base_url: str
     key_name: str
+    max_in_flight: int = 4  # concurrent requests allowed by the runner on this entry's account (base_url + key)
+    rpm: int | None = None  # requests per minute allowed by the provider (None = unlimited)
+    tpm: int | None = None  # tokens per minute allowed by the provider (None = unlimited)
+    json_mode: bool = False  # accepts response_format {"type": "json_object"}
+    json_schema: bool = False  # accepts response_format {"type": "json_schema", ...}
+    supports_n: bool = False  # returns several choices for one request (`n` parameter)
+    batch_api: bool = False  # openai-style batch API (files + /batches) for chat completions
+
+
+class CallTiming(BaseModel):
+    queue_time: float = 0.0  # seconds waiting for the rate budget and between retries
+    ttfb: float | None = None  # seconds from sending the (last) request to its response headers
+    latency: float = 0.0  # seconds of the whole call, queue and retries included
+    tokens_per_second: float | None = None  # completion tokens / duration of the successful request
+    retries: int = 0
 
 
 class CallCost(BaseModel):
-    prompt_tokens: int
+    prompt_tokens: int  # all input tokens, cached included
     completion_tokens: int
+    cached_prompt_tokens: int = 0  # input tokens served from the provider's prompt cache (discounted)
+    replayed: bool = False  # served from the response cache; tokens are what the original call cost
+    coalesced: bool = False  # shared another caller's identical in-flight request; tokens are what that one cost
+    estimated: bool = False  # stream closed before the provider reported usage; tokens are estimates
+    timing: CallTiming | None = None
 
     @staticmethod
     def from_response(response):
-        u: CompletionUsage = response.usage
-        return CallCost(prompt_tokens=u.prompt_tokens, completion_tokens=u.completion_tokens)
+        return CallCost.from_usage(response.usage)
+
+    @staticmethod
+    def from_usage(u: 'CompletionUsage'):
+        details = u.prompt_tokens_details
+        return CallCost(prompt_tokens=u.prompt_tokens, completion_tokens=u.completion_tokens,
+                        cached_prompt_tokens=(details.cached_tokens or 0) if details is not None else 0)
+
+    @staticmethod
+    def from_batch_usage(usage: dict | None):
+        """
+        From the `usage` of a chat completion in a batch output line (plain json).
+        """
+        usage = usage or {}
+        return CallCost(prompt_tokens=usage.get('prompt_tokens', 0),
+                        completion_tokens=usage.get('completion_tokens', 0),
+                        cached_prompt_tokens=(usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0)
+
+    @staticmethod
+    def total(costs: list['CallCost']) -> 'CallCost':
+        return CallCost(prompt_tokens=sum(c.prompt_tokens for c in costs),
+                        completion_tokens=sum(c.completion_tokens for c in costs),
+                        cached_prompt_tokens=sum(c.cached_prompt_tokens for c in costs),
+                        replayed=bool(costs) and all(c.replayed for c in costs),
+                        coalesced=bool(costs) and all(c.coalesced for c in costs),
+                        estimated=any(c.estimated for c in costs))
 
 
 AI_MODELS: dict[str, AI_Model] = {
@@ -36,7 +91,9 @@ AI_MODELS: dict[str, AI_Model] = {
         # model_name="gemini-2.5-pro-preview-03-25",
         # model_name="gemini-2.5-pro-exp-03-25",
         base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-        key_name="GEMINI_KEY"
+        key_name="GEMINI_KEY",
+        json_mode=True,
+        json_schema=True
     ),
     "gemini-simple": AI_Model(
         name="gemini",
@@ -44,26 +101,33 @@ AI_MODELS: dict[str, AI_Model] = {
         # model_name="gemini-2.5-flash-preview-04-17",
         model_name="gemini-2.5-flash-preview-05-20",
         base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-        key_name="GEMINI_KEY"
+        key_name="GEMINI_KEY",
+        json_mode=True,
+        json_schema=True
     ),
     "grok": AI_Model(
         name="grok",
         base_url="https://api.x.ai/v1",
         # model_name="grok-2-1212",
         model_name="grok-3-beta",
-        key_name="XAI_KEY"
+        key_name="XAI_KEY",
+        json_mode=True,
+        json_schema=True
     ),
     "grok-simple": AI_Model(
         name="grok-simple",
         base_url="https://api.x.ai/v1",
         model_name="grok-3-mini-latest",
-        key_name="XAI_KEY"
+        key_name="XAI_KEY",
+        json_mode=True,
+        json_schema=True
     ),
     "sonar": AI_Model(
         name="sonar",
         base_url="https://api.perplexity.ai",
         model_name="sonar",
-        key_name="PPLX_KEY"
+        key_name="PPLX_KEY",
+        json_schema=True
     ),
     "claude": AI_Model(
         name="claude",
@@ -76,7 +140,8 @@ AI_MODELS: dict[str, AI_Model] = {
         name="qwen-max",
         base_url="https://dashscope-intl.aliyuncs.com/compatible-mode/v1",
         model_name="qwen3",  # qwen-max, qwen-plus, qwq-plus
-        key_name="QWEN_KEY"
+        key_name="QWEN_KEY",
+        json_mode=True
     ),
     "gpt": AI_Model(
         name="gpt",
@@ -84,28 +149,305 @@ AI_MODELS: dict[str, AI_Model] = {
         # model_name="gpt-4o-mini",
         # model_name="gpt-4o",  #
         model_name="gpt-4.5-preview-2025-02-27",  # beware, $$$; check 4.1 first
-        key_name="GPT_KEY"
+        key_name="GPT_KEY",
+        json_mode=True,
+        json_schema=True,
+        supports_n=True,
+        batch_api=True,
+        rpm=1000,  # usage tier 1; raise with the account's tier
+        tpm=125_000
     ),
     "gpt-simple": AI_Model(
         name="gpt-simple",
         base_url="https://api.openai.com/v1/",
         model_name="gpt-4.1-2025-04-14",
-        key_name="GPT_KEY"
+        key_name="GPT_KEY",
+        json_mode=True,
+        json_schema=True,
+        supports_n=True,
+        batch_api=True,
+        rpm=500,  # usage tier 1
+        tpm=30_000
     ),
 
 }
 
+# interchangeable entries of one price tier, in order of preference: a call to a group is routed among them (see
+# `routing`, which also refuses to hedge or fail over to a member priced far above the first one)
+MODEL_GROUPS: dict[str, list[str]] = {
+    "simple-any": ["gpt-simple", "gemini-simple", "grok-simple"],
+    "pro-any": ["grok", "claude", "gemini"],
+}
+
 
 # HELPERS
 
 
-def call_model(api_key: str, base_url: str, model_name: str, messages: list[dict]) -> tuple[str, CallCost]:
-    client = OpenAI(api_key=api_key, base_url=base_url)
+def primary_model(name: str) -> str:
+    """
+    The AI_MODELS key a model or model group stands for (the group's first choice).
+    """
+    return MODEL_GROUPS[name][0] if name in MODEL_GROUPS else name
+
+
+def model_client(config: AI_Model) -> 'OpenAI':
+    return get_client(config.base_url, config.key_name)
+
+
+def model_async_client(config: AI_Model) -> 'AsyncOpenAI':
+    return get_async_client(config.base_url, config.key_name)
+
+
+def model_scheduler(config: AI_Model) -> ProviderScheduler:
+    return get_scheduler(config.name, config.base_url, config.model_name, rpm=config.rpm, tpm=config.tpm)
+
+
+_response_cache: ResponseCache | None = None
+
+
+def enable_response_cache(cache: ResponseCache | None = None) -> ResponseCache:
+    """
+    Turns on the on-disk response cache for all `call_ai_model` calls (pass `cache_mode` per call to bypass/refresh).
+    """
+    global _response_cache
+    _response_cache = cache or ResponseCache()
+    return _response_cache
+
+
+def disable_response_cache() -> None:
+    global _response_cache
+    _response_cache = None
+
+
+def _timed_cost(raw, res, st: float) -> CallCost:
+    cost = CallCost.from_response(res)
+    duration = time.perf_counter() - st
+    cost.timing = CallTiming(ttfb=time_to_first_byte(raw.http_response), latency=duration,
+                             tokens_per_second=cost.completion_tokens / duration if duration > 0 else None)
+    return cost
+
+
+def call_model(client: 'OpenAI', model_name: str, messages: list[dict], params: dict = None) -> tuple[str, CallCost]:
     logger.info(f'calling {model_name}')
-    # .....
-    res = client.chat.completions.create(model=model_name, messages=messages)
+    st = time.perf_counter()
+    raw = client.chat.completions.with_raw_response.create(model=model_name, messages=messages, **(params or {}))
+    res = raw.parse()
     content = res.choices[0].message.content
-    cost = CallCost.from_response(res)
+    cost = _timed_cost(raw, res, st)
+    return content, cost
+
+
+async def call_model_async(client: 'AsyncOpenAI', model_name: str, messages: list[dict],
+                           params: dict = None) -> tuple[str, CallCost]:
+    logger.info(f'calling {model_name}')
+    st = time.perf_counter()
+    raw = await client.chat.completions.with_raw_response.create(model=model_name, messages=messages,
+                                                                 **(params or {}))
+    res = raw.parse()
+    content = res.choices[0].message.content
+    cost = _timed_cost(raw, res, st)
+    return content, cost
+
+
+def call_model_n(client: 'OpenAI', model_name: str, messages: list[dict], n: int,
+                 params: dict = None) -> tuple[list[str], CallCost]:
+    """
+    `call_model` returning `n` choices of one request (the prompt is paid once).
+    """
+    logger.info(f'calling {model_name} (n={n})')
+    st = time.perf_counter()
+    raw = client.chat.completions.with_raw_response.create(model=model_name, messages=messages, n=n,
+                                                           **(params or {}))
+    res = raw.parse()
+    return [c.message.content for c in res.choices], _timed_cost(raw, res, st)
+
+
+async def call_model_n_async(client: 'AsyncOpenAI', model_name: str, messages: list[dict], n: int,
+                             params: dict = None) -> tuple[list[str], CallCost]:
+    logger.info(f'calling {model_name} (n={n})')
+    st = time.perf_counter()
+    raw = await client.chat.completions.with_raw_response.create(model=model_name, messages=messages, n=n,
+                                                                 **(params or {}))
+    res = raw.parse()
+    return [c.message.content for c in res.choices], _timed_cost(raw, res, st)
+
+
+def _stream_params(params: dict | None) -> dict:
+    return (params or {}) | {'stream': True, 'stream_options': {'include_usage': True}}
+
+
+def _stream_chunk(extractor: KeyExtractor, chunk) -> tuple[bool, object]:
+    """
+    :return: (stop reading, usage if this chunk carries it)
+    """
+    if chunk.usage is not None:
+        return True, chunk.usage
+    if not chunk.choices:
+        return False, None
+    choice = chunk.choices[0]
+    if choice.delta.content and not extractor.done:
+        extractor.feed(choice.delta.content)
+    # once the value is complete, read on only if the stream is about to end anyway (the usage chunk follows)
+    return extractor.done and choice.finish_reason is None, None
+
+
+def _stream_result(messages: list[dict], extractor: KeyExtractor, usage, ttfb: float | None,
+                   st: float) -> tuple[str, CallCost]:
+    text = extractor.buffer
+    if usage is not None:
+        cost = CallCost.from_usage(usage)
+    else:
+        cost = CallCost(prompt_tokens=estimate_tokens(messages, completion_tokens=0),
+                        completion_tokens=max(1, len(text) // 4), estimated=True)
+    duration = time.perf_counter() - st
+    cost.timing = CallTiming(ttfb=ttfb, latency=duration,
+                             tokens_per_second=cost.completion_tokens / duration if duration > 0 else None)
+    content = json.dumps({extractor.key: extractor.value}, ensure_ascii=False) if extractor.found else text
+    return content, cost
+
+
+def stream_call_model(client: 'OpenAI', model_name: str, messages: list[dict], required_key: str,
+                      params: dict = None) -> tuple[str, CallCost]:
+    """
+    `call_model` over a streamed completion that is closed as soon as the value of `required_key` is complete.
+    The content returned is `{required_key: value}` as json (the whole text if the key never showed up); the cost
+    comes from the usage chunk, or is estimated (`estimated=True`) if the stream was cut before it.
+    """
+    logger.info(f'streaming {model_name}')
+    st = time.perf_counter()
+    extractor, usage = KeyExtractor(required_key), None
+    stream = client.chat.completions.create(model=model_name, messages=messages, **_stream_params(params))
+    try:
+        for chunk in stream:
+            stop, chunk_usage = _stream_chunk(extractor, chunk)
+            usage = chunk_usage or usage
+            if stop:
+                break
+    finally:
+        stream.close()
+    return _stream_result(messages, extractor, usage, time_to_first_byte(stream.response), st)
+
+
+async def stream_call_model_async(client: 'AsyncOpenAI', model_name: str, messages: list[dict], required_key: str,
+                                  params: dict = None) -> tuple[str, CallCost]:
+    logger.info(f'streaming {model_name}')
+    st = time.perf_counter()
+    extractor, usage = KeyExtractor(required_key), None
+    stream = await client.chat.completions.create(model=model_name, messages=messages, **_stream_params(params))
+    try:
+        async for chunk in stream:
+            stop, chunk_usage = _stream_chunk(extractor, chunk)
+            usage = chunk_usage or usage
+            if stop:
+                break
+    finally:
+        await stream.close()
+    return _stream_result(messages, extractor, usage, time_to_first_byte(stream.response), st)
+
+
+def _used_tokens(res: tuple[str, CallCost]) -> int:
+    return res[1].prompt_tokens + res[1].completion_tokens
+
+
+def _with_trace(res: tuple[str, CallCost], trace: CallTrace, st: float) -> tuple[str, CallCost]:
+    content, cost = res
+    timing = cost.timing or CallTiming()
+    timing.queue_time, timing.retries, timing.latency = trace.queue_time, trace.retries, time.perf_counter() - st
+    cost.timing = timing
+    return content, cost
+
+
+def scheduled_call_model(client: 'OpenAI', model_name: str, messages: list[dict], params: dict = None,
+                         scheduler: ProviderScheduler = None, stream_key: str = None) -> tuple[str, CallCost]:
+    """
+    `call_model` within the provider's rpm/tpm budget, with retries of 429/5xx/connection errors.
+    :param stream_key: stream the completion and stop once this key's value is complete (`stream_call_model`)
+    """
+    def fn():
+        if stream_key is not None:
+            return stream_call_model(client, model_name, messages, stream_key, params)
+        return call_model(client, model_name, messages, params)
+
+    if scheduler is None:
+        return fn()
+    st, trace = time.perf_counter(), CallTrace()
+    res = scheduler.call(fn, estimated_tokens=estimate_tokens(messages), used_tokens=_used_tokens, trace=trace)
+    return _with_trace(res, trace, st)
+
+
+async def scheduled_call_model_async(client: 'AsyncOpenAI', model_name: str, messages: list[dict], params: dict = None,
+                                     scheduler: ProviderScheduler = None,
+                                     stream_key: str = None) -> tuple[str, CallCost]:
+    def fn():
+        if stream_key is not None:
+            return stream_call_model_async(client, model_name, messages, stream_key, params)
+        return call_model_async(client, model_name, messages, params)
+
+    if scheduler is None:
+        return await fn()
+    st, trace = time.perf_counter(), CallTrace()
+    res = await scheduler.acall(fn, estimated_tokens=estimate_tokens(messages), used_tokens=_used_tokens,
+                                trace=trace)
+    return _with_trace(res, trace, st)
+
+
+def _cache_lookup(model_name: str, messages: list[dict], params: dict | None,
+                  cache_mode: CacheMode) -> tuple[str | None, tuple[str, CallCost] | None]:
+    """
+    :return: (key to store the fresh response under or None if caching is off, cached response or None)
+    """
+    cache = _response_cache
+    if cache is None or cache_mode == 'bypass':
+        return None, None
+    key = cache.make_key(model_name, messages, params)
+    if cache_mode == 'use' and (entry := cache.get(key)) is not None:
+        logger.debug(f'cache hit for {model_name} ({key[:12]})')
+        return key, (entry.content, CallCost(**(entry.cost | {'replayed': True, 'timing': None})))
+    return key, None
+
+
+def _cache_store(key: str | None, model_name: str, content: str, cost: CallCost) -> None:
+    cache = _response_cache
+    if key is not None and cache is not None:
+        cache.put(CacheEntry(key=key, model_name=model_name, content=content, cost=cost.model_dump(),
+                             created_at=time.time()))
+
+
+def cached_call_model(client: 'OpenAI', model_name: str, messages: list[dict], params: dict = None,
+                      cache_mode: CacheMode = 'use', scheduler: ProviderScheduler = None,
+                      stream_key: str = None) -> tuple[str, CallCost]:
+    """
+    `call_model` behind the response cache (if enabled); replays keep the original CallCost with `replayed=True`.
+    Identical calls already in flight are joined instead of repeated (`singleflight`, not with cache_mode='bypass').
+    """
+    key, hit = _cache_lookup(model_name, messages, params, cache_mode)
+    if hit is not None:
+        return hit
+    if cache_mode == 'bypass':
+        return scheduled_call_model(client, model_name, messages, params, scheduler, stream_key)
+    (content, cost), shared = default_flights().do(
+        flight_key(model_name, messages, params, stream_key),
+        lambda: scheduled_call_model(client, model_name, messages, params, scheduler, stream_key))
+    if shared:
+        return content, cost.model_copy(update={'coalesced': True})
+    _cache_store(key, model_name, content, cost)
+    return content, cost
+
+
+async def cached_call_model_async(client: 'AsyncOpenAI', model_name: str, messages: list[dict], params: dict = None,
+                                  cache_mode: CacheMode = 'use', scheduler: ProviderScheduler = None,
+                                  stream_key: str = None) -> tuple[str, CallCost]:
+    key, hit = _cache_lookup(model_name, messages, params, cache_mode)
+    if hit is not None:
+        return hit
+    if cache_mode == 'bypass':
+        return await scheduled_call_model_async(client, model_name, messages, params, scheduler, stream_key)
+    (content, cost), shared = await default_flights().ado(
+        flight_key(model_name, messages, params, stream_key),
+        lambda: scheduled_call_model_async(client, model_name, messages, params, scheduler, stream_key))
+    if shared:
+        return content, cost.model_copy(update={'coalesced': True})
+    _cache_store(key, model_name, content, cost)
     return content, cost
 
 
@@ -124,23 +466,180 @@ def content_to_structure(content: str, structure_key: str = 'answer'):
     return answer
 
 
-def call_ai_model(model_name: str, prompt: list[dict], required_key: str):
-    load_dotenv()
+def _structured_params(config: AI_Model, params: dict | None, schema: type[BaseModel] | None) -> dict | None:
+    """
+    Adds the provider's native JSON mode to `params` (an explicit `response_format` is kept).
+    """
+    params = params or {}
+    if 'response_format' not in params and (rf := response_format(config.json_mode, config.json_schema, schema)):
+        params = params | {'response_format': rf}
+    return params or None
+
+
+def _with_repair(usage: CallCost, repair_usage: CallCost) -> CallCost:
+    """
+    Cost of a call and its repair pass together (the repair is already booked in the run's ledger by its own call);
+    timing is the original call's.
+    """
+    return CallCost.total([usage, repair_usage]).model_copy(update={'timing': usage.timing})
+
 
+def _running_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def call_ai_model(model_name: str, prompt: list[dict], required_key: str, params: dict = None,
+                  cache_mode: CacheMode = 'use', label: str = None, stream: bool = False,
+                  schema: type[BaseModel] = None, repair: bool = True):
+    """
+    :param model_name: key of AI_MODELS or MODEL_GROUPS; within a `budget_scope` it may be downgraded, or refused with
+        BudgetExceeded. A group is routed on its own event loop, so from async code (a running loop) use
+        `call_ai_model_async` instead
+    :param label: what the cost is booked under in the run's ledger (e.g. challenge id)
+    :param stream: stream the completion and stop reading once `required_key` is complete (skips trailing chatter)
+    :param schema: pydantic model the answer object must match (default: any value under `required_key`)
+    :param repair: on a malformed answer, ask the cheaper model of the provider once to fix it instead of failing
+    """
+    if model_name in MODEL_GROUPS:
+        from ai_2025.routing import default_router
+
+        if _running_loop():
+            raise RuntimeError(f'call_ai_model({model_name!r}) routes the group on its own event loop and cannot run '
+                               f'inside a running one; await call_ai_model_async instead')
+        answer, usage, _ = asyncio.run(default_router().call(
+            model_name, prompt, required_key, params=params, cache_mode=cache_mode, label=label, stream=stream,
+            schema=schema, repair=repair))
+        return answer, usage
+    budget = active_budget()
+    reserved = 0.0
+    if budget is not None:
+        model_name, reserved = budget.admit(model_name, prompt, params)
+    config = AI_MODELS[model_name]
+    params = _structured_params(config, params, schema)
+
+    usage = None
+    try:
+        content, usage = cached_call_model(
+            client=model_client(config),
+            model_name=config.model_name,
+            messages=prompt,
+            params=params,
+            cache_mode=cache_mode,
+            scheduler=model_scheduler(config),
+            stream_key=required_key if stream else None
+        )
+    finally:
+        if budget is not None:
+            budget.settle(model_name, reserved, usage, label)
+
+    try:
+        answer = parse_structured(content, required_key, schema)
+    except StructureError as e:
+        if not repair:
+            raise
+        logger.warning(f'{model_name}: {e}; one repair pass')
+        answer, repair_usage = call_ai_model(DOWNGRADES.get(model_name, model_name),
+                                             repair_messages(content, required_key, e, schema), required_key,
+                                             cache_mode=cache_mode, label=label, schema=schema, repair=False)
+        usage = _with_repair(usage, repair_usage)
+    return answer, usage
+
+
+async def call_ai_model_async(model_name: str, prompt: list[dict], required_key: str, params: dict = None,
+                              cache_mode: CacheMode = 'use', label: str = None, stream: bool = False,
+                              schema: type[BaseModel] = None, repair: bool = True):
+    if model_name in MODEL_GROUPS:
+        from ai_2025.routing import default_router
+        answer, usage, _ = await default_router().call(model_name, prompt, required_key, params=params,
+                                                       cache_mode=cache_mode, label=label, stream=stream,
+                                                       schema=schema, repair=repair)
+        return answer, usage
+    budget = active_budget()
+    reserved = 0.0
+    if budget is not None:
+        model_name, reserved = budget.admit(model_name, prompt, params)
     config = AI_MODELS[model_name]
-    key = os.getenv(config.key_name)
+    params = _structured_params(config, params, schema)
 
-    content, usage = call_model(
-        api_key=key,
-        base_url=config.base_url,
-        model_name=config.model_name,
-        messages=prompt
-    )
+    usage = None
+    try:
+        content, usage = await cached_call_model_async(
+            client=model_async_client(config),
+            model_name=config.model_name,
+            messages=prompt,
+            params=params,
+            cache_mode=cache_mode,
+            scheduler=model_scheduler(config),
+            stream_key=required_key if stream else None
+        )
+    finally:
+        if budget is not None:
+            budget.settle(model_name, reserved, usage, label)
 
-    answer = content_to_structure(content, structure_key=required_key)
+    try:
+        answer = parse_structured(content, required_key, schema)
+    except StructureError as e:
+        if not repair:
+            raise
+        logger.warning(f'{model_name}: {e}; one repair pass')
+        answer, repair_usage = await call_ai_model_async(DOWNGRADES.get(model_name, model_name),
+                                                         repair_messages(content, required_key, e, schema),
+                                                         required_key, cache_mode=cache_mode, label=label,
+                                                         schema=schema, repair=False)
+        usage = _with_repair(usage, repair_usage)
     return answer, usage
 
 
+def _parse_sample(content: str, required_key: str, schema: type[BaseModel] | None):
+    try:
+        return parse_structured(content, required_key, schema)
+    except StructureError as e:
+        return e
+
+
+async def sample_ai_model_async(model_name: str, prompt: list[dict], required_key: str, n: int, params: dict = None,
+                                label: str = None, schema: type[BaseModel] = None) -> tuple[list, CallCost]:
+    """
+    `n` answers to the same prompt, for self-consistency scoring: one request with `n` choices where the model
+    `supports_n`, otherwise `n` concurrent calls (response cache bypassed - replays would all be the same answer).
+    Samples that failed are returned as their exception. Default temperature is 1.
+    :return: (answers or exceptions, total cost)
+    """
+    params = {'temperature': 1.0} | (params or {})
+    if n == 1 or model_name in MODEL_GROUPS or not AI_MODELS[model_name].supports_n:
+        calls = (call_ai_model_async(model_name, prompt, required_key, params, cache_mode='bypass', label=label,
+                                     schema=schema) for _ in range(n))
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        if (refused := next((r for r in results if isinstance(r, BudgetExceeded)), None)) is not None:
+            raise refused
+        answers = [r if isinstance(r, Exception) else r[0] for r in results]
+        return answers, CallCost.total([r[1] for r in results if not isinstance(r, Exception)])
+
+    budget = active_budget()
+    reserved = 0.0
+    if budget is not None:
+        model_name, reserved = budget.admit(model_name, prompt, params | {'n': n})
+    config = AI_MODELS[model_name]
+    params = _structured_params(config, params, schema)
+
+    usage = None
+    try:
+        st, trace = time.perf_counter(), CallTrace()
+        contents, usage = await model_scheduler(config).acall(
+            lambda: call_model_n_async(model_async_client(config), config.model_name, prompt, n, params),
+            estimated_tokens=estimate_tokens(prompt, completion_tokens=256 * n), used_tokens=_used_tokens,
+            trace=trace)
+        _, usage = _with_trace(('', usage), trace, st)
+    finally:
+        if budget is not None:
+            budget.settle(model_name, reserved, usage, label)
+    return [_parse_sample(c, required_key, schema) for c in contents], usage
+
+
 # PROMPTS
 
 def cities_prompt() -> list[dict]:
@@ -178,22 +677,25 @@ next move is 'x', and it is your move, make a good move, print the board after t
     return messages
 
 
-def prompt_for_json(message: str, required_key: str) -> list[dict]:
+def prompt_for_json(message: str, required_key: str, context: str = None) -> list[dict]:
     """
     Creates a openai prompt that explicitly calls for returning only a JSON object with the only key `required_key`.
-    :param message:
+    Stable parts come first (instructions, then the shared `context`) and the question last. Providers cache a
+    prompt prefix only from about 1024 tokens on, which the instructions alone are far from; a long shared `context`
+    reaches it, and then every question after the first reuses it.
+    :param message: the question
     :param required_key:
+    :param context: long text shared by many questions (documents, rules, examples)
     :return:
     """
     messages = [
         {
             "role": "system",
             "content": "You are a concise assistant. Provide responses in a structured JSON format. "
-                       "Return only a JSON object with proper keys"
-        },
-        {
-            "role": "user",
-            "content": message + f". Return _only_ the json structure with key `{required_key}`. "
+                       f"Return _only_ the json structure with key `{required_key}`."
         }
     ]
+    if context:
+        messages.append({"role": "user", "content": context})
+    messages.append({"role": "user", "content": message})
     return messages
@@ -0,0 +1,413 @@
+"""
+Deadline-driven dispatch of a workload between the batch API (half the price, hours) and concurrent sync calls.
+
+Items (prompts or challenges) go to the batch API, in several batches of `chunk_size`, when the deadline leaves
+room for a batch turnaround; otherwise, or for models without a batch API, they go to sync calls. While the batches
+run, the dispatcher keeps checking whether the sync path could still finish everything the batches have not returned
+yet before the deadline (with a safety margin set by the preference); when it could not, the most recent unfinished
+batch is cancelled and its remaining items move to sync calls. So as the deadline gets closer, work shifts from batch
+to sync a batch at a time. Requests that fail in a batch are retried as sync calls, and so are the items of a batch
+that could not be submitted, or polled `poll_retries` times in a row.
+
+Results from both paths come back through one async iterator, in completion order, each item exactly once.
+
+    async for r in Dispatcher(items_from_suite(Suite(), 'gpt-simple'), deadline=6 * 3600).results():
+        ...
+    python -m ai_2025.dispatch --model gpt-simple --deadline 6h --prefer cheapest
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Literal
+
+from loguru import logger
+from pydantic import BaseModel
+
+from ai_2025.ai_challenge import AiChallengeScore
+from ai_2025.batch_results import BatchResult, BatchResultsFile, download_file
+from ai_2025.common import AI_MODELS, CallCost, call_ai_model_async, model_async_client, model_client, prompt_for_json
+from ai_2025.pricing import BATCH_DISCOUNT, cost_usd
+from ai_2025.structured import StructureError, parse_structured, response_format
+from ai_2025.suite import ChallengeData, Suite
+from ai_2025.uploads import default_uploads
+
+CHAT_COMPLETIONS_URL = '/v1/chat/completions'
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+Preference = Literal['cheapest', 'balanced', 'fastest']
+SAFETY = {'cheapest': 1.2, 'balanced': 2.0}  # margin on the estimated sync time before work is moved off batch
+
+
+class WorkItem(BaseModel):
+    id: str  # unique in the workload
+    model: str  # key of AI_MODELS
+    messages: list[dict]
+    required_key: str = 'answer'
+    challenge: ChallengeData | None = None  # scored if set
+
+
+class DispatchResult(BaseModel):
+    id: str
+    model: str
+    path: Literal['sync', 'batch']
+    answer: object = None
+    error: str | None = None
+    score: AiChallengeScore | None = None
+    cost: CallCost | None = None
+    cost_usd: float | None = None  # batch discount applied
+
+
+class DispatchStats(BaseModel):
+    items: int = 0
+    batch: int = 0  # results that came from the batch API
+    sync: int = 0
+    moved: int = 0  # items taken back from a batch and run sync
+    batches: int = 0
+    cancelled_batches: int = 0
+    cost_usd: float = 0.0
+    sync_cost_usd: float = 0.0  # what the same calls would have cost all sync
+
+
+def items_from_suite(challenges: Iterable[ChallengeData], model: str) -> list[WorkItem]:
+    return [WorkItem(id=ch.id, model=model, messages=prompt_for_json(ch.prompt, 'answer'), challenge=ch)
+            for ch in challenges]
+
+
+def items_from_prompts(prompts: dict[str, str], model: str, required_key: str = 'answer') -> list[WorkItem]:
+    """
+    :param prompts: id -> question
+    """
+    return [WorkItem(id=i, model=model, messages=prompt_for_json(p, required_key), required_key=required_key)
+            for i, p in prompts.items()]
+
+
+def parse_deadline(value: str) -> float:
+    """
+    '90' / '90s' / '45m' / '6h' -> seconds
+    """
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    return float(value[:-1]) * units[value[-1]] if value[-1] in units else float(value)
+
+
+class _Chunk:
+    def __init__(self, model: str, items: list[WorkItem]):
+        self.model = model
+        self.items = {it.id: it for it in items}
+        self.batch_id: str | None = None
+        self.status = 'new'
+        self.cancelled = False
+        self.abandoned = False  # could not be submitted or polled; its items were moved to sync
+        self.poll_errors = 0  # consecutive
+
+    def done(self) -> bool:
+        return self.abandoned or self.status in TERMINAL_STATUSES
+
+
+class Dispatcher:
+    def __init__(self, items: Iterable[WorkItem], deadline: float, prefer: Preference = 'balanced',
+                 concurrency: int = 8, chunk_size: int = 500, batch_turnaround: float = 3600.0,
+                 sync_latency: float = 10.0, poll_interval: float = 30.0, poll_retries: int = 5,
+                 work_dir: str | Path = 'dispatch'):
+        """
+        :param deadline: seconds from now by which all results are wanted
+        :param prefer: 'cheapest' - as much batch as the deadline allows, 'balanced' - move work to sync earlier,
+            'fastest' - sync only
+        :param concurrency: sync calls in flight
+        :param chunk_size: items per batch; smaller batches let work move to sync in finer steps
+        :param batch_turnaround: expected seconds until a batch completes (batches are only used if it fits)
+        :param sync_latency: initial estimate of seconds per sync call; updated from the observed calls
+        :param poll_retries: polls of a batch that may fail in a row (retrieve or download) before its items are run
+            sync
+        """
+        self.items = list(items)
+        self.deadline = time.monotonic() + deadline
+        self.prefer = prefer
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.batch_turnaround = batch_turnaround
+        self.sync_latency = sync_latency
+        self.poll_interval = poll_interval
+        self.poll_retries = poll_retries
+        self.work_dir = Path(work_dir)
+        self.stats = DispatchStats(items=len(self.items))
+        self.chunks: list[_Chunk] = []
+        self._sync: asyncio.Queue[WorkItem] = asyncio.Queue()
+        self._out: asyncio.Queue[DispatchResult] = asyncio.Queue()
+        self._delivered: set[str] = set()
+        self._in_flight = 0
+
+    # PLAN
+
+    def _time_left(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def _sync_seconds(self, n: int) -> float:
+        return n * self.sync_latency / self.concurrency
+
+    def plan(self) -> tuple[list[WorkItem], list[WorkItem]]:
+        """
+        :return: (items for the batch API, items for sync calls)
+        """
+        if len({it.id for it in self.items}) != len(self.items):
+            raise ValueError('work item ids must be unique')
+        if self.prefer == 'fastest' or self._time_left() < self.batch_turnaround * SAFETY[self.prefer]:
+            return [], self.items
+        batch = [it for it in self.items if AI_MODELS[it.model].batch_api]
+        return batch, [it for it in self.items if not AI_MODELS[it.model].batch_api]
+
+    def _pending_in_batches(self) -> int:
+        return sum(len(c.items.keys() - self._delivered) for c in self.chunks if not c.cancelled and not c.done())
+
+    def _rebalance(self) -> None:
+        """
+        If the sync path could no longer finish everything still pending (batches included) before the deadline and
+        the sync workers have room, the newest unfinished batch is cancelled and its items are run sync. One batch
+        per check: busy workers bring the estimate back within the deadline, so the shift is gradual.
+        """
+        backlog = self._sync.qsize() + self._in_flight + self._pending_in_batches()
+        if self._sync_seconds(backlog) * SAFETY.get(self.prefer, 1.0) < self._time_left():
+            return
+        if self._sync.qsize() >= self.concurrency:
+            return
+        c = next((c for c in reversed(self.chunks) if not c.cancelled and not c.done()), None)
+        if c is None:
+            return
+        moving = [it for i, it in c.items.items() if i not in self._delivered]
+        logger.warning(f'deadline in {self._time_left():.0f}s: moving {len(moving)} items of batch {c.batch_id} '
+                       f'to sync calls')
+        c.cancelled = True
+        self.stats.cancelled_batches += 1
+        self.stats.moved += len(moving)
+        for it in moving:
+            self._sync.put_nowait(it)
+        asyncio.create_task(self._cancel(c))
+
+    # DELIVERY
+
+    def _deliver(self, r: DispatchResult) -> None:
+        if r.id in self._delivered:
+            return
+        self._delivered.add(r.id)
+        if r.cost is not None and r.cost_usd is None:
+            usd = cost_usd(AI_MODELS[r.model].model_name, r.cost)
+            r.cost_usd = usd * BATCH_DISCOUNT if usd is not None and r.path == 'batch' else usd
+        if r.cost_usd is not None:
+            self.stats.cost_usd += r.cost_usd
+            self.stats.sync_cost_usd += r.cost_usd / BATCH_DISCOUNT if r.path == 'batch' else r.cost_usd
+        if r.path == 'batch':
+            self.stats.batch += 1
+        else:
+            self.stats.sync += 1
+        self._out.put_nowait(r)
+
+    @staticmethod
+    def _result(item: WorkItem, path: str, answer=None, error: str = None, cost: CallCost = None,
+                transport: bool = False) -> DispatchResult:
+        score = None
+        if item.challenge is not None:
+            if error is None:
+                score = AiChallengeScore(score=1 if item.challenge.is_correct(answer) else 0, format_error=0)
+            else:
+                score = AiChallengeScore(score=0, format_error=0 if transport else 1, transport_error=int(transport))
+        return DispatchResult(id=item.id, model=item.model, path=path, answer=answer, error=error, score=score,
+                              cost=cost)
+
+    # SYNC
+
+    async def _sync_worker(self) -> None:
+        import openai
+
+        while True:
+            item = await self._sync.get()
+            if item.id in self._delivered:
+                continue
+            self._in_flight += 1
+            st = time.perf_counter()
+            try:
+                answer, cost = await call_ai_model_async(item.model, item.messages, item.required_key, label=item.id)
+                result = self._result(item, 'sync', answer, cost=cost)
+            except Exception as e:
+                result = self._result(item, 'sync', error=f'{type(e).__name__}: {e}',
+                                      transport=isinstance(e, openai.APIError))
+            finally:
+                self._in_flight -= 1
+            self.sync_latency = 0.9 * self.sync_latency + 0.1 * (time.perf_counter() - st)
+            self._deliver(result)
+
+    # BATCH
+
+    def _request(self, item: WorkItem) -> dict:
+        config = AI_MODELS[item.model]
+        body = {'model': config.model_name, 'messages': item.messages}
+        if rf := response_format(config.json_mode, config.json_schema, None):
+            body['response_format'] = rf
+        return {'custom_id': item.id, 'method': 'POST', 'url': CHAT_COMPLETIONS_URL, 'body': body}
+
+    async def _submit(self, c: _Chunk, n: int) -> None:
+        """
+        Uploads the chunk and creates its batch; if that fails, the chunk's items are run sync instead (the other
+        chunks are not affected).
+        """
+        try:
+            await self._create_batch(c, n)
+        except Exception as e:
+            logger.error(f'cannot submit a batch of {len(c.items)} items ({type(e).__name__}: {e}), running them sync')
+            c.abandoned = True
+            self.stats.moved += len(c.items)
+            for it in c.items.values():
+                self._sync.put_nowait(it)
+
+    async def _create_batch(self, c: _Chunk, n: int) -> None:
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        path = self.work_dir / f'{int(time.time())}-{n}.jsonl'
+        with open(path, 'w', encoding='utf-8') as f:
+            for it in c.items.values():
+                f.write(json.dumps(self._request(it), ensure_ascii=False) + '\n')
+        client = model_async_client(AI_MODELS[c.model])
+        uploaded = await default_uploads().aupload(client, path, purpose='batch')
+        batch = await client.batches.create(input_file_id=uploaded.id, endpoint=CHAT_COMPLETIONS_URL,
+                                            completion_window='24h', metadata={'description': f'dispatch {path.name}'})
+        c.batch_id, c.status = batch.id, batch.status
+        self.stats.batches += 1
+        logger.info(f'{len(c.items)} items -> batch {batch.id}')
+
+    async def _cancel(self, c: _Chunk) -> None:
+        try:
+            await model_async_client(AI_MODELS[c.model]).batches.cancel(c.batch_id)
+        except Exception as e:
+            logger.warning(f'cannot cancel batch {c.batch_id}: {e}')
+
+    def _batch_result(self, item: WorkItem, r: BatchResult) -> DispatchResult:
+        cost = CallCost.from_batch_usage(r.response.body.get('usage'))
+        try:
+            return self._result(item, 'batch', parse_structured(r.content(), item.required_key), cost=cost)
+        except StructureError as e:
+            return self._result(item, 'batch', error=str(e), cost=cost)
+
+    async def _collect(self, c: _Chunk, batch) -> None:
+        client = model_client(AI_MODELS[c.model])
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            path = await asyncio.to_thread(download_file, client, file_id, self.work_dir / f'{file_id}.jsonl')
+            with BatchResultsFile(path) as results:
+                for r in results:
+                    if (item := c.items.get(r.custom_id)) is not None and r.ok:
+                        self._deliver(self._batch_result(item, r))
+        retry = [it for i, it in c.items.items() if i not in self._delivered]
+        if retry and not c.cancelled:  # failed or expired requests; items of cancelled batches are already queued
+            logger.warning(f'batch {c.batch_id} ({batch.status}): {len(retry)} requests left, running them sync')
+            self.stats.moved += len(retry)
+            for it in retry:
+                self._sync.put_nowait(it)
+
+    async def _check(self, c: _Chunk) -> None:
+        batch = await model_async_client(AI_MODELS[c.model]).batches.retrieve(c.batch_id)
+        if batch.status in TERMINAL_STATUSES:
+            await self._collect(c, batch)  # the status is kept only once collected: a failed download is retried
+        c.status = batch.status
+
+    def _abandon(self, c: _Chunk, e: Exception) -> None:
+        moving = [it for i, it in c.items.items() if i not in self._delivered]
+        logger.error(f'batch {c.batch_id}: {c.poll_errors} polls failed ({type(e).__name__}: {e}), '
+                     f'running its {len(moving)} remaining items sync')
+        c.abandoned = True
+        if c.cancelled:  # its items are already queued
+            return
+        self.stats.moved += len(moving)
+        for it in moving:
+            self._sync.put_nowait(it)
+        asyncio.create_task(self._cancel(c))
+
+    async def _poll(self) -> None:
+        while any(not c.done() for c in self.chunks):
+            self._rebalance()
+            await asyncio.sleep(max(0.1, min(self.poll_interval, self._time_left() / 10)))
+            for c in self.chunks:
+                if c.done():
+                    continue
+                try:
+                    await self._check(c)
+                    c.poll_errors = 0
+                except Exception as e:
+                    c.poll_errors += 1
+                    if c.poll_errors >= self.poll_retries:
+                        self._abandon(c, e)
+                    else:
+                        logger.warning(f'batch {c.batch_id}: poll failed ({type(e).__name__}: {e}), trying again')
+
+    # RUN
+
+    async def _next(self, tasks: list[asyncio.Task]) -> DispatchResult:
+        """
+        The next result; raises the error of a background task that died (its items would never arrive).
+        """
+        get = asyncio.ensure_future(self._out.get())
+        try:
+            while not get.done():
+                for t in tasks:
+                    if t.done() and not t.cancelled() and t.exception() is not None:
+                        raise t.exception()
+                await asyncio.wait([get, *(t for t in tasks if not t.done())], return_when=asyncio.FIRST_COMPLETED)
+            return get.result()
+        finally:
+            get.cancel()
+
+    async def results(self) -> AsyncIterator[DispatchResult]:
+        batch, sync = self.plan()
+        logger.info(f'{len(self.items)} items: {len(batch)} to batch, {len(sync)} sync, '
+                    f'deadline in {self._time_left():.0f}s')
+        for it in sync:
+            self._sync.put_nowait(it)
+        tasks = [asyncio.create_task(self._sync_worker()) for _ in range(self.concurrency)]
+        try:
+            by_model: dict[str, list[WorkItem]] = {}
+            for it in batch:
+                by_model.setdefault(it.model, []).append(it)
+            for model, items in by_model.items():
+                for i in range(0, len(items), self.chunk_size):
+                    self.chunks.append(_Chunk(model, items[i:i + self.chunk_size]))
+            await asyncio.gather(*(self._submit(c, n) for n, c in enumerate(self.chunks)))
+            tasks.append(asyncio.create_task(self._poll()))
+            while len(self._delivered) < len(self.items):
+                yield await self._next(tasks)
+            while not self._out.empty():
+                yield self._out.get_nowait()
+        finally:
+            for t in tasks:
+                t.cancel()
+            for c in self.chunks:
+                if not c.done() and not c.cancelled and c.batch_id:
+                    await self._cancel(c)
+        logger.info(f'dispatch: {self.stats}')
+
+
+async def _run(args) -> None:
+    suite = Suite(args.suite) if args.suite else Suite()
+    dispatcher = Dispatcher(items_from_suite(suite, args.model), parse_deadline(args.deadline), prefer=args.prefer,
+                            concurrency=args.concurrency, chunk_size=args.chunk_size,
+                            batch_turnaround=parse_deadline(args.batch_turnaround))
+    async for r in dispatcher.results():
+        print(f'{r.path:<6}{r.id:<28}{r.score.score if r.score else r.error}')
+    s = dispatcher.stats
+    print(f'{s.batch} batch, {s.sync} sync ({s.moved} moved from batch), ${s.cost_usd:.4f} '
+          f'(all sync: ${s.sync_cost_usd:.4f})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='run a suite through batch and/or sync calls by a deadline')
+    parser.add_argument('--suite', default=None)
+    parser.add_argument('--model', default='gpt-simple')
+    parser.add_argument('--deadline', default='24h', help='e.g. 90m, 6h')
+    parser.add_argument('--prefer', choices=['cheapest', 'balanced', 'fastest'], default='balanced')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--batch-turnaround', default='1h', help='expected batch completion time')
+    args = parser.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == '__main__':
+    main()
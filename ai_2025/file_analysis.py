@@ -2,70 +2,75 @@
 Code for analysis of PDF files (and - likely - other files as well).
 
 """
-import os
+from typing import TYPE_CHECKING
 
-from dotenv import load_dotenv
-from openai import OpenAI
-from openai.types import FileObject
+from ai_2025.common import AI_MODELS, model_client
+from ai_2025.uploads import upload_file
 
-from ai_2025.common import AI_MODELS
+if TYPE_CHECKING:  # the SDK is imported when the first client is created (see `clients`)
+    from openai import OpenAI
+    from openai.types import FileObject
 
 """
 Works with openai provider only (others have other file api).
 """
 
-def get_client() -> OpenAI:
-    config = AI_MODELS['gpt-simple']
-    key = os.getenv(config.key_name)
-    client = OpenAI(api_key=key, base_url=config.base_url)
-    return client
+def get_client() -> 'OpenAI':
+    return model_client(AI_MODELS['gpt-simple'])
 
 
-def upload_input_file(client, file_name: str = "q1.jsonl", purpose="batch") -> FileObject:
+def upload_input_file(client, file_name: str = "q1.jsonl", purpose="batch") -> 'FileObject':
     """
-
+    Uploads the file, or reuses the remote copy if the same contents were uploaded before (see `uploads`).
     :param client:
     :param file_name:
     :param purpose: "batch" or "user_data"
     :return:
     """
-    input_file = client.files.create(
-        file=open(file_name, "rb"),
-        purpose=purpose
-    )
+    return upload_file(client, file_name, purpose)
+
 
-    return input_file
+INVOICE_KEYS = ["nr_faktury", "data_wystawienia", "data_sprzedaży", "sprzedawca_nazwa",
+                "sprzedawca_nip", "nabywca_nazwa", "nabywca_nip", "razem_brutto",
+                "razem_netto"]
+
+INVOICE_INSTRUCTIONS = ("Przeanalizuj załączony PDF. "
+                        f"Zwróć json z następującymi polami: {INVOICE_KEYS}")
+
+
+def invoice_input(file_id: str, instructions: str = INVOICE_INSTRUCTIONS) -> list[dict]:
+    """
+    Responses API input for one invoice: the instructions, then the file. The instructions are too short for the
+    providers' prompt caches (about 1024 tokens minimum), so a cache hit needs the same file again (a retry).
+    """
+    return [
+        {
+            "role": "system",
+            "content": instructions,
+        },
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "input_file",
+                    "file_id": file_id,
+                },
+            ],
+        },
+    ]
 
 
 if __name__ == '__main__':
-    load_dotenv()
     client = get_client()
     up_file = upload_input_file(client, "faktura2.pdf", purpose="user_data")
     print(up_file)
     fid = up_file.id
 
-    keys = ["nr_faktury", "data_wystawienia", "data_sprzedaży", "sprzedawca_nazwa",
-            "sprzedawca_nip", "nabywca_nazwa", "nabywca_nip", "razem_brutto",
-            "razem_netto"]
-
     response = client.responses.create(
         model="gpt-4.1",
-        input=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "input_file",
-                        "file_id": fid,
-                    },
-                    {
-                        "type": "input_text",
-                        "text": "Przeanalizuj załączony PDF. "
-                                f"Zwróć json z następującymi polami: {keys}",
-                    },
-                ],
-            },
-        ],
+        input=invoice_input(fid),
     )
 
     print(response.output_text)
+    print(f'input tokens: {response.usage.input_tokens}, '
+          f'cached: {response.usage.input_tokens_details.cached_tokens}')
@@ -0,0 +1,350 @@
+"""
+Bulk invoice extraction: a directory (or manifest) of PDFs -> validated `Invoice` records in JSONL or SQLite.
+
+Files are uploaded once (see `uploads`) and sent concurrently through the responses API, with the provider
+scheduler's rate limiting and retries. Each result is validated against `Invoice` and written as soon as it is ready;
+the output doubles as the checkpoint - on restart, files that already have a valid record are skipped and failed ones
+are tried again. Very large jobs can go through the batch API instead (`--batch`, half the price, within 24h).
+
+    python -m ai_2025.invoices faktury/ --out faktury.db --concurrency 16
+    python -m ai_2025.invoices manifest.txt --out faktury.jsonl --batch
+"""
+import argparse
+import asyncio
+import json
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterator
+
+from loguru import logger
+from pydantic import BaseModel, ValidationError, field_validator
+
+from ai_2025.batch_chunking import ChunkedBatchJob
+from ai_2025.batch_results import BatchResult, BatchResultsFile
+from ai_2025.common import AI_MODELS, MODEL_GROUPS, CallCost, model_async_client, model_scheduler, primary_model
+from ai_2025.file_analysis import INVOICE_INSTRUCTIONS, invoice_input
+from ai_2025.routing import default_router
+from ai_2025.uploads import default_uploads
+
+RESPONSES_URL = '/v1/responses'
+
+
+# MODEL
+
+
+def _amount(v):
+    """
+    '1 234,56 zł' / '1.234,56' / '1,234.56' -> 1234.56; the last separator is the decimal one, unless it occurs more
+    than once ('1.234.567' -> 1234567)
+    """
+    if isinstance(v, str):
+        s = re.sub(r'[^\d,.\-]', '', v)
+        last = max(s.rfind(','), s.rfind('.'))
+        if last >= 0 and s.count(s[last]) == 1:
+            s = s[:last].replace(',', '').replace('.', '') + '.' + s[last + 1:]
+        else:
+            s = s.replace(',', '').replace('.', '')
+        return float(s) if s else None
+    return v
+
+
+class Invoice(BaseModel):
+    nr_faktury: str
+    data_wystawienia: str | None = None
+    data_sprzedaży: str | None = None
+    sprzedawca_nazwa: str | None = None
+    sprzedawca_nip: str | None = None
+    nabywca_nazwa: str | None = None
+    nabywca_nip: str | None = None
+    razem_brutto: float | None = None
+    razem_netto: float | None = None
+
+    @field_validator('razem_brutto', 'razem_netto', mode='before')
+    @classmethod
+    def _parse_amount(cls, v):
+        return _amount(v)
+
+    @field_validator('sprzedawca_nip', 'nabywca_nip', mode='before')
+    @classmethod
+    def _parse_nip(cls, v):
+        return re.sub(r'[\s\-]', '', v) if isinstance(v, str) else v
+
+
+INVOICE_FORMAT = {'format': {'type': 'json_schema', 'name': 'invoice', 'schema': Invoice.model_json_schema()}}
+
+
+class InvoiceRecord(BaseModel):
+    path: str
+    invoice: Invoice | None = None
+    error: str | None = None
+    prompt_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    completion_tokens: int = 0
+    processed_at: float
+
+
+def parse_invoice(text: str) -> Invoice:
+    return Invoice.model_validate_json(re.sub(r'```json\s*|\s*```', '', text).strip())
+
+
+def _usage_cost(usage: dict | None) -> CallCost:
+    usage = usage or {}
+    return CallCost(prompt_tokens=usage.get('input_tokens', 0), completion_tokens=usage.get('output_tokens', 0),
+                    cached_prompt_tokens=(usage.get('input_tokens_details') or {}).get('cached_tokens', 0))
+
+
+def _record(path: str, text: str | None, usage: dict | None, error: str = None) -> InvoiceRecord:
+    cost = _usage_cost(usage)
+    invoice = None
+    if error is None:
+        try:
+            invoice = parse_invoice(text)
+        except ValidationError as e:
+            error = f'invalid invoice: {e}'
+    return InvoiceRecord(path=path, invoice=invoice, error=error, prompt_tokens=cost.prompt_tokens,
+                         cached_prompt_tokens=cost.cached_prompt_tokens, completion_tokens=cost.completion_tokens,
+                         processed_at=time.time())
+
+
+# INPUT
+
+
+def iter_inputs(source: str | Path) -> Iterator[Path]:
+    """
+    PDFs of a directory (recursively, sorted) or of a manifest: one path per line, or JSONL with a `path` field;
+    relative paths are relative to the manifest.
+    """
+    source = Path(source)
+    if source.is_dir():
+        yield from sorted(source.rglob('*.pdf'))
+        return
+    with open(source, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            p = Path(json.loads(line)['path'] if line.startswith('{') else line)
+            yield p if p.is_absolute() else source.parent / p
+
+
+# OUTPUT
+
+
+class JsonlSink:
+    """
+    Appends one record per line; the last record of a path wins.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        if self.path.exists():
+            self._drop_partial_line()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _drop_partial_line(self) -> None:
+        """
+        A crash mid-write leaves the last line incomplete; it is cut off, so that the next record starts on a line of
+        its own (that file is tried again - it has no record).
+        """
+        with open(self.path, 'rb+') as f:
+            end = pos = f.seek(0, 2)
+            while pos > 0:
+                step = min(pos, 1 << 16)
+                f.seek(pos - step)
+                if (i := f.read(step).rfind(b'\n')) >= 0:
+                    pos += i + 1 - step
+                    break
+                pos -= step
+            if pos < end:
+                logger.warning(f'{self.path}: dropping an incomplete last record ({end - pos} bytes)')
+                f.truncate(pos)
+
+    def done(self) -> set[str]:
+        ok = {}
+        with open(self.path, encoding='utf-8') as f:
+            for n, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    r = json.loads(line)
+                except ValueError:
+                    logger.warning(f'{self.path}:{n}: skipping an undecodable record')
+                    continue
+                ok[r['path']] = r.get('invoice') is not None
+        return {p for p, v in ok.items() if v}
+
+    def write(self, record: InvoiceRecord) -> None:
+        self._file.write(record.model_dump_json() + '\n')
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class SqliteSink:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS invoices (
+            path TEXT PRIMARY KEY, invoice TEXT, error TEXT, nr_faktury TEXT, sprzedawca_nip TEXT,
+            razem_brutto REAL, prompt_tokens INTEGER, cached_prompt_tokens INTEGER, completion_tokens INTEGER,
+            processed_at REAL)''')
+        self.db.commit()
+
+    def done(self) -> set[str]:
+        return {r[0] for r in self.db.execute('SELECT path FROM invoices WHERE invoice IS NOT NULL')}
+
+    def write(self, record: InvoiceRecord) -> None:
+        inv = record.invoice
+        self.db.execute('INSERT OR REPLACE INTO invoices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+            record.path, inv.model_dump_json() if inv else None, record.error, inv.nr_faktury if inv else None,
+            inv.sprzedawca_nip if inv else None, inv.razem_brutto if inv else None, record.prompt_tokens,
+            record.cached_prompt_tokens, record.completion_tokens, record.processed_at))
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def open_sink(path: str | Path) -> JsonlSink | SqliteSink:
+    return SqliteSink(path) if Path(path).suffix in ('.db', '.sqlite', '.sqlite3') else JsonlSink(path)
+
+
+# PIPELINE
+
+
+class InvoicePipeline:
+    def __init__(self, source: str | Path, out: str | Path = 'invoices.jsonl', model: str = 'gpt-simple',
+                 concurrency: int = 8, instructions: str = INVOICE_INSTRUCTIONS):
+        """
+        :param source: directory of PDFs or manifest file
+        :param out: .jsonl or .db/.sqlite output, also the checkpoint
+        :param model: key of AI_MODELS or MODEL_GROUPS (openai entries - responses and file APIs); a group hedges slow
+            requests and fails over (see `routing`)
+        :param concurrency: files in flight
+        """
+        self.source = source
+        self.out = out
+        self.model = model
+        self.concurrency = concurrency
+        self.instructions = instructions
+
+    def _todo(self, done: set[str]) -> Iterator[Path]:
+        skipped = 0
+        for p in iter_inputs(self.source):
+            if str(p) in done:
+                skipped += 1
+                continue
+            yield p
+        if skipped:
+            logger.info(f'{skipped} files already extracted, skipped')
+
+    def _request(self, file_id: str, model: str = None) -> dict:
+        return {'model': AI_MODELS[model or primary_model(self.model)].model_name,
+                'input': invoice_input(file_id, self.instructions), 'text': INVOICE_FORMAT}
+
+    async def _respond(self, path: Path, model: str):
+        config = AI_MODELS[model]
+        client = model_async_client(config)
+        f = await default_uploads().aupload(client, path, purpose='user_data')
+        return await model_scheduler(config).acall(lambda: client.responses.create(**self._request(f.id, model)))
+
+    async def _extract(self, path: Path) -> InvoiceRecord:
+        try:
+            if self.model in MODEL_GROUPS:
+                response, _ = await default_router().run(self.model, lambda m: self._respond(path, m))
+            else:
+                response = await self._respond(path, self.model)
+        except Exception as e:
+            logger.error(f'{path}: {type(e).__name__}: {e}')
+            return _record(str(path), None, None, error=f'{type(e).__name__}: {e}')
+        return _record(str(path), response.output_text, response.usage.model_dump() if response.usage else None)
+
+    async def run(self) -> dict[str, int]:
+        """
+        Extracts all files not extracted yet; records are written in completion order.
+        """
+        sink = open_sink(self.out)
+        queue: asyncio.Queue[Path | None] = asyncio.Queue(maxsize=2 * self.concurrency)
+        counts = {'ok': 0, 'failed': 0}
+
+        async def feed():
+            try:
+                for p in self._todo(sink.done()):
+                    await queue.put(p)
+            finally:
+                for _ in range(self.concurrency):
+                    await queue.put(None)
+
+        async def work():
+            while (p := await queue.get()) is not None:
+                record = await self._extract(p)
+                sink.write(record)
+                counts['ok' if record.invoice else 'failed'] += 1
+
+        try:
+            await asyncio.gather(feed(), *(work() for _ in range(self.concurrency)))
+        finally:
+            sink.close()
+        logger.info(f'{self.out}: {counts["ok"]} extracted, {counts["failed"]} failed')
+        return counts
+
+    # BATCH
+
+    async def run_batch(self, work_dir: str | Path = None) -> dict[str, int]:
+        """
+        Same extraction through the batch API: uploads, one input file (split/resubmitted by `ChunkedBatchJob`),
+        then the merged results are written to the output.
+        """
+        config = AI_MODELS[primary_model(self.model)]
+        sink = open_sink(self.out)
+        try:
+            paths = list(self._todo(sink.done()))
+            if not paths:
+                return {'ok': 0, 'failed': 0}
+            files = await default_uploads().upload_many(model_async_client(config), paths, purpose='user_data',
+                                                        max_parallel=self.concurrency)
+            input_file = Path(self.out).with_suffix('.batch.jsonl')
+            with open(input_file, 'w', encoding='utf-8') as f:
+                for p, uploaded in zip(paths, files):
+                    f.write(json.dumps({'custom_id': str(p), 'method': 'POST', 'url': RESPONSES_URL,
+                                        'body': self._request(uploaded.id)}, ensure_ascii=False) + '\n')
+            merged = await ChunkedBatchJob(input_file, model=primary_model(self.model), work_dir=work_dir,
+                                           endpoint=RESPONSES_URL).run()
+            counts = {'ok': 0, 'failed': 0}
+            with BatchResultsFile(merged) as results:
+                for r in results:
+                    record = self._batch_record(r)
+                    sink.write(record)
+                    counts['ok' if record.invoice else 'failed'] += 1
+        finally:
+            sink.close()
+        logger.info(f'{self.out}: {counts["ok"]} extracted, {counts["failed"]} failed (batch)')
+        return counts
+
+    @staticmethod
+    def _batch_record(r: BatchResult) -> InvoiceRecord:
+        if not r.ok:
+            error = r.error.message if r.error else f'status {r.response.status_code if r.response else None}'
+            return _record(r.custom_id, None, None, error=error)
+        return _record(r.custom_id, r.output_text(), r.response.body.get('usage'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='bulk invoice extraction')
+    parser.add_argument('source', help='directory of PDFs or manifest (paths, one per line)')
+    parser.add_argument('--out', default='invoices.jsonl', help='.jsonl or .db output (and checkpoint)')
+    parser.add_argument('--model', default='gpt-simple')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--batch', action='store_true', help='go through the batch API')
+    args = parser.parse_args()
+
+    pipeline = InvoicePipeline(args.source, args.out, model=args.model, concurrency=args.concurrency)
+    asyncio.run(pipeline.run_batch() if args.batch else pipeline.run())
+
+
+if __name__ == '__main__':
+    main()
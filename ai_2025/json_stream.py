@@ -0,0 +1,98 @@
+"""
+Incremental extraction of one top-level key from a JSON object that arrives in pieces (streamed completions).
+
+Text before the first `{` (prose, code fences) is skipped. As soon as the value of the wanted key is complete it is
+decoded and `feed` returns True - whatever the model writes after it does not have to be read (or paid for).
+
+    x = KeyExtractor('answer')
+    for piece in ['```json\\n{"answer": "Nay', 'pyidaw", "why": "because ...']:
+        if x.feed(piece):
+            break
+    x.value  # 'Naypyidaw'
+"""
+import json
+
+
+class KeyExtractor:
+    def __init__(self, key: str):
+        self.key = key
+        self.buffer = ''
+        self.done = False  # the value was found, or the top-level object ended without it
+        self.found = False
+        self.value = None
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False  # next string at depth 1 is a key
+        self._key_start: int | None = None
+        self._current_key: str | None = None
+        self._awaiting_value = False  # after ':' at depth 1
+        self._value_start: int | None = None
+
+    def feed(self, text: str) -> bool:
+        """
+        Consumes the next piece of text; returns True when no more input is needed.
+        """
+        if self.done:
+            return True
+        self.buffer += text
+        buf = self.buffer
+        for i in range(self._pos, len(buf)):
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._current_key = json.loads(buf[self._key_start:i + 1])
+                        self._key_start = None
+                    elif self._depth == 1 and self._value_start is not None:
+                        self._complete(i + 1)
+                continue
+            if self._depth == 0:
+                if c == '{':
+                    self._depth, self._expect_key = 1, True
+                continue
+            if self._awaiting_value and not c.isspace():
+                self._awaiting_value, self._value_start = False, i
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect_key:
+                    self._expect_key, self._key_start = False, i
+            elif c in '{[':
+                self._depth += 1
+            elif c in '}]':
+                self._depth -= 1
+                if self._depth == 1 and self._value_start is not None:
+                    self._complete(i + 1)
+                elif self._depth == 0:
+                    if self._value_start is not None:  # scalar value closed by the object's end
+                        self._complete(i)
+                    self.done = True
+            elif self._depth == 1:
+                if c == ':':
+                    self._awaiting_value = True
+                elif c == ',':
+                    if self._value_start is not None:  # scalar value
+                        self._complete(i)
+                    self._expect_key = True
+            if self.done:
+                self._pos = i + 1
+                return True
+        self._pos = len(buf)
+        return self.done
+
+    def _complete(self, end: int) -> None:
+        raw = self.buffer[self._value_start:end].strip()
+        self._value_start = None
+        if self._current_key == self.key:
+            try:
+                self.value = json.loads(raw)
+            except ValueError:  # e.g. a Python literal (True, 'x'): not found, the caller decides (repair)
+                self.done = True
+                return
+            self.found = self.done = True
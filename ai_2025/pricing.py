@@ -0,0 +1,250 @@
+"""
+Machine-readable prices, cost accounting and per-run budgets.
+
+`PRICES` is keyed by `AI_Model.model_name` (the provider's name), in $ per million tokens, as in docs/pricing.md.
+`RunBudget` estimates the cost of a call before it is sent, and refuses it (`BudgetExceeded`) or downgrades it to a
+cheaper tier (`DOWNGRADES`) when the run's limit would be exceeded; actual costs are collected in a `CostLedger`
+(totals per model, per label - e.g. challenge id - and per run).
+
+    with budget_scope(RunBudget(limit_usd=2.0)) as budget:
+        run_all_challenges('gpt')
+    print(budget.ledger.summary())
+"""
+import contextvars
+import math
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from loguru import logger
+from pydantic import BaseModel
+
+from ai_2025.ratelimit import estimate_tokens
+
+DEFAULT_COMPLETION_TOKENS = 256  # assumed completion length when the request has no max_tokens
+BATCH_DISCOUNT = 0.5  # batch API price relative to sync calls
+
+
+class ModelPrice(BaseModel):
+    input: float  # $ per 1M prompt tokens
+    output: float  # $ per 1M completion tokens
+    cached_input: float | None = None  # $ per 1M cached prompt tokens; None = same as input
+    per_request: float = 0.0  # $ per request (e.g. search fees)
+
+
+PRICES: dict[str, ModelPrice] = {
+    # https://docs.x.ai/docs/models
+    "grok-3-latest": ModelPrice(input=3, output=15),
+    "grok-3-beta": ModelPrice(input=3, output=15),
+    "grok-3-fast-latest": ModelPrice(input=5, output=25),
+    "grok-3-mini-latest": ModelPrice(input=0.3, output=0.5),
+    # https://docs.anthropic.com/en/docs/about-claude/pricing
+    "claude-sonnet-4-20250514": ModelPrice(input=3, output=15, cached_input=0.3),
+    "claude-opus-4-20250514": ModelPrice(input=15, output=75, cached_input=1.5),
+    # perplexity: + ~$10 / 1000 requests
+    "sonar": ModelPrice(input=1, output=1, per_request=0.01),
+    "sonar-pro": ModelPrice(input=3, output=15, per_request=0.01),
+    # https://ai.google.dev/gemini-api/docs/pricing
+    "gemini-2.5-pro-preview-05-06": ModelPrice(input=10, output=15),
+    "gemini-2.5-flash-preview-05-20": ModelPrice(input=0.15, output=0.6),
+    # https://platform.openai.com/docs/pricing
+    "gpt-4.5-preview-2025-02-27": ModelPrice(input=75, output=150, cached_input=37.5),
+    "gpt-4.1-2025-04-14": ModelPrice(input=2, output=8, cached_input=0.5),
+    "gpt-4o-2024-08-06": ModelPrice(input=2.5, output=10, cached_input=1.25),
+}
+
+DOWNGRADES: dict[str, str] = {  # AI_MODELS key -> cheaper AI_MODELS key of the same provider
+    "gpt": "gpt-simple",
+    "gemini": "gemini-simple",
+    "grok": "grok-simple",
+}
+
+
+class BudgetExceeded(RuntimeError):
+    pass
+
+
+def price_of(model_name: str) -> ModelPrice | None:
+    return PRICES.get(model_name)
+
+
+def call_price(model_name: str, prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int = 0,
+               requests: int = 1) -> float | None:
+    """
+    $ cost of a call; None if the model has no price.
+    """
+    p = price_of(model_name)
+    if p is None:
+        return None
+    cached_rate = p.input if p.cached_input is None else p.cached_input
+    return ((prompt_tokens - cached_prompt_tokens) * p.input + cached_prompt_tokens * cached_rate
+            + completion_tokens * p.output) / 1e6 + requests * p.per_request
+
+
+def cost_usd(model_name: str, cost) -> float | None:
+    """
+    $ cost of a `CallCost` (replayed cache hits included - it is what the call would have cost).
+    """
+    return call_price(model_name, cost.prompt_tokens, cost.completion_tokens, cost.cached_prompt_tokens)
+
+
+def estimate_call(model_name: str, messages: list[dict], params: dict = None) -> float | None:
+    """
+    Upper-bound-ish $ estimate of a call before it is made (prompt ~4 chars/token; completion = max_tokens if set).
+    """
+    params = params or {}
+    completion = params.get('max_completion_tokens') or params.get('max_tokens') or DEFAULT_COMPLETION_TOKENS
+    completion *= params.get('n', 1)
+    return call_price(model_name, estimate_tokens(messages, completion_tokens=0), completion)
+
+
+class CostLedger:
+    """
+    Running $ totals; thread-safe.
+    """
+
+    def __init__(self, run: str = ''):
+        self.run = run
+        self.total = 0.0  # actually spent
+        self.replayed = 0.0  # what cache replays would have cost
+        self.coalesced = 0.0  # what calls sharing an identical in-flight request would have cost
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.by_model: dict[str, float] = {}
+        self.by_label: dict[str, float] = {}
+        self.unpriced: dict[str, int] = {}  # model -> calls without a known price
+        self._lock = threading.Lock()
+
+    def record(self, model_name: str, cost, label: str = None) -> float:
+        usd = cost_usd(model_name, cost)
+        with self._lock:
+            self.calls += 1
+            replayed, coalesced = getattr(cost, 'replayed', False), getattr(cost, 'coalesced', False)
+            if not replayed and not coalesced:
+                self.prompt_tokens += cost.prompt_tokens
+                self.cached_prompt_tokens += cost.cached_prompt_tokens
+            if usd is None:
+                self.unpriced[model_name] = self.unpriced.get(model_name, 0) + 1
+                return 0.0
+            if replayed:
+                self.replayed += usd
+                return 0.0
+            if coalesced:
+                self.coalesced += usd
+                return 0.0
+            self.total += usd
+            self.by_model[model_name] = self.by_model.get(model_name, 0.0) + usd
+            if label:
+                self.by_label[label] = self.by_label.get(label, 0.0) + usd
+        return usd
+
+    def cache_hit_ratio(self) -> float | None:
+        """
+        Share of input tokens served from the providers' prompt caches.
+        """
+        return self.cached_prompt_tokens / self.prompt_tokens if self.prompt_tokens else None
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {'run': self.run, 'total_usd': round(self.total, 6), 'replayed_usd': round(self.replayed, 6),
+                    'coalesced_usd': round(self.coalesced, 6),
+                    'calls': self.calls, 'by_model': dict(self.by_model), 'by_label': dict(self.by_label),
+                    'unpriced_calls': dict(self.unpriced), 'prompt_tokens': self.prompt_tokens,
+                    'cached_prompt_tokens': self.cached_prompt_tokens, 'prompt_cache_hit_ratio': self.cache_hit_ratio()}
+
+
+class RunBudget:
+    def __init__(self, limit_usd: float, ledger: CostLedger = None, downgrade: bool = True,
+                 strict: bool = False):
+        """
+        :param limit_usd: total spend allowed in this run
+        :param downgrade: when the call would not fit, try the cheaper tier from DOWNGRADES before refusing
+        :param strict: refuse models without a known price (otherwise they pass, with a warning)
+        """
+        self.limit_usd = limit_usd
+        self.ledger = ledger or CostLedger()
+        self.downgrade = downgrade
+        self.strict = strict
+        self._reserved = 0.0  # estimates of calls in flight
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        return self.limit_usd - self.ledger.total - self._reserved
+
+    def admit(self, model: str, messages: list[dict], params: dict = None) -> tuple[str, float]:
+        """
+        Picks the model to use for a call (`model` or its downgrade) and reserves its estimated cost.
+        :param model: key of AI_MODELS
+        :return: (AI_MODELS key to call, reserved estimate - pass it to `settle`)
+        """
+        from ai_2025.common import AI_MODELS
+
+        candidate = model
+        while candidate is not None:
+            estimate = estimate_call(AI_MODELS[candidate].model_name, messages, params)
+            if estimate is None:
+                if self.strict:
+                    raise BudgetExceeded(f'no price for {AI_MODELS[candidate].model_name}, refusing in strict mode')
+                if not math.isinf(self.limit_usd):
+                    logger.warning(f'no price for {AI_MODELS[candidate].model_name}; budget cannot account for it')
+                return candidate, 0.0
+            with self._lock:
+                if estimate <= self.remaining():
+                    self._reserved += estimate
+                    if candidate != model:
+                        logger.warning(f'budget: downgrading {model} -> {candidate}')
+                    return candidate, estimate
+            candidate = DOWNGRADES.get(candidate) if self.downgrade else None
+        raise BudgetExceeded(f'call to {model} would exceed the run budget of ${self.limit_usd:g} '
+                             f'(spent ${self.ledger.total:.4f})')
+
+    def settle(self, model: str, reserved: float, cost=None, label: str = None) -> None:
+        """
+        Releases the reservation and records the actual cost (`cost` is None if the call failed).
+        """
+        from ai_2025.common import AI_MODELS
+
+        with self._lock:
+            self._reserved -= reserved
+        if cost is not None:
+            self.ledger.record(AI_MODELS[model].model_name, cost, label)
+
+
+_budget: contextvars.ContextVar[RunBudget | None] = contextvars.ContextVar('run_budget', default=None)
+_env_budget: RunBudget | None = None
+
+
+def active_budget() -> RunBudget | None:
+    """
+    The budget of the current `budget_scope`; outside of any scope, a process-wide one if AI_RUN_BUDGET_USD is set.
+    """
+    global _env_budget
+    if (b := _budget.get()) is not None:
+        return b
+    if _env_budget is None and (limit := os.getenv('AI_RUN_BUDGET_USD')):
+        _env_budget = RunBudget(float(limit), CostLedger(run='env'))
+    return _env_budget
+
+
+def run_budget(budget_usd: float | None, run: str = '') -> RunBudget:
+    """
+    Budget for a run: a new one with the given limit, else the active one, else an unlimited one (which still keeps
+    the ledger - costs and prompt-cache hit ratio are reported either way).
+    """
+    if budget_usd is None and (active := active_budget()) is not None:
+        return active
+    return RunBudget(budget_usd if budget_usd is not None else math.inf, CostLedger(run=run))
+
+
+@contextmanager
+def budget_scope(budget: RunBudget) -> Iterator[RunBudget]:
+    """
+    Applies `budget` to all `call_ai_model` calls made in this context (asyncio tasks created inside included).
+    """
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
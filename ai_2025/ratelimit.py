@@ -0,0 +1,228 @@
+"""
+Per-provider request scheduling: requests-per-minute / tokens-per-minute budgets plus retries.
+
+Budgets are token buckets with reservations: a caller reserves what it needs and sleeps for the returned delay, so
+waiting callers are served in order and nobody polls. A reservation is settled with the real usage on success and
+returned in full when the attempt fails (each retry reserves again). On a 429 the whole provider is paused until
+`Retry-After`, which keeps concurrent workers from hammering an endpoint that already said "slow down".
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from functools import cache
+from typing import Awaitable, Callable, TypeVar
+
+from loguru import logger
+from pydantic import BaseModel
+
+T = TypeVar('T')
+
+
+@cache
+def retryable_errors() -> tuple[type[Exception], ...]:
+    """
+    429, 5xx and connection errors (timeouts included); resolved on first use so that importing this module doesn't
+    import the openai SDK.
+    """
+    import openai
+
+    return openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        """
+        :param per_minute: sustained rate (requests or tokens per minute)
+        :param burst_seconds: bucket capacity expressed as seconds of sustained rate
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """
+        Takes `amount` from the bucket (possibly going into debt) and returns how long the caller must wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            self.level -= amount
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float) -> None:
+        """
+        Corrects an earlier reservation (negative `amount` charges extra).
+        """
+        with self._lock:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class SchedulerStats(BaseModel):
+    requests: int = 0
+    retries: int = 0
+    throttled: int = 0  # 429 responses
+    failures: int = 0  # calls that failed after all retries
+
+
+class CallTrace(BaseModel):
+    queue_time: float = 0.0  # seconds spent waiting for the budget or between retries
+    retries: int = 0
+
+
+def estimate_tokens(messages: list[dict], completion_tokens: int = 256) -> int:
+    """
+    Rough token count of a chat request (~4 characters per token) plus the expected completion.
+    """
+    return len(json.dumps(messages, ensure_ascii=False)) // 4 + completion_tokens
+
+
+def retry_after(e: Exception) -> float | None:
+    """
+    Seconds to wait as requested by the provider (`retry-after-ms` / `retry-after` headers), if any.
+    """
+    response = getattr(e, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    if (ms := headers.get('retry-after-ms')) is not None:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    if (value := headers.get('retry-after')) is not None:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+class ProviderScheduler:
+    def __init__(self, name: str, rpm: int | None = None, tpm: int | None = None, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        """
+        :param name: for logging
+        :param rpm: requests per minute; None = unlimited
+        :param tpm: tokens (prompt + completion) per minute; None = unlimited
+        :param max_retries: retries of retryable errors (429, 5xx, connection problems)
+        :param base_delay: first backoff step in seconds; doubled on each retry, with full jitter
+        """
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.paused_until = 0.0  # monotonic time; set on 429
+        self.stats = SchedulerStats()
+
+    def _admission_delay(self, tokens: int) -> float:
+        delay = max(0.0, self.paused_until - time.monotonic())
+        if self.requests:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        return delay
+
+    def _settle(self, estimated: int, used: int | None) -> None:
+        if self.tokens and used is not None:
+            self.tokens.refund(estimated - used)
+
+    def _backoff(self, e: Exception, attempt: int) -> float:
+        import openai
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if isinstance(e, openai.RateLimitError):
+            self.stats.throttled += 1
+            if (ra := retry_after(e)) is not None:
+                delay = ra + random.uniform(0, self.base_delay)
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+    def call(self, fn: Callable[[], T], estimated_tokens: int = 0, used_tokens: Callable[[T], int] = None,
+             trace: CallTrace = None) -> T:
+        """
+        Runs `fn` within the provider budget, retrying retryable errors; the last error is re-raised.
+        :param estimated_tokens: tokens reserved up front (see `estimate_tokens`)
+        :param used_tokens: extracts the real token usage from the result, to correct the reservation
+        :param trace: filled with the waiting time and number of retries of this call
+        """
+        trace = trace if trace is not None else CallTrace()
+        for attempt in range(self.max_retries + 1):
+            if (delay := self._admission_delay(estimated_tokens)) > 0:
+                trace.queue_time += delay
+                time.sleep(delay)
+            self.stats.requests += 1
+            try:
+                res = fn()
+            except Exception as e:
+                self._settle(estimated_tokens, 0)  # a failed attempt used no tokens; a retry reserves them again
+                if not isinstance(e, retryable_errors()):
+                    raise
+                if attempt == self.max_retries:
+                    self.stats.failures += 1
+                    raise
+                delay = self._backoff(e, attempt)
+                self.stats.retries += 1
+                trace.retries += 1
+                trace.queue_time += delay
+                logger.warning(f'{self.name}: {type(e).__name__}, retry {attempt + 1} in {delay:.1f}s')
+                time.sleep(delay)
+                continue
+            self._settle(estimated_tokens, used_tokens(res) if used_tokens else None)
+            return res
+
+    async def acall(self, fn: Callable[[], Awaitable[T]], estimated_tokens: int = 0,
+                    used_tokens: Callable[[T], int] = None, trace: CallTrace = None) -> T:
+        """
+        `call` for coroutines; `fn` must create a fresh awaitable on every invocation.
+        """
+        trace = trace if trace is not None else CallTrace()
+        for attempt in range(self.max_retries + 1):
+            if (delay := self._admission_delay(estimated_tokens)) > 0:
+                trace.queue_time += delay
+                await asyncio.sleep(delay)
+            self.stats.requests += 1
+            try:
+                res = await fn()
+            except Exception as e:
+                self._settle(estimated_tokens, 0)  # a failed attempt used no tokens; a retry reserves them again
+                if not isinstance(e, retryable_errors()):
+                    raise
+                if attempt == self.max_retries:
+                    self.stats.failures += 1
+                    raise
+                delay = self._backoff(e, attempt)
+                self.stats.retries += 1
+                trace.retries += 1
+                trace.queue_time += delay
+                logger.warning(f'{self.name}: {type(e).__name__}, retry {attempt + 1} in {delay:.1f}s')
+                await asyncio.sleep(delay)
+                continue
+            self._settle(estimated_tokens, used_tokens(res) if used_tokens else None)
+            return res
+
+
+_schedulers: dict[tuple, ProviderScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(name: str, base_url: str, model_name: str, rpm: int | None, tpm: int | None) -> ProviderScheduler:
+    """
+    Returns the process-wide scheduler for one endpoint + model (limits are enforced per model by the providers).
+    """
+    k = (base_url, model_name)
+    with _schedulers_lock:
+        if k not in _schedulers:
+            _schedulers[k] = ProviderScheduler(name, rpm=rpm, tpm=tpm)
+        return _schedulers[k]
@@ -0,0 +1,254 @@
+"""
+SQLite store of challenge results across runs: what each model answered, its score, cost and latency.
+
+Writes go through a background thread that inserts in bulk (`executemany` per batch of rows, one transaction), so
+recording a result never waits for the disk. A batch that cannot be written is dropped and logged, and the error is
+raised by the next `flush` (or `close`). The `results` table is indexed for the two common questions - accuracy
+over time and what changed between two runs. The indexes cover every column these queries read, so they never
+touch the table rows: a run or a model is an index range search, and accuracy of all models reads one index in
+group order.
+
+    store = ResultsStore()
+    results = asyncio.run(sweep(['gpt-simple', 'gemini-simple'], store=store, run_name='nightly'))
+    store.accuracy_over_time('gpt-simple')
+    store.regressions(run_a, run_b)
+"""
+import argparse
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from loguru import logger
+from pydantic import BaseModel
+
+from ai_2025.common import AI_MODELS
+from ai_2025.pricing import cost_usd
+from ai_2025.runner import ChallengeResult
+
+DB_FILE = Path('results.db')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    suite TEXT NOT NULL DEFAULT '',
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    model TEXT NOT NULL,
+    challenge TEXT NOT NULL,
+    answer TEXT,
+    score INTEGER NOT NULL,
+    format_error INTEGER NOT NULL,
+    transport_error INTEGER NOT NULL,
+    prompt_tokens INTEGER,
+    cached_prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    cost_usd REAL,
+    latency REAL,
+    created_at REAL NOT NULL
+);
+DROP INDEX IF EXISTS idx_results_run;
+DROP INDEX IF EXISTS idx_results_model;
+CREATE INDEX IF NOT EXISTS idx_results_by_run ON results(transport_error, run_id, model, challenge, score, cost_usd);
+CREATE INDEX IF NOT EXISTS idx_results_by_model ON results(model, transport_error, run_id, score, cost_usd);
+CREATE INDEX IF NOT EXISTS idx_results_challenge ON results(challenge, model, run_id);
+'''
+
+
+class AccuracyPoint(BaseModel):
+    run_id: int
+    run_name: str
+    started_at: float
+    model: str
+    results: int
+    accuracy: float
+    cost_usd: float | None = None
+
+
+class ScoreChange(BaseModel):
+    model: str
+    challenge: str
+    score_a: float  # mean score in run a (1.0 = always correct)
+    score_b: float
+
+
+def _row(run_id: int, r: ChallengeResult) -> tuple:
+    c = r.cost
+    usd = cost_usd(AI_MODELS[r.model_name].model_name, c) if c is not None and r.model_name in AI_MODELS else None
+    return (run_id, r.model_name, r.challenge, r.answer, r.score.score, r.score.format_error, r.score.transport_error,
+            c.prompt_tokens if c else None, c.cached_prompt_tokens if c else None, c.completion_tokens if c else None,
+            usd, r.elapsed, time.time())
+
+
+class ResultsStore:
+    def __init__(self, path: str | Path = DB_FILE, batch_size: int = 1000, flush_interval: float = 1.0):
+        """
+        :param batch_size: rows per insert transaction
+        :param flush_interval: longest time (seconds) a queued row waits before it is written
+        """
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        db = self._connect()
+        db.executescript(SCHEMA)
+        db.close()
+        self._queue: queue.Queue[tuple | None] = queue.Queue()
+        self._error: Exception | None = None  # first write error since the last flush
+        self.dropped = 0  # rows that could not be written
+        self._writer = threading.Thread(target=self._write_loop, name='results-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        return db
+
+    # WRITE
+
+    def _write_loop(self) -> None:
+        db = None
+        stop = False
+        while not stop:
+            rows = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                while True:
+                    if item is None:
+                        stop = True
+                        break
+                    rows.append(item)
+                    if len(rows) >= self.batch_size:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            if rows:
+                try:
+                    db = db or self._connect()
+                    with db:
+                        db.executemany('INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                except Exception as e:  # the writer must go on, or flush() would wait forever
+                    logger.error(f'results store: {len(rows)} rows not written ({type(e).__name__}: {e})')
+                    self.dropped += len(rows)
+                    self._error = self._error or e
+                finally:
+                    for _ in rows:
+                        self._queue.task_done()
+        self._queue.task_done()  # the sentinel
+        if db is not None:
+            db.close()
+
+    def start_run(self, name: str = '', suite: str = '') -> int:
+        db = self._connect()
+        with db:
+            run_id = db.execute('INSERT INTO runs (name, suite, started_at) VALUES (?, ?, ?)',
+                                (name, suite, time.time())).lastrowid
+        db.close()
+        logger.info(f'results store: run {run_id} ({name})')
+        return run_id
+
+    def add(self, run_id: int, result: ChallengeResult) -> None:
+        """
+        Queues the result; it is written by the background writer.
+        """
+        self._queue.put(_row(run_id, result))
+
+    def _raise_error(self) -> None:
+        if (e := self._error) is not None:
+            self._error = None
+            raise e
+
+    def flush(self) -> None:
+        """
+        Waits until everything queued so far is written; raises the first write error since the last flush.
+        """
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # QUERIES
+
+    def _query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        db = self._connect()
+        try:
+            return db.execute(sql, params).fetchall()
+        finally:
+            db.close()
+
+    def accuracy_over_time(self, model: str = None, since: float = None) -> list[AccuracyPoint]:
+        """
+        Accuracy per run and model, oldest run first; transport errors are not counted as answers.
+        """
+        rows = self._query(f'''
+            SELECT r.id, r.name, r.started_at, x.model, COUNT(*), AVG(x.score), SUM(x.cost_usd)
+            FROM results x JOIN runs r ON r.id = x.run_id
+            WHERE x.transport_error = 0 {'AND x.model = ?' if model else ''} {'AND r.started_at >= ?' if since else ''}
+            GROUP BY x.run_id, x.model
+            ORDER BY r.started_at, x.model''', tuple(p for p in (model, since) if p))
+        return [AccuracyPoint(run_id=a, run_name=b, started_at=c, model=d, results=e, accuracy=f, cost_usd=g)
+                for a, b, c, d, e, f, g in rows]
+
+    def regressions(self, run_a: int, run_b: int, model: str = None,
+                    include_improvements: bool = False) -> list[ScoreChange]:
+        """
+        (model, challenge) pairs whose mean score dropped from `run_a` to `run_b` (or changed at all).
+        """
+        rows = self._query(f'''
+            WITH a AS (SELECT model, challenge, AVG(score) AS s FROM results
+                       WHERE run_id = ? AND transport_error = 0 GROUP BY model, challenge),
+                 b AS (SELECT model, challenge, AVG(score) AS s FROM results
+                       WHERE run_id = ? AND transport_error = 0 GROUP BY model, challenge)
+            SELECT a.model, a.challenge, a.s, b.s FROM a JOIN b USING (model, challenge)
+            WHERE {'a.s != b.s' if include_improvements else 'b.s < a.s'} {'AND a.model = ?' if model else ''}
+            ORDER BY a.model, b.s - a.s, a.challenge''', (run_a, run_b) + ((model,) if model else ()))
+        return [ScoreChange(model=m, challenge=c, score_a=sa, score_b=sb) for m, c, sa, sb in rows]
+
+    def runs(self, limit: int = 20) -> list[tuple]:
+        return self._query('SELECT id, name, suite, started_at FROM runs ORDER BY id DESC LIMIT ?', (limit,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='challenge results across runs')
+    parser.add_argument('--db', default=str(DB_FILE))
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('runs')
+    acc = sub.add_parser('accuracy')
+    acc.add_argument('--model', default=None)
+    diff = sub.add_parser('diff')
+    diff.add_argument('run_a', type=int)
+    diff.add_argument('run_b', type=int)
+    diff.add_argument('--model', default=None)
+    diff.add_argument('--all', action='store_true', help='improvements too')
+    args = parser.parse_args()
+
+    with ResultsStore(args.db) as store:
+        if args.command == 'runs':
+            for run_id, name, suite, started_at in store.runs():
+                print(f'{run_id:>6} {time.strftime("%Y-%m-%d %H:%M", time.localtime(started_at))} {name} {suite}')
+        elif args.command == 'accuracy':
+            for p in store.accuracy_over_time(args.model):
+                print(f'{p.run_id:>6} {time.strftime("%Y-%m-%d %H:%M", time.localtime(p.started_at))} '
+                      f'{p.model:<16}{p.accuracy:>7.1%} of {p.results}')
+        else:
+            for c in store.regressions(args.run_a, args.run_b, args.model, include_improvements=args.all):
+                print(f'{c.model:<16}{c.challenge:<28}{c.score_a:.2f} -> {c.score_b:.2f}')
+
+
+if __name__ == '__main__':
+    main()
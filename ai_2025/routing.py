@@ -0,0 +1,236 @@
+"""
+Routing of calls to a model group: interchangeable `AI_MODELS` entries tried in order, with hedging and failover.
+
+A call goes to the first healthy member of the group. If it has not answered within the member's recent latency
+percentile (p95 by default), the same request is also sent to the next member and whichever answers first wins; the
+other is cancelled. A member that fails with a transport error (after the provider scheduler's own retries) is
+replaced by the next one at once. Members that fail several times in a row are skipped for a cooldown, so a stalled
+provider stops costing every call its hedge delay. Members priced above `max_price_ratio` times the group's first
+member are never called, so a slow cheap model doesn't silently turn into an expensive one.
+
+Hedged requests that lose are cancelled mid-flight; the provider may still bill what it generated, which the run's
+ledger does not see (see `Router.stats` for how many there were).
+
+    answer, cost = await call_ai_model_async('simple-any', prompt, 'answer')  # groups are accepted wherever models are
+    router = Router(hedge_percentile=0.9)
+    answer, cost, served_by = await router.call('pro-any', prompt, 'answer')
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+from loguru import logger
+from pydantic import BaseModel
+
+from ai_2025.common import AI_MODELS, MODEL_GROUPS, call_ai_model_async
+from ai_2025.pricing import price_of
+from ai_2025.ratelimit import retryable_errors
+
+T = TypeVar('T')
+
+
+class RouterStats(BaseModel):
+    calls: int = 0
+    hedged: int = 0  # calls where a second member was started because the first was slow
+    hedge_wins: int = 0  # ... and the second member answered first
+    failovers: int = 0  # members replaced after an error
+
+
+class EndpointHealth:
+    def __init__(self, window: int = 200):
+        """
+        :param window: number of recent successful latencies kept for the percentile
+        """
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.down_until = 0.0  # monotonic time
+
+    def record_success(self, latency: float) -> None:
+        self.latencies.append(latency)
+        self.successes += 1
+        self.consecutive_failures = 0
+
+    def record_failure(self, threshold: int, cooldown: float) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= threshold:
+            self.down_until = time.monotonic() + cooldown
+
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def percentile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+    def __repr__(self):
+        latency = f', p50={self.percentile(0.5):.2f}s, p95={self.percentile(0.95):.2f}s' if self.latencies else ''
+        return f'{self.successes} ok, {self.failures} failed{latency}{"" if self.healthy() else ", down"}'
+
+
+def _own_latency(res: tuple, elapsed: float) -> float | None:
+    """
+    Latency of a `call_ai_model_async` result, unless it didn't make its own request (cache replay, coalesced call).
+    """
+    cost = res[1]
+    return None if cost is not None and (cost.replayed or cost.coalesced) else elapsed
+
+
+def _price(model: str) -> float | None:
+    """
+    $ per 1M input + 1M output tokens, to compare members; None if unknown.
+    """
+    p = price_of(AI_MODELS[model].model_name)
+    return None if p is None else p.input + p.output
+
+
+class Router:
+    def __init__(self, groups: dict[str, list[str]] = None, hedge_percentile: float = 0.95,
+                 default_hedge_delay: float = 20.0, min_hedge_delay: float = 1.0, max_hedge_delay: float = 120.0,
+                 min_samples: int = 20, failure_threshold: int = 3, cooldown: float = 60.0,
+                 max_price_ratio: float | None = 2.0):
+        """
+        :param groups: group name -> keys of AI_MODELS in order of preference (default MODEL_GROUPS)
+        :param hedge_percentile: a member slower than this share of its recent calls gets a hedged request
+        :param default_hedge_delay: seconds, until a member has `min_samples` latencies
+        :param failure_threshold: consecutive transport failures that take a member out for `cooldown` seconds
+        :param max_price_ratio: members priced above this multiple of the group's first member are not used (nor
+            members without a known price, if the first one has one); None = no limit
+        """
+        self.groups = groups if groups is not None else MODEL_GROUPS
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_price_ratio = max_price_ratio
+        self.health: dict[str, EndpointHealth] = {}
+        self.stats = RouterStats()
+
+    def _health(self, model: str) -> EndpointHealth:
+        return self.health.setdefault(model, EndpointHealth())
+
+    def affordable(self, group: str) -> list[str]:
+        """
+        Members of the group within `max_price_ratio` of the first one's price.
+        """
+        members = self.groups[group]
+        base = _price(members[0])
+        if self.max_price_ratio is None or base is None:
+            return members
+        allowed = [m for m in members if (p := _price(m)) is not None and p <= base * self.max_price_ratio]
+        if len(allowed) < len(members):
+            logger.debug(f'{group}: {", ".join(m for m in members if m not in allowed)} not used (priced above '
+                         f'{self.max_price_ratio:g}x {members[0]}, or not priced)')
+        return allowed
+
+    def candidates(self, group: str) -> list[str]:
+        """
+        Affordable members of the group, healthy ones first (each part in the configured order).
+        """
+        members = self.affordable(group)
+        healthy = [m for m in members if self._health(m).healthy()]
+        return healthy + [m for m in members if m not in healthy]
+
+    def hedge_delay(self, model: str) -> float:
+        h = self._health(model)
+        if len(h.latencies) < self.min_samples:
+            return self.default_hedge_delay
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, h.percentile(self.hedge_percentile)))
+
+    async def run(self, group: str, fn: Callable[[str], Awaitable[T]],
+                  latency_of: Callable[[T, float], float | None] = None) -> tuple[T, str]:
+        """
+        Runs `fn(model)` on the members of `group` with hedging and failover (the generic form of `call`).
+        :param fn: makes the request to one member (key of AI_MODELS); endpoint problems are `retryable_errors`
+        :param latency_of: latency to record for a result (None = don't record, e.g. a response-cache replay);
+            default the measured time
+        :return: (result of the member that answered first, that member)
+        """
+        self.stats.calls += 1
+        queue = self.candidates(group)
+        running: dict[asyncio.Task, tuple[str, float]] = {}
+        error: Exception | None = None
+
+        def start(model: str) -> None:
+            running[asyncio.create_task(fn(model))] = (model, time.perf_counter())
+
+        start(queue.pop(0))
+        try:
+            while running:
+                first = next(iter(running.values()))[0]
+                timeout = self.hedge_delay(first) if queue and len(running) == 1 else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:  # the first member is slow: hedge
+                    self.stats.hedged += 1
+                    logger.info(f'{group}: {first} slower than {timeout:.1f}s, hedging with {queue[0]}')
+                    start(queue.pop(0))
+                    continue
+                for task in done:
+                    model, st = running.pop(task)
+                    try:
+                        res = task.result()
+                    except retryable_errors() + (asyncio.TimeoutError,) as e:  # endpoint problems, not bad answers
+                        self._health(model).record_failure(self.failure_threshold, self.cooldown)
+                        logger.warning(f'{group}: {model} failed ({type(e).__name__}: {e})')
+                        error = e
+                        if queue and not running:
+                            self.stats.failovers += 1
+                            start(queue.pop(0))
+                        continue
+                    elapsed = time.perf_counter() - st
+                    latency = elapsed if latency_of is None else latency_of(res, elapsed)
+                    if latency is not None:
+                        self._health(model).record_success(latency)
+                    if model != first:
+                        self.stats.hedge_wins += 1
+                    return res, model
+            raise error
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def call(self, group: str, prompt: list[dict], required_key: str, **kwargs) -> tuple[object, object, str]:
+        """
+        `call_ai_model_async` routed within `group`.
+        :return: (answer, CallCost, member that answered)
+        """
+        (answer, usage), model = await self.run(
+            group, lambda m: call_ai_model_async(m, prompt, required_key, **kwargs),
+            latency_of=_own_latency)
+        return answer, usage, model
+
+    def report(self) -> str:
+        return '\n'.join([str(self.stats)] + [f'{m:>16}: {h!r}' for m, h in self.health.items()])
+
+
+_router: Router | None = None
+
+
+def default_router() -> Router:
+    global _router
+    if _router is None:
+        _router = Router()
+    return _router
+
+
+if __name__ == '__main__':
+    from ai_2025.common import prompt_for_json
+
+    async def _demo():
+        router = default_router()
+        prompt = prompt_for_json('Capital of Poland?', 'answer')
+        res = await asyncio.gather(*(router.call('simple-any', prompt, 'answer', cache_mode='bypass')
+                                     for _ in range(10)))
+        print([(a, m) for a, _, m in res])
+        print(router.report())
+
+    asyncio.run(_demo())
@@ -0,0 +1,124 @@
+"""
+Concurrent runner for the models x challenges matrix.
+
+Each model gets its own pass over the challenges and its own async workers, so a slow or strict provider only
+throttles itself. Concurrency is limited per provider account (`base_url` + key, as clients are shared): entries
+of one account - e.g. `gpt` and `gpt-simple` - share at most `AI_Model.max_in_flight` requests in flight. Results
+are yielded as they finish. Challenges are streamed, never materialized: pass a re-iterable collection (a `Suite` or
+a list) - it is iterated once per model.
+"""
+import asyncio
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Iterable
+
+from loguru import logger
+from pydantic import BaseModel
+
+from ai_2025.ai_challenge import AiChallengeScore, attempt_challenge_async
+from ai_2025.common import AI_MODELS, CallCost, primary_model
+from ai_2025.pricing import BudgetExceeded, budget_scope, run_budget
+from ai_2025.suite import ChallengeData, Suite
+
+if TYPE_CHECKING:
+    from ai_2025.results_store import ResultsStore
+
+
+def _account(model: str) -> tuple[str, str]:
+    config = AI_MODELS[primary_model(model)]
+    return config.base_url, config.key_name
+
+
+class ChallengeResult(BaseModel):
+    model_name: str
+    challenge: str
+    score: AiChallengeScore
+    elapsed: float  # seconds, the call itself (including provider retries)
+    answer: str | None = None
+    cost: CallCost | None = None
+
+
+async def run_matrix(models: list[str], challenges: Iterable[ChallengeData] = None,
+                     max_in_flight: dict[str, int] = None) -> AsyncIterator[ChallengeResult]:
+    """
+    Runs every challenge against every model concurrently, yielding results in completion order.
+    :param models: keys of `AI_MODELS` or `MODEL_GROUPS`
+    :param challenges: re-iterable challenges; defaults to the default `Suite`
+    :param max_in_flight: per-model override of `AI_Model.max_in_flight`; models of one account share the smallest
+        limit among them
+    """
+    challenges = challenges if challenges is not None else Suite()
+    max_in_flight = max_in_flight or {}
+    results: asyncio.Queue[ChallengeResult | None] = asyncio.Queue()
+
+    async def feed(queue: asyncio.Queue, n_workers: int):
+        try:
+            for ch in challenges:
+                await queue.put(ch)
+        finally:
+            for _ in range(n_workers):
+                await queue.put(None)
+
+    async def work(model: str, queue: asyncio.Queue, slots: asyncio.Semaphore):
+        while (ch := await queue.get()) is not None:
+            try:
+                async with slots:
+                    st = time.perf_counter()
+                    attempt = await attempt_challenge_async(ch, model)
+            except BudgetExceeded as e:
+                logger.error(f'{model}: {e}')
+                break
+            await results.put(ChallengeResult(model_name=model, challenge=ch.id, score=attempt.score,
+                                              elapsed=time.perf_counter() - st, answer=attempt.answer,
+                                              cost=attempt.cost))
+        await results.put(None)
+
+    limits: dict[tuple[str, str], int] = {}
+    for m in models:
+        n = max(1, max_in_flight.get(m, AI_MODELS[primary_model(m)].max_in_flight))
+        limits[_account(m)] = min(n, limits.get(_account(m), n))
+    slots = {a: asyncio.Semaphore(n) for a, n in limits.items()}
+
+    tasks = []
+    for m in models:
+        n_workers = limits[_account(m)]  # each model may use the whole account once the others are done
+        queue = asyncio.Queue(maxsize=2 * n_workers)
+        tasks.append(asyncio.create_task(feed(queue, n_workers)))
+        tasks += [asyncio.create_task(work(m, queue, slots[_account(m)])) for _ in range(n_workers)]
+    running = len(tasks) - len(models)  # workers
+
+    try:
+        while running:
+            r = await results.get()
+            if r is None:
+                running -= 1
+            else:
+                yield r
+    finally:
+        for t in tasks:
+            t.cancel()
+
+
+async def sweep(models: list[str], challenges: Iterable[ChallengeData] = None, budget_usd: float = None,
+                store: 'ResultsStore' = None, run_name: str = '') -> list[ChallengeResult]:
+    """
+    :param budget_usd: spend limit shared by all models; calls that would exceed it are downgraded or refused
+    :param store: also record the results there, as a new run named `run_name`
+    """
+    st = time.perf_counter()
+    results = []
+    run_id = store.start_run(run_name, suite=str(getattr(challenges, 'path', ''))) if store is not None else None
+    with budget_scope(run_budget(budget_usd, run='sweep')) as budget:
+        async for r in run_matrix(models, challenges):
+            logger.info(f'{r.model_name:>14} {r.challenge:<24} {r.score} ({r.elapsed:.1f}s)')
+            results.append(r)
+            if store is not None:
+                store.add(run_id, r)
+    if store is not None:
+        store.flush()
+    logger.warning(f'{len(results)} calls done in {time.perf_counter() - st:.1f}s')
+    logger.warning(f'cost: {budget.ledger.summary()}')
+    return results
+
+
+if __name__ == '__main__':
+    asyncio.run(sweep(list(AI_MODELS.keys())))
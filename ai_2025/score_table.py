@@ -0,0 +1,277 @@
+"""
+Columnar score table: large sweeps summarized with NumPy instead of per-result pydantic objects.
+
+Every result is one row across typed arrays (model and challenge as small integer codes, 0/1 flags as int8, tokens
+as int32, cost and latency as float32 - about 30 bytes a row), so a million results take ~30 MB and aggregations
+are `bincount`s. Confidence intervals of accuracy are bootstrapped without resampling rows: the number of correct
+answers in a bootstrap resample of n rows with k correct is Binomial(n, k/n), so B resamples of every model at once
+are one `rng.binomial` call.
+
+    table = ScoreTable.from_results(asyncio.run(sweep(models)))
+    table = ScoreTable.from_store(ResultsStore(), run_id=12)
+    print(table.report())
+"""
+import argparse
+from typing import Iterable
+
+import numpy as np
+from pydantic import BaseModel
+
+from ai_2025.suite import ChallengeData
+
+COLUMNS = {
+    'model': np.int32,
+    'challenge': np.int32,
+    'score': np.int8,
+    'format_error': np.int8,
+    'transport_error': np.int8,
+    'prompt_tokens': np.int32,
+    'cached_prompt_tokens': np.int32,
+    'completion_tokens': np.int32,
+    'cost_usd': np.float32,  # nan = unknown
+    'latency': np.float32,
+}
+CHUNK_ROWS = 65536
+
+
+class ModelSummary(BaseModel):
+    model: str
+    results: int  # answered (transport errors excluded)
+    accuracy: float
+    ci_low: float
+    ci_high: float
+    format_error_rate: float
+    transport_errors: int
+    cost_usd: float
+    cost_per_correct: float | None  # None when nothing was correct
+    prompt_tokens: int
+    completion_tokens: int
+
+
+class _Builder:
+    """
+    Collects rows (tuples in COLUMNS order, model and challenge as names) and converts them to arrays a chunk at a
+    time, so the Python tuples of at most one chunk are alive at once.
+    """
+
+    def __init__(self):
+        self.chunks: list[dict[str, np.ndarray]] = []
+        self.pending: list[tuple] = []
+        self.codes: dict[str, dict[str, int]] = {'model': {}, 'challenge': {}}
+
+    def add(self, row: tuple) -> None:
+        self.pending.append(row)
+        if len(self.pending) >= CHUNK_ROWS:
+            self._convert()
+
+    def extend(self, rows: list[tuple]) -> None:
+        self.pending.extend(rows)
+        if len(self.pending) >= CHUNK_ROWS:
+            self._convert()
+
+    def _convert(self) -> None:
+        if not self.pending:
+            return
+        chunk = {}
+        for (name, dtype), values in zip(COLUMNS.items(), zip(*self.pending)):
+            if name in self.codes:
+                codes = self.codes[name]
+                values = [codes.setdefault(v, len(codes)) for v in values]
+            elif dtype is np.float32:
+                values = [np.nan if v is None else v for v in values]
+            else:
+                values = [v or 0 for v in values]
+            chunk[name] = np.array(values, dtype=dtype)
+        self.chunks.append(chunk)
+        self.pending = []
+
+    def build(self) -> 'ScoreTable':
+        self._convert()
+        if not self.chunks:
+            columns = {k: np.empty(0, dtype=t) for k, t in COLUMNS.items()}
+        else:
+            columns = {k: np.concatenate([c[k] for c in self.chunks]) for k in COLUMNS}
+        return ScoreTable(columns, list(self.codes['model']), list(self.codes['challenge']))
+
+
+class ScoreTable:
+    def __init__(self, columns: dict[str, np.ndarray], models: list[str], challenges: list[str]):
+        """
+        :param columns: arrays of COLUMNS, all the same length; model/challenge are indices into `models`/`challenges`
+        """
+        self.columns = columns
+        self.models = models
+        self.challenges = challenges
+
+    def __len__(self) -> int:
+        return len(self.columns['score'])
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        try:
+            return self.__dict__['columns'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def nbytes(self) -> int:
+        return sum(c.nbytes for c in self.columns.values())
+
+    # BUILDING
+
+    @staticmethod
+    def from_results(results: Iterable) -> 'ScoreTable':
+        """
+        From `ChallengeResult`s (e.g. streamed from `run_matrix`); costs are priced with `pricing.PRICES`.
+        """
+        from ai_2025.common import AI_MODELS
+        from ai_2025.pricing import cost_usd
+
+        b = _Builder()
+        for r in results:
+            c, s = r.cost, r.score
+            usd = cost_usd(AI_MODELS[r.model_name].model_name, c) if c is not None and r.model_name in AI_MODELS \
+                else None
+            b.add((r.model_name, r.challenge, s.score, s.format_error, s.transport_error,
+                   c.prompt_tokens if c else 0, c.cached_prompt_tokens if c else 0, c.completion_tokens if c else 0,
+                   usd, r.elapsed))
+        return b.build()
+
+    @staticmethod
+    def from_store(store, run_id: int = None, model: str = None, batch: int = CHUNK_ROWS) -> 'ScoreTable':
+        """
+        From a `ResultsStore`, read in batches (one run, or everything).
+        """
+        where = ' AND '.join(w for w, p in (('run_id = ?', run_id), ('model = ?', model)) if p is not None)
+        params = tuple(p for p in (run_id, model) if p is not None)
+        b = _Builder()
+        db = store._connect()
+        try:
+            cur = db.execute('SELECT model, challenge, score, format_error, transport_error, prompt_tokens, '
+                             'cached_prompt_tokens, completion_tokens, cost_usd, latency FROM results'
+                             + (f' WHERE {where}' if where else ''), params)
+            while rows := cur.fetchmany(batch):
+                b.extend(rows)
+        finally:
+            db.close()
+        return b.build()
+
+    # AGGREGATES
+
+    def _answered(self) -> np.ndarray:
+        return self.transport_error == 0
+
+    def _by(self, codes: np.ndarray, n: int, mask: np.ndarray, weights: np.ndarray = None) -> np.ndarray:
+        return np.bincount(codes[mask], weights=None if weights is None else weights[mask], minlength=n)
+
+    def counts(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :return: (answered, correct) per model
+        """
+        m, n = self.model, len(self.models)
+        ok = self._answered()
+        return self._by(m, n, ok), self._by(m, n, ok, self.score)
+
+    def accuracy(self) -> dict[str, float]:
+        answered, correct = self.counts()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            acc = correct / answered
+        return dict(zip(self.models, acc.tolist()))
+
+    def grid(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (answered, correct) per model x challenge, shape (models, challenges).
+        """
+        ok = self._answered()
+        cell = self.model.astype(np.int64) * len(self.challenges) + self.challenge
+        size = len(self.models) * len(self.challenges)
+        answered = np.bincount(cell[ok], minlength=size).reshape(len(self.models), len(self.challenges))
+        correct = np.bincount(cell[ok], weights=self.score[ok], minlength=size).reshape(answered.shape)
+        return answered, correct
+
+    def tag_accuracy(self, challenges: Iterable[ChallengeData]) -> dict[str, dict[str, float]]:
+        """
+        Accuracy per model and tag; a challenge counts for each of its tags.
+        :param challenges: the suite, for the tags of each challenge id
+        """
+        tags: dict[str, int] = {}
+        pos = {c: i for i, c in enumerate(self.challenges)}
+        incidence = []
+        for ch in challenges:
+            if ch.id in pos:
+                incidence += [(pos[ch.id], tags.setdefault(t, len(tags))) for t in ch.tags]
+        if not incidence:
+            return {}
+        rows, cols = np.array(incidence).T
+        membership = np.zeros((len(self.challenges), len(tags)))
+        membership[rows, cols] = 1
+        answered, correct = self.grid()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            acc = (correct @ membership) / (answered @ membership)
+        return {m: dict(zip(tags, acc[i].tolist())) for i, m in enumerate(self.models)}
+
+    def cost_per_correct(self) -> dict[str, float | None]:
+        _, correct = self.counts()
+        cost = self._by(self.model, len(self.models), ~np.isnan(self.cost_usd), self.cost_usd)
+        return {m: float(cost[i] / correct[i]) if correct[i] else None for i, m in enumerate(self.models)}
+
+    def bootstrap_ci(self, level: float = 0.95, resamples: int = 10_000,
+                     seed: int = None) -> dict[str, tuple[float, float]]:
+        """
+        Percentile bootstrap interval of each model's accuracy (binomial resampling, see module docstring).
+        """
+        answered, correct = self.counts()
+        rng = np.random.default_rng(seed)
+        n = answered.astype(np.int64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            p = np.where(n > 0, correct / np.maximum(n, 1), 0.0)
+            samples = rng.binomial(n[:, None], p[:, None], size=(len(n), resamples)) / n[:, None]
+        alpha = (1 - level) / 2
+        low, high = np.quantile(samples, [alpha, 1 - alpha], axis=1)
+        return {m: (float(low[i]), float(high[i])) for i, m in enumerate(self.models)}
+
+    def summary(self, level: float = 0.95, seed: int = None) -> list[ModelSummary]:
+        m, n = self.model, len(self.models)
+        everything = np.ones(len(self), dtype=bool)
+        answered, correct = self.counts()
+        format_errors = self._by(m, n, self._answered(), self.format_error)
+        transport = self._by(m, n, everything, self.transport_error)
+        cost = self._by(m, n, ~np.isnan(self.cost_usd), self.cost_usd)
+        prompt = self._by(m, n, everything, self.prompt_tokens)
+        completion = self._by(m, n, everything, self.completion_tokens)
+        ci = self.bootstrap_ci(level, seed=seed)
+        out = []
+        for i, name in enumerate(self.models):
+            a = int(answered[i])
+            out.append(ModelSummary(
+                model=name, results=a, accuracy=correct[i] / a if a else 0.0, ci_low=ci[name][0],
+                ci_high=ci[name][1], format_error_rate=format_errors[i] / a if a else 0.0,
+                transport_errors=int(transport[i]), cost_usd=float(cost[i]),
+                cost_per_correct=float(cost[i] / correct[i]) if correct[i] else None,
+                prompt_tokens=int(prompt[i]), completion_tokens=int(completion[i])))
+        return out
+
+    def report(self, level: float = 0.95) -> str:
+        lines = [f'{"model":<16}{"n":>9}{"accuracy":>10}{"ci":>17}{"fmt err":>9}{"cost $":>11}{"$/correct":>11}']
+        for s in self.summary(level):
+            per_correct = '-' if s.cost_per_correct is None else f'{s.cost_per_correct:.5f}'
+            lines.append(f'{s.model:<16}{s.results:>9}{s.accuracy:>10.1%}  [{s.ci_low:.3f}, {s.ci_high:.3f}]'
+                         f'{s.format_error_rate:>9.1%}{s.cost_usd:>11.4f}{per_correct:>11}')
+        return '\n'.join(lines)
+
+
+def main():
+    from ai_2025.results_store import DB_FILE, ResultsStore
+
+    parser = argparse.ArgumentParser(description='summary of stored challenge results')
+    parser.add_argument('--db', default=str(DB_FILE))
+    parser.add_argument('--run', type=int, default=None, help='run id (default: all runs)')
+    parser.add_argument('--level', type=float, default=0.95)
+    args = parser.parse_args()
+
+    with ResultsStore(args.db) as store:
+        table = ScoreTable.from_store(store, run_id=args.run)
+    print(f'{len(table)} results, {table.nbytes() / 2 ** 20:.1f} MB')
+    print(table.report(args.level))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Sequential (early-stopping) comparison of models on a challenge suite.
+
+Instead of running the whole suite against every model, challenges are drawn in random order and sent to all models
+still in the race, and each model's accuracy is estimated online with a Wilson confidence interval. A model stops
+being queried once it is settled:
+- its interval lies entirely below another model's (it cannot be the best), or
+- its interval lies entirely below `drop_below` (not good enough anyway).
+The evaluation ends when one model is left, or the suite is exhausted. Every model sees the same challenges in the
+same order while it is in the race, so the comparison stays paired.
+
+The intervals are corrected for the number of models compared (Bonferroni), but not for looking at them after every
+round; use a high `confidence` (the default 0.99) and a reasonable `min_samples` to keep the false-drop rate low.
+
+    report = asyncio.run(SequentialEval(['gpt-simple', 'gemini-simple', 'grok-simple']).run())
+    python -m ai_2025.sequential gpt-simple gemini-simple grok-simple --drop-below 0.5
+"""
+import argparse
+import asyncio
+import math
+import random
+from statistics import NormalDist
+from typing import Iterable
+
+from loguru import logger
+from pydantic import BaseModel
+
+from ai_2025.ai_challenge import attempt_challenge_async
+from ai_2025.common import AI_MODELS, primary_model
+from ai_2025.pricing import BudgetExceeded, budget_scope, cost_usd, run_budget
+from ai_2025.suite import ChallengeData, Suite
+
+
+def wilson_interval(correct: int, n: int, z: float) -> tuple[float, float]:
+    """
+    Wilson score interval of a binomial proportion; (0, 1) when there are no observations.
+    """
+    if n == 0:
+        return 0.0, 1.0
+    p = correct / n
+    centre = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+class ModelEstimate(BaseModel):
+    model: str
+    answered: int = 0  # transport errors excluded
+    correct: int = 0
+    calls: int = 0
+    cost_usd: float = 0.0
+    ci_low: float = 0.0
+    ci_high: float = 1.0
+    active: bool = True
+    stopped_reason: str | None = None  # 'outperformed by <model>', 'below <threshold>', 'budget'
+    stopped_after: int | None = None  # challenges drawn when it stopped
+
+    @property
+    def accuracy(self) -> float:
+        return self.correct / self.answered if self.answered else 0.0
+
+
+class SequentialReport(BaseModel):
+    challenges: int  # suite size
+    drawn: int  # challenges used
+    models: list[ModelEstimate]  # best first
+    calls: int
+    full_calls: int  # calls a full run of every model on the whole suite would have made
+    cost_usd: float
+    saved_cost_usd: float  # estimate: the calls not made at each model's average cost per call
+
+    @property
+    def saved_calls(self) -> int:
+        return self.full_calls - self.calls
+
+    @property
+    def best(self) -> str:
+        return self.models[0].model
+
+    def __str__(self):
+        lines = [f'{self.drawn} of {self.challenges} challenges drawn, {self.calls} of {self.full_calls} calls '
+                 f'({self.saved_calls} saved), ${self.cost_usd:.4f} spent, ~${self.saved_cost_usd:.4f} saved']
+        for e in self.models:
+            status = 'active' if e.active else f'stopped after {e.stopped_after}: {e.stopped_reason}'
+            lines.append(f'{e.model:<16}{e.accuracy:>7.1%} [{e.ci_low:.3f}, {e.ci_high:.3f}] of {e.answered:<6} '
+                         f'{status}')
+        return '\n'.join(lines)
+
+
+class SequentialEval:
+    def __init__(self, models: list[str], challenges: Iterable[ChallengeData] = None, confidence: float = 0.99,
+                 min_samples: int = 30, drop_below: float | None = None, parallel: int = 8, seed: int | None = None):
+        """
+        :param models: keys of AI_MODELS (or MODEL_GROUPS)
+        :param challenges: defaults to the default `Suite`
+        :param confidence: of each model's interval, before the correction for the number of models
+        :param min_samples: answers a model needs before it can be stopped
+        :param drop_below: stop models whose accuracy is surely below this
+        :param parallel: challenges in flight at once (each goes to every active model)
+        :param seed: of the challenge order
+        """
+        self.estimates = {m: ModelEstimate(model=m) for m in models}
+        self.challenges = list(challenges if challenges is not None else Suite())
+        random.Random(seed).shuffle(self.challenges)
+        self.z = NormalDist().inv_cdf(1 - (1 - confidence) / (2 * len(models)))
+        self.min_samples = min_samples
+        self.drop_below = drop_below
+        self.parallel = parallel
+        self.drawn = 0
+
+    def active(self) -> list[ModelEstimate]:
+        return [e for e in self.estimates.values() if e.active]
+
+    def _record(self, model: str, attempt) -> None:
+        e = self.estimates[model]
+        e.calls += 1
+        if attempt.cost is not None:
+            e.cost_usd += cost_usd(AI_MODELS[primary_model(model)].model_name, attempt.cost) or 0.0
+        if not attempt.score.transport_error:
+            e.answered += 1
+            e.correct += attempt.score.score
+        e.ci_low, e.ci_high = wilson_interval(e.correct, e.answered, self.z)
+
+    def _stop(self, e: ModelEstimate, reason: str) -> None:
+        e.active, e.stopped_reason, e.stopped_after = False, reason, self.drawn
+        logger.info(f'{e.model}: stopped after {self.drawn} challenges, {reason} '
+                    f'({e.accuracy:.1%} [{e.ci_low:.3f}, {e.ci_high:.3f}])')
+
+    def _update_race(self) -> None:
+        ready = [e for e in self.active() if e.answered >= self.min_samples]
+        if self.drop_below is not None:
+            for e in ready:
+                if e.ci_high < self.drop_below:
+                    self._stop(e, f'below {self.drop_below}')
+        ready = [e for e in ready if e.active]
+        if len(self.active()) < 2 or not ready:
+            return
+        leader = max(ready, key=lambda e: e.ci_low)
+        for e in ready:
+            if e is not leader and e.ci_high < leader.ci_low and len(self.active()) > 1:
+                self._stop(e, f'outperformed by {leader.model}')
+
+    async def _round(self, batch: list[ChallengeData]) -> None:
+        models = [e.model for e in self.active()]
+        pairs = [(ch, m) for ch in batch for m in models]
+        attempts = await asyncio.gather(*(attempt_challenge_async(ch, m) for ch, m in pairs), return_exceptions=True)
+        for (ch, m), a in zip(pairs, attempts):
+            if isinstance(a, BudgetExceeded):
+                if self.estimates[m].active:
+                    self._stop(self.estimates[m], 'budget')
+            elif isinstance(a, BaseException):
+                raise a
+            else:
+                self._record(m, a)
+
+    async def run(self, budget_usd: float = None) -> SequentialReport:
+        with budget_scope(run_budget(budget_usd, run='sequential')):
+            while self.drawn < len(self.challenges) and len(self.active()) > 1:
+                batch = self.challenges[self.drawn:self.drawn + self.parallel]
+                self.drawn += len(batch)
+                await self._round(batch)
+                self._update_race()
+            if len(self.active()) == 1 and self.drawn < len(self.challenges):
+                logger.info(f'{self.active()[0].model} is the best after {self.drawn} of {len(self.challenges)} '
+                            f'challenges')
+        return self.report()
+
+    def report(self) -> SequentialReport:
+        n = len(self.challenges)
+        estimates = sorted(self.estimates.values(), key=lambda e: (e.active, e.accuracy), reverse=True)
+        return SequentialReport(
+            challenges=n, drawn=self.drawn, models=estimates, calls=sum(e.calls for e in estimates),
+            full_calls=n * len(estimates), cost_usd=sum(e.cost_usd for e in estimates),
+            saved_cost_usd=sum(e.cost_usd / e.calls * (n - e.calls) for e in estimates if e.calls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='early-stopping comparison of models')
+    parser.add_argument('models', nargs='+')
+    parser.add_argument('--suite', default=None, help='suite file or directory (default: the default suite)')
+    parser.add_argument('--tags', nargs='*', default=None)
+    parser.add_argument('--confidence', type=float, default=0.99)
+    parser.add_argument('--min-samples', type=int, default=30)
+    parser.add_argument('--drop-below', type=float, default=None)
+    parser.add_argument('--parallel', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--budget', type=float, default=None, help='$ limit of the whole evaluation')
+    args = parser.parse_args()
+
+    suite = Suite(args.suite, tags=args.tags) if args.suite else Suite(tags=args.tags)
+    evaluation = SequentialEval(args.models, suite, confidence=args.confidence, min_samples=args.min_samples,
+                                drop_below=args.drop_below, parallel=args.parallel, seed=args.seed)
+    print(asyncio.run(evaluation.run(args.budget)))
+
+
+if __name__ == '__main__':
+    main()
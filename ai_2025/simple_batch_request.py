@@ -1,46 +1,41 @@
-import json
-import os
 from time import sleep
 
-from dotenv import load_dotenv
 from loguru import logger
 from openai import OpenAI
 from openai.types import Batch, FileObject
 
-from ai_2025.common import AI_MODELS
+from ai_2025.batch_results import BatchResultsFile, download_file
+from ai_2025.common import AI_MODELS, model_client
+from ai_2025.uploads import upload_file
 
 
 def get_client() -> OpenAI:
-    config = AI_MODELS['gpt-simple']
-    key = os.getenv(config.key_name)
-    client = OpenAI(api_key=key, base_url=config.base_url)
-    return client
+    return model_client(AI_MODELS['gpt-simple'])
 
 
 def upload_input_file(client, file_name: str = 'q1.jsonl', purpose="batch") -> FileObject:
     """
-
+    Uploads the file, or reuses the remote copy if the same contents were uploaded before (see `uploads`).
     :param client:
     :param file_name:
     :param purpose: "batch" or "user_data"
     :return:
     """
-    input_file = client.files.create(
-        file=open(file_name, "rb"),
-        purpose=purpose
-    )
-
-    return input_file
+    return upload_file(client, file_name, purpose)
 
 
-def create_batch(client, file_id: str) -> Batch:
+def create_batch(client, file_id: str, description: str = "nightly eval job",
+                 endpoint: str = "/v1/chat/completions") -> Batch:
+    """
+    :param endpoint: url of the requests in the input file ("/v1/chat/completions", "/v1/responses", ...)
+    """
     batch_input_file_id = file_id
     batch = client.batches.create(
         input_file_id=batch_input_file_id,
-        endpoint="/v1/chat/completions",
+        endpoint=endpoint,
         completion_window="24h",
         metadata={
-            "description": "nightly eval job"
+            "description": description
         }
     )
     return batch
@@ -51,14 +46,30 @@ def check_status(client, batch_id) -> Batch:
     return batch
 
 
-def get_results(client, result_file_id) -> dict:
-    file_response = client.files.content(result_file_id)
-    print(file_response.text)
-    response_dict: dict = json.loads(file_response.text)
-    return response_dict
+def wait_for_batch(client, batch_id: str, interval: float = 20) -> Batch:
+    """
+    Polls the batch until it completes; raises RuntimeError if it ends in any other terminal state.
+    """
+    sleep(1)
+    logger.info('waiting for batch to complete')
+    while True:
+        batch = check_status(client, batch_id)
+        if batch.status == 'completed':
+            return batch
+        if batch.status in ('failed', 'expired', 'cancelled'):
+            raise RuntimeError(f'batch {batch_id} ended with status {batch.status}: {batch.errors}')
+        logger.info(f'batch not completed ({batch.status}, {batch.request_counts})')
+        sleep(interval)
 
 
-def process_batch(input_file: str, batch_id: str = None) -> dict:
+def get_results(client, result_file_id) -> BatchResultsFile:
+    """
+    Downloads the output file (streamed, to `BATCH_DIR`) and opens it for line-by-line / by-custom_id reading.
+    """
+    return BatchResultsFile(download_file(client, result_file_id))
+
+
+def process_batch(input_file: str, batch_id: str = None) -> BatchResultsFile:
     # 0
     client = get_client()
     logger.info('client connected')
@@ -75,29 +86,19 @@ def process_batch(input_file: str, batch_id: str = None) -> dict:
         logger.info(f'batch processing started, id={batch_id}')
 
     # 3
-    sleep(1)
-    logger.info('waiting for batch to complete')
-    while True:
-        batch = check_status(client, batch_id)
-        if batch.status == 'completed':
-            break
-        logger.info('batch not completed')
-        sleep(20)
+    batch = wait_for_batch(client, batch_id)
 
     # 4
     output_file_id = batch.output_file_id
     logger.info(f'pulling batch results with file_id={output_file_id}')
     results = get_results(client, output_file_id)
-
-    print(results)
+    for r in results:
+        print(r.custom_id, r.content())
+    return results
 
 
 if __name__ == '__main__':
-    import os
-
-    load_dotenv()
     process_batch(input_file='q2.jsonl', batch_id='batch_68431e758eac819090abf2b58e740f39')
-    # todo: create or find some nice dataclass to capture the output of the batch results
     # client = get_client()
 
     # 1)
@@ -0,0 +1,128 @@
+"""
+Coalescing of identical in-flight model calls ("single flight").
+
+Calls to the same model with the same messages, params and streaming mode that overlap in time share one upstream
+request: the first caller makes it, the others wait for its result. Every caller gets the same content and token
+counts; the followers' CallCost is marked `coalesced`, so a run's ledger books the spend once (like a cache
+replay). Unlike the response cache this needs no storage and catches duplicates that are in flight at the same
+moment - e.g. several workers on the same challenge, or an invoice submitted twice.
+
+Calls with `cache_mode='bypass'` are never coalesced: they ask for an independent response (e.g. self-consistency
+samples).
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import threading
+from typing import Awaitable, Callable, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar('T')
+
+
+class FlightStats(BaseModel):
+    calls: int = 0
+    upstream: int = 0  # requests actually sent
+    coalesced: int = 0  # calls served by another caller's request
+
+    def ratio(self) -> float | None:
+        return self.coalesced / self.calls if self.calls else None
+
+
+def _normalized(message: dict) -> dict:
+    if isinstance(message.get('content'), str):
+        return message | {'content': message['content'].strip()}
+    return message
+
+
+def flight_key(model_name: str, messages: list[dict], params: dict = None, stream_key: str = None) -> str:
+    """
+    Identity of a call: the exact messages, only leading and trailing whitespace of text contents is ignored (inner
+    whitespace can carry meaning - boards, code, tables).
+    :param model_name: resolved (provider's) model name
+    """
+    payload = json.dumps([model_name, [_normalized(m) for m in messages], params or {}, stream_key], sort_keys=True,
+                         ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _AsyncFlight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self.stats = FlightStats()
+        self._sync: dict[str, concurrent.futures.Future] = {}
+        self._async: dict[tuple[int, str], _AsyncFlight] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], T]) -> tuple[T, bool]:
+        """
+        :return: (result of `fn` - this caller's or the one in flight with the same key, True if it was shared)
+        """
+        with self._lock:
+            self.stats.calls += 1
+            if (future := self._sync.get(key)) is not None:
+                self.stats.coalesced += 1
+                leader = False
+            else:
+                future = self._sync[key] = concurrent.futures.Future()
+                self.stats.upstream += 1
+                leader = True
+        if not leader:
+            return future.result(), True
+        try:
+            res = fn()
+            future.set_result(res)
+            return res, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._sync[key]
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """
+        `do` for coroutines. The request runs in its own task, so a cancelled caller (e.g. a lost hedge) doesn't
+        cancel it for the others; it is cancelled only when every caller is gone.
+        """
+        k = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            self.stats.calls += 1
+            if (flight := self._async.get(k)) is not None:
+                self.stats.coalesced += 1
+                shared = True
+            else:
+                flight = self._async[k] = _AsyncFlight(asyncio.ensure_future(fn()))
+                flight.task.add_done_callback(lambda t: self._forget(k, flight, t))
+                self.stats.upstream += 1
+                shared = False
+            flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        except asyncio.CancelledError:
+            with self._lock:
+                flight.waiters -= 1
+                if flight.waiters == 0:
+                    flight.task.cancel()
+            raise
+
+    def _forget(self, k: tuple[int, str], flight: _AsyncFlight, task: asyncio.Task) -> None:
+        with self._lock:
+            if self._async.get(k) is flight:
+                del self._async[k]
+        if not task.cancelled():
+            task.exception()  # retrieved, even if every caller is gone
+
+
+_flights = SingleFlight()
+
+
+def default_flights() -> SingleFlight:
+    return _flights
@@ -0,0 +1,423 @@
+"""
+Local OpenAI-compatible stand-in server for load and latency testing.
+
+Implements enough of the API for everything in this package to run offline and for free:
+
+    POST /chat/completions              (also `stream=True`, server-sent events)
+    POST /files, GET /files, GET /files/{id}, GET /files/{id}/content, DELETE /files/{id}
+    POST /batches, GET /batches/{id}, POST /batches/{id}/cancel
+
+Answers are `{"<required key>": ...}` json objects; with a suite configured the stand-in answers a known challenge
+correctly with probability `accuracy`. Latency, error and 429 rates and token usage are configurable, so the call
+path, the batch flow and the scoring pipeline can be benchmarked reproducibly (see `seed`).
+
+    python -m ai_2025.standin_server --port 8765 --latency lognormal:0.8:0.5 --rate-limit-rate 0.05
+
+and point any `AI_Model.base_url` to `http://127.0.0.1:8765/v1` (`use_standin` does that for `AI_MODELS`).
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+from pydantic import BaseModel
+
+STANDIN_KEY_NAME = 'STANDIN_KEY'
+
+
+# MODEL
+
+
+class Latency(BaseModel):
+    """
+    Latency distribution, in seconds: `fixed:a`, `uniform:a:b`, `lognormal:median:sigma`, `exponential:mean`.
+    """
+    kind: str = 'fixed'
+    a: float = 0.0
+    b: float = 0.0
+
+    @staticmethod
+    def parse(spec: str) -> 'Latency':
+        kind, *args = spec.split(':')
+        args = [float(x) for x in args] + [0.0, 0.0]
+        return Latency(kind=kind, a=args[0], b=args[1])
+
+    def sample(self, rng: random.Random) -> float:
+        match self.kind:
+            case 'fixed':
+                return self.a
+            case 'uniform':
+                return rng.uniform(self.a, self.b)
+            case 'lognormal':
+                return rng.lognormvariate(math.log(self.a), self.b) if self.a > 0 else 0.0
+            case 'exponential':
+                return rng.expovariate(1 / self.a) if self.a > 0 else 0.0
+        raise ValueError(f'unknown latency distribution {self.kind}')
+
+
+class StandinConfig(BaseModel):
+    latency: Latency = Latency()  # until the response headers (time to first byte)
+    token_interval: float = 0.0  # seconds between streamed tokens
+    error_rate: float = 0.0  # fraction of 500 responses
+    rate_limit_rate: float = 0.0  # fraction of 429 responses
+    retry_after_ms: int = 200
+    chatter_tokens: int = 0  # words of chatter after the json answer, like talkative models produce
+    suite: str | None = None  # suite file; known prompts are answered correctly with probability `accuracy`
+    accuracy: float = 1.0
+    default_answer: str = 'Yes'
+    batch_request_delay: float = 0.01  # seconds of simulated work per batch request
+    prompt_cache_min_tokens: int = 1024  # prefixes (all but the last message) this long are cached after first use
+    seed: int | None = None
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def split_tokens(text: str) -> list[str]:
+    """
+    Stand-in "tokenizer" for completions: words with their trailing whitespace.
+    """
+    return re.findall(r'\S+\s*|\s+', text)
+
+
+# STATE
+
+
+class _Store:
+    def __init__(self, config: StandinConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.rng_lock = threading.Lock()
+        self.files: dict[str, dict] = {}
+        self.file_data: dict[str, bytes] = {}
+        self.batches: dict[str, dict] = {}
+        self.answers: dict[str, list[str]] = {}
+        self.prefixes: set[str] = set()  # prompt cache
+        if config.suite:
+            from ai_2025.suite import Suite
+            self.answers = {ch.prompt: ch.true_answers for ch in Suite(config.suite)}
+
+    def random(self) -> float:
+        with self.rng_lock:
+            return self.rng.random()
+
+    def latency(self) -> float:
+        with self.rng_lock:
+            return self.config.latency.sample(self.rng)
+
+    def add_file(self, data: bytes, filename: str, purpose: str) -> dict:
+        fid = f'file-{uuid.uuid4().hex[:24]}'
+        self.file_data[fid] = data
+        self.files[fid] = {'id': fid, 'object': 'file', 'bytes': len(data), 'created_at': int(time.time()),
+                           'filename': filename, 'purpose': purpose, 'status': 'processed', 'expires_at': None,
+                           'status_details': None}
+        return self.files[fid]
+
+    # completions
+
+    def answer_for(self, messages: list[dict]) -> tuple[str, str]:
+        """
+        :return: (required key, answer)
+        """
+        text = '\n'.join(m['content'] if isinstance(m.get('content'), str) else json.dumps(m.get('content'))
+                         for m in messages)
+        key = m.group(1) if (m := re.search(r'key [`"\']?(\w+)', text)) else 'answer'
+        for prompt, answers in self.answers.items():
+            if prompt in text:
+                correct = self.random() < self.config.accuracy
+                return key, answers[0] if correct else f'not {answers[0]}'
+        return key, self.config.default_answer
+
+    def completion_text(self, messages: list[dict]) -> str:
+        key, answer = self.answer_for(messages)
+        text = f'```json\n{json.dumps({key: answer})}\n```'
+        if n := self.config.chatter_tokens:
+            text += '\n' + ' '.join((['I', 'hope', 'this', 'helps.'] * n)[:n])
+        return text
+
+    def cached_tokens(self, messages: list[dict]) -> int:
+        """
+        Simulated provider prompt cache: the stable prefix is free from the second request on.
+        """
+        prefix = json.dumps(messages[:-1])
+        tokens = count_tokens(prefix) if len(messages) > 1 else 0
+        if tokens < self.config.prompt_cache_min_tokens:
+            return 0
+        with self.rng_lock:
+            hit = prefix in self.prefixes
+            self.prefixes.add(prefix)
+        return tokens if hit else 0
+
+    def completion(self, body: dict, text: str) -> dict:
+        n = max(1, int(body.get('n') or 1))
+        prompt_tokens = count_tokens(json.dumps(body.get('messages', [])))
+        cached_tokens = self.cached_tokens(body.get('messages', []))
+        choices = [{'index': i, 'finish_reason': 'stop', 'logprobs': None,
+                    'message': {'role': 'assistant', 'content': text if i == 0 else self.completion_text(body['messages'])}}
+                   for i in range(n)]
+        completion_tokens = sum(len(split_tokens(c['message']['content'])) for c in choices)
+        return {'id': f'chatcmpl-{uuid.uuid4().hex[:24]}', 'object': 'chat.completion', 'created': int(time.time()),
+                'model': body.get('model', 'standin'), 'choices': choices,
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                          'total_tokens': prompt_tokens + completion_tokens,
+                          'prompt_tokens_details': {'cached_tokens': cached_tokens}}}
+
+    # batches
+
+    def run_batch(self, batch_id: str) -> None:
+        batch = self.batches[batch_id]
+        lines = [l for l in self.file_data[batch['input_file_id']].splitlines() if l.strip()]
+        batch['request_counts']['total'] = len(lines)
+        batch['status'] = 'in_progress'
+        batch['in_progress_at'] = int(time.time())
+        out, err = [], []
+        for line in lines:
+            if batch['status'] == 'cancelling':
+                break
+            time.sleep(self.config.batch_request_delay)
+            req = json.loads(line)
+            rid = f'batch_req_{uuid.uuid4().hex[:24]}'
+            if self.random() < self.config.error_rate:
+                err.append({'id': rid, 'custom_id': req['custom_id'], 'response': None,
+                            'error': {'code': 'server_error', 'message': 'stand-in failure'}})
+                batch['request_counts']['failed'] += 1
+                continue
+            body = req['body']
+            res = self.completion(body, self.completion_text(body['messages']))
+            out.append({'id': rid, 'custom_id': req['custom_id'], 'error': None,
+                        'response': {'status_code': 200, 'request_id': uuid.uuid4().hex, 'body': res}})
+            batch['request_counts']['completed'] += 1
+        cancelled = batch['status'] == 'cancelling'
+        batch['status'] = 'finalizing'
+        batch['finalizing_at'] = int(time.time())
+        if out:
+            batch['output_file_id'] = self.add_file(b''.join(json.dumps(r).encode() + b'\n' for r in out),
+                                                    f'{batch_id}_output.jsonl', 'batch_output')['id']
+        if err:
+            batch['error_file_id'] = self.add_file(b''.join(json.dumps(r).encode() + b'\n' for r in err),
+                                                   f'{batch_id}_error.jsonl', 'batch_output')['id']
+        if cancelled:
+            batch['status'], batch['cancelled_at'] = 'cancelled', int(time.time())
+        else:
+            batch['status'], batch['completed_at'] = 'completed', int(time.time())
+
+
+# HTTP
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    server_version = 'standin/0.1'
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real endpoints
+    store: _Store  # set by make_server
+
+    def log_message(self, format, *args):
+        logger.debug(f'standin: {format % args}')
+
+    def _path(self) -> list[str]:
+        path = self.path.split('?')[0].strip('/')
+        parts = path.split('/') if path else []
+        return parts[1:] if parts[:1] == ['v1'] else parts
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('content-length') or 0))
+
+    def _send(self, status: int, payload: dict | bytes, content_type: str = 'application/json',
+              headers: dict = None) -> None:
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('content-type', content_type)
+        self.send_header('content-length', str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, message: str, headers: dict = None) -> None:
+        self._send(status, {'error': {'message': message, 'type': 'standin_error', 'code': status}}, headers=headers)
+
+    def _maybe_fail(self) -> bool:
+        store = self.store
+        x = store.random()
+        if x < store.config.rate_limit_rate:
+            self._error(429, 'stand-in rate limit', {'retry-after-ms': str(store.config.retry_after_ms)})
+            return True
+        if x < store.config.rate_limit_rate + store.config.error_rate:
+            self._error(500, 'stand-in failure')
+            return True
+        return False
+
+    def do_GET(self):
+        p, store = self._path(), self.store
+        if p == ['files']:
+            return self._send(200, {'object': 'list', 'data': list(store.files.values())})
+        if len(p) == 2 and p[0] == 'files' and p[1] in store.files:
+            return self._send(200, store.files[p[1]])
+        if len(p) == 3 and p[0] == 'files' and p[2] == 'content' and p[1] in store.file_data:
+            return self._send(200, store.file_data[p[1]], 'application/octet-stream')
+        if len(p) == 2 and p[0] == 'batches' and p[1] in store.batches:
+            return self._send(200, store.batches[p[1]])
+        self._error(404, f'no such resource: {self.path}')
+
+    def do_DELETE(self):
+        p, store = self._path(), self.store
+        if len(p) == 2 and p[0] == 'files' and p[1] in store.files:
+            store.files.pop(p[1])
+            store.file_data.pop(p[1], None)
+            return self._send(200, {'id': p[1], 'object': 'file', 'deleted': True})
+        self._error(404, f'no such resource: {self.path}')
+
+    def do_POST(self):
+        p, store = self._path(), self.store
+        raw = self._body()
+        if p == ['chat', 'completions']:
+            return self._chat(json.loads(raw))
+        if p == ['files']:
+            return self._upload(raw)
+        if p == ['batches']:
+            body = json.loads(raw)
+            if body.get('input_file_id') not in store.file_data:
+                return self._error(400, 'unknown input_file_id')
+            bid = f'batch_{uuid.uuid4().hex[:24]}'
+            now = int(time.time())
+            store.batches[bid] = {
+                'id': bid, 'object': 'batch', 'endpoint': body.get('endpoint'), 'errors': None,
+                'input_file_id': body['input_file_id'], 'completion_window': body.get('completion_window', '24h'),
+                'status': 'validating', 'output_file_id': None, 'error_file_id': None, 'created_at': now,
+                'in_progress_at': None, 'expires_at': now + 24 * 3600, 'finalizing_at': None, 'completed_at': None,
+                'failed_at': None, 'expired_at': None, 'cancelling_at': None, 'cancelled_at': None,
+                'request_counts': {'total': 0, 'completed': 0, 'failed': 0}, 'metadata': body.get('metadata')}
+            threading.Thread(target=store.run_batch, args=(bid,), daemon=True).start()
+            return self._send(200, store.batches[bid])
+        if len(p) == 3 and p[0] == 'batches' and p[2] == 'cancel' and p[1] in store.batches:
+            batch = store.batches[p[1]]
+            if batch['status'] in ('validating', 'in_progress'):
+                batch['status'], batch['cancelling_at'] = 'cancelling', int(time.time())
+            return self._send(200, batch)
+        self._error(404, f'no such resource: {self.path}')
+
+    def _upload(self, raw: bytes) -> None:
+        msg = BytesParser(policy=HTTP).parsebytes(
+            f'content-type: {self.headers["content-type"]}\r\n\r\n'.encode() + raw)
+        fields, data, filename = {}, b'', 'upload'
+        for part in msg.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name == 'file':
+                data = part.get_payload(decode=True) or b''
+                filename = part.get_filename() or filename
+            elif name:
+                fields[name] = part.get_payload(decode=True).decode()
+        self._send(200, self.store.add_file(data, filename, fields.get('purpose', 'batch')))
+
+    def _chat(self, body: dict) -> None:
+        store = self.store
+        time.sleep(store.latency())
+        if self._maybe_fail():
+            return
+        text = store.completion_text(body.get('messages', []))
+        res = store.completion(body, text)
+        if not body.get('stream'):
+            return self._send(200, res)
+
+        self.send_response(200)
+        self.send_header('content-type', 'text/event-stream')
+        self.send_header('transfer-encoding', 'chunked')
+        self.end_headers()
+        tokens = split_tokens(text)
+        try:
+            for i, token in enumerate(tokens):
+                chunk = {'id': res['id'], 'object': 'chat.completion.chunk', 'created': res['created'],
+                         'model': res['model'],
+                         'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': token} if i == 0
+                                      else {'content': token},
+                                      'finish_reason': 'stop' if i == len(tokens) - 1 else None}]}
+                self._chunk(b'data: ' + json.dumps(chunk).encode() + b'\n\n')
+                if store.config.token_interval:
+                    time.sleep(store.config.token_interval)
+            if (body.get('stream_options') or {}).get('include_usage'):
+                usage = res['usage'] | {'completion_tokens': len(tokens),
+                                        'total_tokens': res['usage']['prompt_tokens'] + len(tokens)}
+                chunk = {'id': res['id'], 'object': 'chat.completion.chunk', 'created': res['created'],
+                         'model': res['model'], 'choices': [], 'usage': usage}
+                self._chunk(b'data: ' + json.dumps(chunk).encode() + b'\n\n')
+            self._chunk(b'data: [DONE]\n\n')
+            self._chunk(b'')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # client stopped reading early
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+
+def make_server(config: StandinConfig = None, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """
+    Creates (but does not start) the server; `port=0` picks a free port (see `server.server_address`).
+    """
+    handler = type('Handler', (StandinHandler,), {'store': _Store(config or StandinConfig())})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve_in_background(config: StandinConfig = None, port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    """
+    Starts the stand-in in a daemon thread.
+    :return: (server - call `.shutdown()` when done, base_url)
+    """
+    server = make_server(config, port=port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f'http://{host}:{port}/v1'
+
+
+def use_standin(base_url: str, models: list[str] = None, rate_limits: bool = False) -> None:
+    """
+    Points `AI_MODELS` entries (all by default) at the stand-in, keeping their names and model names.
+    Must be called before the first call to these models (clients and keys are cached).
+    :param models: keys of AI_MODELS or MODEL_GROUPS (a group stands for its members)
+    :param rate_limits: keep the entries' client-side rpm / tpm limits; by default they are dropped, as they belong
+        to the real provider (`rate_limit_rate` makes the stand-in answer 429s instead)
+    """
+    from ai_2025.common import AI_MODELS, MODEL_GROUPS
+
+    os.environ.setdefault(STANDIN_KEY_NAME, 'standin')
+    update = {'base_url': base_url, 'key_name': STANDIN_KEY_NAME} | ({} if rate_limits else {'rpm': None, 'tpm': None})
+    for name in dict.fromkeys(n for m in models or list(AI_MODELS) for n in MODEL_GROUPS.get(m, [m])):
+        AI_MODELS[name] = AI_MODELS[name].model_copy(update=update)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenAI-compatible stand-in server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='fixed:0', help='fixed:a | uniform:a:b | lognormal:median:sigma | exponential:mean')
+    parser.add_argument('--token-interval', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--chatter-tokens', type=int, default=0)
+    parser.add_argument('--suite', default=None)
+    parser.add_argument('--accuracy', type=float, default=1.0)
+    parser.add_argument('--prompt-cache-min-tokens', type=int, default=1024)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    config = StandinConfig(latency=Latency.parse(args.latency), token_interval=args.token_interval,
+                           error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                           chatter_tokens=args.chatter_tokens, suite=args.suite, accuracy=args.accuracy,
+                           prompt_cache_min_tokens=args.prompt_cache_min_tokens, seed=args.seed)
+    server = make_server(config, args.host, args.port)
+    logger.info(f'stand-in listening on http://{args.host}:{args.port}/v1')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
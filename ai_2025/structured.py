@@ -0,0 +1,90 @@
+"""
+Structured output: provider-native JSON modes, schema validation and a cheap repair of malformed answers.
+
+`response_format` picks what the `AI_Model` supports: a JSON schema (when the caller has one), plain JSON mode, or
+nothing (prompt-only, as in `prompt_for_json`). `parse_structured` validates the answer against a pydantic schema;
+before giving up it rescues the object from surrounding prose locally (no extra call). What is still broken can be
+sent once through `repair_messages` to a cheap model.
+"""
+import json
+import re
+from functools import lru_cache
+from typing import Any
+
+from pydantic import BaseModel, ValidationError, create_model
+
+from ai_2025.json_stream import KeyExtractor
+
+
+class StructureError(RuntimeError):
+    pass
+
+
+@lru_cache(maxsize=None)
+def answer_schema(required_key: str) -> type[BaseModel]:
+    """
+    Schema of the default answer: an object with the single (any-typed) key `required_key`.
+    """
+    return create_model('Answer', **{required_key: (Any, ...)})
+
+
+def response_format(json_mode: bool, json_schema: bool, schema: type[BaseModel] = None) -> dict | None:
+    """
+    :param json_mode: the provider accepts `{"type": "json_object"}`
+    :param json_schema: the provider accepts `{"type": "json_schema", ...}`
+    :param schema: the expected answer; json schema mode is used only for explicit schemas
+    """
+    if schema is not None and json_schema:
+        return {'type': 'json_schema', 'json_schema': {'name': schema.__name__, 'schema': schema.model_json_schema()}}
+    if json_mode:
+        return {'type': 'json_object'}
+    return None
+
+
+def _loads(content: str, required_key: str) -> dict:
+    cleaned = re.sub(r'```json\s*|\s*```', '', content).strip()
+    try:
+        data = json.loads(cleaned)
+        if isinstance(data, dict):
+            return data
+    except ValueError:
+        pass
+    x = KeyExtractor(required_key)  # local repair: the object is there, wrapped in prose or followed by chatter
+    x.feed(content)
+    if x.found:
+        return {required_key: x.value}
+    raise StructureError(f'not json-parseable: [{content[:200]}]')
+
+
+def parse_structured(content: str, required_key: str, schema: type[BaseModel] = None):
+    """
+    :return: value of `required_key`, validated against `schema` (default `answer_schema(required_key)`)
+    """
+    schema = schema or answer_schema(required_key)
+    data = _loads(content, required_key)
+    if required_key not in data:
+        raise StructureError(f'structure key {required_key} not found in answer')
+    try:
+        validated = schema.model_validate(data)
+    except ValidationError as e:
+        raise StructureError(f'answer does not match {schema.__name__}: {e}')
+    return getattr(validated, required_key)
+
+
+def repair_messages(content: str, required_key: str, error: Exception, schema: type[BaseModel] = None) -> list[dict]:
+    """
+    Prompt asking a (cheap) model to turn a malformed answer into the expected JSON object, nothing else.
+    """
+    schema = schema or answer_schema(required_key)
+    return [
+        {
+            "role": "system",
+            "content": "You convert text into valid JSON. Return only a JSON object, no comments, no code fences."
+        },
+        {
+            "role": "user",
+            "content": f"The following answer should be a JSON object with key `{required_key}` matching this JSON "
+                       f"schema:\n{json.dumps(schema.model_json_schema())}\n\nProblem: {error}\n\n"
+                       f"Answer:\n{content}"
+        }
+    ]
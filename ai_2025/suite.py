@@ -0,0 +1,164 @@
+"""
+Declarative challenge suites.
+
+A suite is a JSONL file (one challenge per line) or a YAML file (one challenge per `---` document), or a directory of
+such files. Items are read lazily, one at a time, so suites can be much larger than memory allows to materialize.
+
+    {"id": "myanmar", "tags": ["geography"], "prompt": "What is capital of Myanmar?", "true_answers": ["Naypyidaw"]}
+
+Optional `normalize` lists operations (see `NORMALIZERS`) applied to both the model answer and the true answers
+before comparing them, e.g. `["lower", "no_spaces"]`.
+
+For JSONL files a sidecar index (`<file>.idx.json`: byte offset per id, ids per tag) is built on first filtered use
+and rebuilt when the file changes, so id/tag subsets are read by seeking instead of scanning the whole file.
+"""
+import json
+import unicodedata
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from loguru import logger
+from pydantic import BaseModel
+
+SUITES_DIR = Path(__file__).parent / 'challenges'
+DEFAULT_SUITE = SUITES_DIR / 'basic.jsonl'
+
+
+def _no_diacritics(s: str) -> str:
+    return ''.join(c for c in unicodedata.normalize('NFKD', s) if not unicodedata.combining(c))
+
+
+NORMALIZERS: dict[str, Callable[[str], str]] = {
+    'strip': str.strip,
+    'lower': str.lower,
+    'no_spaces': lambda s: ''.join(s.split()),
+    'no_diacritics': _no_diacritics,
+    'no_trailing_dot': lambda s: s.rstrip('.'),
+    'brackets_to_parens': lambda s: s.replace('[', '(').replace(']', ')'),
+}
+
+
+class ChallengeData(BaseModel):
+    prompt: str
+    true_answers: list[str]
+    id: str = ''
+    tags: list[str] = []
+    normalize: list[str] = []  # keys of NORMALIZERS, applied in order
+
+    def normalized(self, answer: str) -> str:
+        for op in self.normalize:
+            answer = NORMALIZERS[op](answer)
+        return answer
+
+    def is_correct(self, answer) -> bool:
+        answer = self.normalized(str(answer))
+        return any(answer == self.normalized(t) for t in self.true_answers)
+
+
+# READERS
+
+
+def _iter_jsonl(path: Path) -> Iterator[ChallengeData]:
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield ChallengeData.model_validate_json(line)
+
+
+def _iter_yaml(path: Path) -> Iterator[ChallengeData]:
+    try:
+        import yaml
+    except ImportError:
+        raise RuntimeError(f'reading {path} requires pyyaml (pip install pyyaml)')
+    with open(path, encoding='utf-8') as f:
+        for doc in yaml.safe_load_all(f):
+            if doc:
+                yield ChallengeData.model_validate(doc)
+
+
+def _index_path(path: Path) -> Path:
+    return path.with_name(path.name + '.idx.json')
+
+
+def build_index(path: Path) -> dict:
+    """
+    Single pass over a JSONL suite recording the byte offset of every id and the ids of every tag.
+    """
+    offsets, tags = {}, {}
+    with open(path, 'rb') as f:
+        pos = 0
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                offsets[item['id']] = pos
+                for t in item.get('tags', []):
+                    tags.setdefault(t, []).append(item['id'])
+            pos += len(line)
+    st = path.stat()
+    index = {'mtime': st.st_mtime, 'size': st.st_size, 'offsets': offsets, 'tags': tags}
+    try:
+        _index_path(path).write_text(json.dumps(index))
+    except OSError as e:
+        logger.warning(f'cannot store suite index for {path}: {e}')
+    return index
+
+
+def load_index(path: Path) -> dict:
+    st = path.stat()
+    try:
+        index = json.loads(_index_path(path).read_text())
+        if index['mtime'] == st.st_mtime and index['size'] == st.st_size:
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+    return build_index(path)
+
+
+def _iter_jsonl_indexed(path: Path, ids: set[str] | None, tags: set[str] | None) -> Iterator[ChallengeData]:
+    index = load_index(path)
+    wanted = set(index['offsets']) if ids is None else ids & index['offsets'].keys()
+    if tags is not None:
+        wanted &= {i for t in tags for i in index['tags'].get(t, [])}
+    with open(path, 'rb') as f:
+        for offset in sorted(index['offsets'][i] for i in wanted):
+            f.seek(offset)
+            yield ChallengeData.model_validate_json(f.readline())
+
+
+# SUITE
+
+
+class Suite:
+    """
+    Lazily read, re-iterable collection of challenges; every iteration re-reads the files.
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_SUITE, ids: Iterable[str] = None, tags: Iterable[str] = None):
+        """
+        :param path: suite file (.jsonl / .yaml / .yml) or a directory of them
+        :param ids: only these challenges
+        :param tags: only challenges having at least one of these tags
+        """
+        self.path = Path(path)
+        self.ids = set(ids) if ids is not None else None
+        self.tags = set(tags) if tags is not None else None
+
+    def files(self) -> list[Path]:
+        if self.path.is_dir():
+            return sorted(p for p in self.path.iterdir() if p.suffix in ('.jsonl', '.yaml', '.yml'))
+        return [self.path]
+
+    def _matches(self, ch: ChallengeData) -> bool:
+        return (self.ids is None or ch.id in self.ids) and (self.tags is None or not self.tags.isdisjoint(ch.tags))
+
+    def __iter__(self) -> Iterator[ChallengeData]:
+        filtered = self.ids is not None or self.tags is not None
+        for p in self.files():
+            if p.suffix == '.jsonl':
+                items = _iter_jsonl_indexed(p, self.ids, self.tags) if filtered else _iter_jsonl(p)
+            else:
+                items = (ch for ch in _iter_yaml(p) if self._matches(ch))
+            yield from items
+
+    def __repr__(self):
+        return f'Suite({str(self.path)!r}, ids={self.ids}, tags={self.tags})'
@@ -0,0 +1,290 @@
+"""
+File uploads shared by batch jobs and file analysis: content-addressed, deduplicated, concurrent and streamed.
+
+Every upload is recorded in a local index (`uploads.json`) under the sha256 of the file contents, the provider
+(`base_url`) and the purpose. Uploading a file whose contents were uploaded before returns the recorded remote file
+without transferring anything, so re-running a job over the same files performs zero uploads - provided the remote
+file still exists: records close to their `expires_at` are dropped, and each reused file is checked once per process
+(`verify`); deleted ones are uploaded again. Concurrent uploads of the same contents share one request. Files are
+streamed from disk (the handle is passed to the client and closed afterwards); files above the provider's
+single-request limit go through the multipart Uploads API. `prune` deletes remote files the index no longer needs.
+
+Reuses only update the index in memory; it is written at most every `SAVE_INTERVAL` seconds, on every new upload and
+on `flush` (called by `upload_many` and at exit).
+
+    f = upload_file(client, 'faktura2.pdf', purpose='user_data')
+    files = asyncio.run(upload_files(async_client, Path('invoices').glob('*.pdf'), purpose='user_data'))
+"""
+import asyncio
+import atexit
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
+
+from loguru import logger
+from pydantic import BaseModel
+
+from ai_2025.singleflight import SingleFlight
+
+if TYPE_CHECKING:  # the SDK is imported when the first client is created (see `clients`)
+    from openai import AsyncOpenAI, OpenAI
+    from openai.types import FileObject
+
+INDEX_FILE = Path('uploads.json')
+MAX_FILE_BYTES = 512 * 2 ** 20  # larger files go through the multipart Uploads API (openai)
+HASH_CHUNK = 2 ** 20
+SAVE_INTERVAL = 5.0  # seconds between index writes caused by reuses alone
+EXPIRY_MARGIN = 3600  # seconds; a recorded file expiring sooner is uploaded again
+
+
+def file_sha256(path: str | Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _mime_type(path: Path) -> str:
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+class UploadRecord(BaseModel):
+    sha256: str
+    base_url: str
+    purpose: str
+    file: dict  # FileObject as returned by the provider
+    paths: list[str] = []  # local files with these contents
+    uploaded_at: float
+    last_used: float
+
+    @property
+    def file_id(self) -> str:
+        return self.file['id']
+
+    def expiring(self, now: float) -> bool:
+        return (expires_at := self.file.get('expires_at')) is not None and expires_at < now + EXPIRY_MARGIN
+
+
+class UploadIndex(BaseModel):
+    records: dict[str, UploadRecord] = {}
+
+
+def _key(base_url: str, purpose: str, sha256: str) -> str:
+    return f'{base_url}|{purpose}|{sha256}'
+
+
+class Uploads:
+    def __init__(self, index_file: str | Path = INDEX_FILE, verify: bool = True):
+        """
+        :param verify: check that a recorded file still exists remotely (once per process) before reusing it
+        """
+        self.index_file = Path(index_file)
+        self.index = UploadIndex.model_validate_json(self.index_file.read_text()) if self.index_file.exists() \
+            else UploadIndex()
+        self.verify = verify
+        self._verified: set[str] = set()  # file ids
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+
+    def _save(self) -> None:
+        tmp = self.index_file.with_suffix('.tmp')
+        tmp.write_text(self.index.model_dump_json(indent=2))
+        os.replace(tmp, self.index_file)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def flush(self) -> None:
+        """
+        Writes the index if reuses changed it since the last write.
+        """
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def _lookup(self, base_url: str, purpose: str, sha256: str, path: Path) -> 'FileObject | None':
+        from openai.types import FileObject
+
+        k, now = _key(base_url, purpose, sha256), time.time()
+        with self._lock:
+            if (r := self.index.records.get(k)) is None:
+                return None
+            if r.expiring(now):
+                logger.debug(f'{r.file_id} expires soon, uploading {path} again')
+                del self.index.records[k]
+                self._save()
+                return None
+            r.last_used = now
+            if str(path) not in r.paths:
+                r.paths.append(str(path))
+            self._dirty = True
+            if time.monotonic() - self._saved_at > SAVE_INTERVAL:
+                self._save()
+            return FileObject.model_construct(**r.file)  # as the client does: newer purposes are not in the literal
+
+    def _record(self, base_url: str, purpose: str, sha256: str, path: Path, file: 'FileObject') -> None:
+        now = time.time()
+        with self._lock:
+            self.index.records[_key(base_url, purpose, sha256)] = UploadRecord(
+                sha256=sha256, base_url=base_url, purpose=purpose, file=file.model_dump(), paths=[str(path)],
+                uploaded_at=now, last_used=now)
+            self._save()
+
+    def _gone(self, base_url: str, purpose: str, sha256: str, f: 'FileObject') -> None:
+        logger.warning(f'{f.id} no longer exists remotely, uploading again')
+        with self._lock:
+            self.index.records.pop(_key(base_url, purpose, sha256), None)
+            self._save()
+
+    # UPLOAD
+
+    def upload(self, client: 'OpenAI', path: str | Path, purpose: str = 'batch') -> 'FileObject':
+        """
+        Uploads `path` unless the same contents were already uploaded to this provider for this purpose.
+        :param purpose: "batch" or "user_data"
+        """
+        path = Path(path)
+        sha256, base_url = file_sha256(path), str(client.base_url)
+        f, shared = self._flights.do(_key(base_url, purpose, sha256),
+                                     lambda: self._upload(client, path, purpose, sha256, base_url))
+        if shared:  # records this path too
+            self._lookup(base_url, purpose, sha256, path)
+        return f
+
+    def _upload(self, client: 'OpenAI', path: Path, purpose: str, sha256: str, base_url: str) -> 'FileObject':
+        import openai
+
+        if (f := self._lookup(base_url, purpose, sha256, path)) is not None:
+            try:
+                if self.verify and f.id not in self._verified:
+                    client.files.retrieve(f.id)
+                    self._verified.add(f.id)
+                logger.debug(f'{path} already uploaded as {f.id}')
+                return f
+            except openai.NotFoundError:
+                self._gone(base_url, purpose, sha256, f)
+        size = path.stat().st_size
+        logger.info(f'uploading {path} ({size} bytes)')
+        if size > MAX_FILE_BYTES:
+            f = client.uploads.upload_file_chunked(file=path, bytes=size, purpose=purpose,
+                                                   mime_type=_mime_type(path)).file
+        else:
+            with open(path, 'rb') as fh:  # streamed by the http client, not read whole
+                f = client.files.create(file=fh, purpose=purpose)
+        self._record(base_url, purpose, sha256, path, f)
+        self._verified.add(f.id)
+        return f
+
+    async def aupload(self, client: 'AsyncOpenAI', path: str | Path, purpose: str = 'batch') -> 'FileObject':
+        path = Path(path)
+        sha256 = await asyncio.to_thread(file_sha256, path)
+        base_url = str(client.base_url)
+        f, shared = await self._flights.ado(_key(base_url, purpose, sha256),
+                                            lambda: self._aupload(client, path, purpose, sha256, base_url))
+        if shared:
+            self._lookup(base_url, purpose, sha256, path)
+        return f
+
+    async def _aupload(self, client: 'AsyncOpenAI', path: Path, purpose: str, sha256: str,
+                       base_url: str) -> 'FileObject':
+        import openai
+
+        if (f := self._lookup(base_url, purpose, sha256, path)) is not None:
+            try:
+                if self.verify and f.id not in self._verified:
+                    await client.files.retrieve(f.id)
+                    self._verified.add(f.id)
+                logger.debug(f'{path} already uploaded as {f.id}')
+                return f
+            except openai.NotFoundError:
+                self._gone(base_url, purpose, sha256, f)
+        size = path.stat().st_size
+        logger.info(f'uploading {path} ({size} bytes)')
+        if size > MAX_FILE_BYTES:
+            f = (await client.uploads.upload_file_chunked(file=path, bytes=size, purpose=purpose,
+                                                          mime_type=_mime_type(path))).file
+        else:
+            with open(path, 'rb') as fh:
+                f = await client.files.create(file=fh, purpose=purpose)
+        self._record(base_url, purpose, sha256, path, f)
+        self._verified.add(f.id)
+        return f
+
+    async def upload_many(self, client: 'AsyncOpenAI', paths: Iterable[str | Path], purpose: str = 'batch',
+                          max_parallel: int = 4) -> list['FileObject']:
+        """
+        Uploads files concurrently (at most `max_parallel` at a time); results are in `paths` order.
+        """
+        semaphore = asyncio.Semaphore(max_parallel)
+
+        async def one(p):
+            async with semaphore:
+                return await self.aupload(client, p, purpose)
+
+        try:
+            return list(await asyncio.gather(*(one(p) for p in paths)))
+        finally:
+            self.flush()
+
+    # CLEANUP
+
+    def prune(self, client: 'OpenAI', max_age_days: float | None = 30, referenced: Iterable[str] = ()) -> int:
+        """
+        Deletes remote files of this provider that are no longer referenced: none of their local files still has the
+        same contents, or they were not used for `max_age_days`. File ids in `referenced` are always kept.
+        :return: number of deleted files
+        """
+        import openai
+
+        base_url, now, keep = str(client.base_url), time.time(), set(referenced)
+        with self._lock:
+            records = [(k, r) for k, r in self.index.records.items() if r.base_url == base_url]
+        deleted = 0
+        for k, r in records:
+            if r.file_id in keep:
+                continue
+            stale = max_age_days is not None and now - r.last_used > max_age_days * 86400
+            if not stale and any(Path(p).exists() and file_sha256(p) == r.sha256 for p in r.paths):
+                continue
+            try:
+                client.files.delete(r.file_id)
+            except openai.NotFoundError:
+                pass  # already gone (expired or deleted elsewhere)
+            logger.info(f'deleted remote file {r.file_id} ({", ".join(r.paths)})')
+            with self._lock:
+                self.index.records.pop(k, None)
+                self._save()
+            deleted += 1
+        return deleted
+
+
+_uploads: Uploads | None = None
+
+
+def default_uploads() -> Uploads:
+    global _uploads
+    if _uploads is None:
+        _uploads = Uploads()
+        atexit.register(_uploads.flush)
+    return _uploads
+
+
+def upload_file(client: 'OpenAI', path: str | Path, purpose: str = 'batch') -> 'FileObject':
+    return default_uploads().upload(client, path, purpose)
+
+
+async def upload_files(client: 'AsyncOpenAI', paths: Iterable[str | Path], purpose: str = 'batch',
+                       max_parallel: int = 4) -> list['FileObject']:
+    return await default_uploads().upload_many(client, paths, purpose, max_parallel)
+
+
+if __name__ == '__main__':
+    from ai_2025.common import AI_MODELS, model_client
+
+    print(default_uploads().prune(model_client(AI_MODELS['gpt-simple'])))
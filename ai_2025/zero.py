@@ -3,10 +3,7 @@ import json
 
 def call_it():
     with open('res.json') as f:
-        lines = f.readlines()
-        w = ''.join([l.strip() for l in lines])
-        print(w)
-        d = json.loads(w)
+        d = json.load(f)
         print(d)
         print(d['cities'])
 
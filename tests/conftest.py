@@ -0,0 +1,30 @@
+import pytest
+
+from ai_2025.common import AI_MODELS
+from ai_2025.standin_server import STANDIN_KEY_NAME, Latency, StandinConfig, serve_in_background, use_standin
+from ai_2025.suite import DEFAULT_SUITE
+
+
+@pytest.fixture
+def standin(monkeypatch, tmp_path):
+    """
+    Starts a stand-in server and points every AI_MODELS entry at it (client-side rate limits off) for one test; the
+    test runs in `tmp_path`, where uploads, batch state and downloads are written.
+    :return: function taking StandinConfig fields, returning the server's base_url
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(STANDIN_KEY_NAME, 'standin')
+    saved = dict(AI_MODELS)
+    servers = []
+
+    def start(**config) -> str:
+        config = {'latency': Latency(kind='fixed', a=0.05), 'suite': str(DEFAULT_SUITE), 'seed': 1} | config
+        server, url = serve_in_background(StandinConfig(**config))
+        servers.append(server)
+        use_standin(url)
+        return url
+
+    yield start
+    AI_MODELS.update(saved)
+    for server in servers:
+        server.shutdown()
@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import pytest
+
+from ai_2025 import uploads
+from ai_2025.batch_chunking import ChunkedBatchJob, iter_lines, split_requests
+from ai_2025.batch_eval import compile_batch
+from ai_2025.batch_results import BatchResultsFile
+from ai_2025.suite import Suite
+
+
+def _lines(n: int, size: int = 0) -> list[bytes]:
+    return [json.dumps({'custom_id': f'r{i}', 'body': 'x' * size}).encode() + b'\n' for i in range(n)]
+
+
+def test_split_by_count(tmp_path):
+    parts = split_requests(_lines(10), tmp_path, max_requests=4)
+    assert [len(list(iter_lines(p))) for p in parts] == [4, 4, 2]
+    assert b''.join(line for p in parts for line in iter_lines(p)) == b''.join(_lines(10))
+
+
+def test_split_by_bytes(tmp_path):
+    lines = _lines(10, size=100)
+    parts = split_requests(lines, tmp_path, max_bytes=len(lines[0]) * 3 + 1)
+    assert [len(list(iter_lines(p))) for p in parts] == [3, 3, 3, 1]
+    with pytest.raises(ValueError):
+        split_requests(lines, tmp_path, max_bytes=10)
+
+
+def _job(**kwargs) -> ChunkedBatchJob:
+    job = ChunkedBatchJob('in.jsonl', work_dir='job', max_requests=4, **kwargs)
+    job.poller.min_interval = 0.1
+    return job
+
+
+def test_failed_requests_are_resubmitted(standin):
+    standin(error_rate=0.3)  # of batch requests
+    n = compile_batch(Suite(), 'gpt-simple', 'in.jsonl')
+    job = _job(max_rounds=10)
+    merged = asyncio.run(job.run())
+
+    rounds = job.state.rounds
+    assert len(rounds) > 1
+    for previous, r in zip(rounds, rounds[1:]):  # each round holds exactly what failed in the previous one
+        assert {json.loads(line)['custom_id'] for p in r.parts for line in iter_lines(p)} == job._failed_ids(previous)
+    with BatchResultsFile(merged) as m:
+        ids = [r.custom_id for r in m]
+        assert all(r.ok for r in m)
+    assert ids == [json.loads(line)['custom_id'] for line in iter_lines('in.jsonl')]  # input order
+    assert len(ids) == n
+
+
+def test_resume_submits_only_parts_without_a_batch(standin, monkeypatch):
+    standin()
+    n = compile_batch(Suite(), 'gpt-simple', 'in.jsonl')
+    aupload = uploads.Uploads.aupload
+
+    async def broken(self, client, path, purpose='batch'):
+        if str(path).endswith('round0-0001.jsonl'):
+            raise RuntimeError('upload broke')
+        return await aupload(self, client, path, purpose)
+
+    monkeypatch.setattr(uploads.Uploads, 'aupload', broken)
+    with pytest.raises(RuntimeError):
+        asyncio.run(_job().run())
+    saved = json.loads(open('job/job.json').read())['rounds'][0]
+    assert len(saved['parts']) == 4
+    assert sorted(saved['batches']) == [p for i, p in enumerate(saved['parts']) if i != 1]  # saved despite the error
+
+    monkeypatch.setattr(uploads.Uploads, 'aupload', aupload)
+    job = _job()
+    merged = asyncio.run(job.run())
+    assert {p: b for p, b in job.state.rounds[0].batches.items() if p in saved['batches']} == saved['batches']
+    assert len(job.state.rounds[0].batches) == 4
+    with BatchResultsFile(merged) as m:
+        assert len(m) == n and all(r.ok for r in m)
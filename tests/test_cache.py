@@ -0,0 +1,25 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_2025.cache import CacheEntry, ResponseCache
+
+
+def entry(key: str, content: str = 'Warsaw') -> CacheEntry:
+    return CacheEntry(key=key, model_name='m', content=content, cost={}, created_at=time.time())
+
+
+def on_disk(cache: ResponseCache) -> int:
+    return sum(p.stat().st_size for p in cache.directory.glob('??/*.json'))
+
+
+def test_size_counts_overwritten_entries_once(tmp_path):
+    cache = ResponseCache(tmp_path)
+    assert cache.size() == 0
+    cache.put(entry('ab1'))
+    cache.put(entry('ab1', 'Warsaw, the capital'))  # refresh
+    cache.put(entry('cd2'))
+    assert cache.size() == on_disk(cache)
+
+    with ThreadPoolExecutor(8) as pool:  # racing writers of the same keys
+        list(pool.map(lambda i: cache.put(entry(f'ef{i % 3}')), range(64)))
+    assert cache.size() == on_disk(cache)
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from ai_2025.dispatch import Dispatcher, items_from_prompts, items_from_suite, parse_deadline
+from ai_2025.suite import Suite
+
+
+def run(d: Dispatcher, timeout: float = 60.0) -> list:
+    async def collect():
+        return [r async for r in d.results()]
+
+    return asyncio.run(asyncio.wait_for(collect(), timeout))
+
+
+def assert_each_once(d: Dispatcher, results: list) -> None:
+    assert sorted(r.id for r in results) == sorted(it.id for it in d.items)
+
+
+def test_parse_deadline():
+    assert [parse_deadline(v) for v in ['90', '90s', '45m', '6h', '1d']] == [90, 90, 2700, 21600, 86400]
+
+
+def test_plan():
+    items = items_from_suite(Suite(), 'gpt-simple') + items_from_prompts({'p1': 'x'}, 'grok-simple')
+    batch, sync = Dispatcher(items, deadline=6 * 3600).plan()
+    assert {it.model for it in batch} == {'gpt-simple'} and [it.id for it in sync] == ['p1']
+    assert Dispatcher(items, deadline=6 * 3600, prefer='fastest').plan() == ([], items)
+    assert Dispatcher(items, deadline=600).plan() == ([], items)  # no time for a batch turnaround
+    with pytest.raises(ValueError):
+        Dispatcher(items + items[:1], deadline=3600).plan()
+
+
+def test_batch_path(standin):
+    standin()
+    d = Dispatcher(items_from_suite(Suite(), 'gpt-simple'), deadline=3600, chunk_size=4, batch_turnaround=1,
+                   poll_interval=0.1)
+    results = run(d)
+    assert_each_once(d, results)
+    assert {r.path for r in results} == {'batch'}
+    assert d.stats.batches == 4 and d.stats.batch == len(results)
+    assert all(r.score is not None and r.error is None for r in results)
+    assert d.stats.sync_cost_usd == pytest.approx(d.stats.cost_usd * 2)
+
+
+def test_sync_path(standin):
+    standin()
+    d = Dispatcher(items_from_suite(Suite(), 'gpt-simple'), deadline=60, concurrency=4)
+    results = run(d)
+    assert_each_once(d, results)
+    assert {r.path for r in results} == {'sync'}
+    assert d.stats.batches == 0
+
+
+def test_deadline_moves_batches_to_sync(standin):
+    standin(batch_request_delay=1.0)  # a batch of 5 takes 5s, more than the deadline
+    d = Dispatcher(items_from_suite(Suite(), 'gpt-simple'), deadline=4, chunk_size=5, batch_turnaround=1,
+                   poll_interval=0.1)
+    results = run(d)
+    assert_each_once(d, results)
+    assert d.stats.cancelled_batches > 0 and d.stats.moved > 0
+    assert d.stats.sync > 0 and d.stats.sync + d.stats.batch == len(results)
+
+
+def test_unpollable_batches_are_run_sync(standin, monkeypatch):
+    standin()
+
+    async def broken(self, c):
+        raise ConnectionError('no route')
+
+    monkeypatch.setattr(Dispatcher, '_check', broken)
+    d = Dispatcher(items_from_suite(Suite(), 'gpt-simple'), deadline=3600, chunk_size=4, batch_turnaround=1,
+                   poll_interval=0.1, poll_retries=2)
+    results = run(d)
+    assert_each_once(d, results)
+    assert {r.path for r in results} == {'sync'}
+    assert all(c.abandoned for c in d.chunks)
+
+
+def test_failing_background_task_is_raised(standin, monkeypatch):
+    standin()
+
+    def broken(self):
+        raise RuntimeError('rebalance broke')
+
+    monkeypatch.setattr(Dispatcher, '_rebalance', broken)
+    d = Dispatcher(items_from_suite(Suite(), 'gpt-simple'), deadline=3600, batch_turnaround=1, poll_interval=0.1)
+    with pytest.raises(RuntimeError, match='rebalance broke'):
+        run(d)
+
+
+def test_failed_submission_is_run_sync(standin, monkeypatch):
+    standin()
+    create_batch, calls = Dispatcher._create_batch, []
+
+    async def flaky(self, c, n):
+        calls.append(n)
+        if n == 1:
+            raise ConnectionError('upload failed')
+        await create_batch(self, c, n)
+
+    monkeypatch.setattr(Dispatcher, '_create_batch', flaky)
+    d = Dispatcher(items_from_suite(Suite(), 'gpt-simple'), deadline=3600, chunk_size=4, batch_turnaround=1,
+                   poll_interval=0.1)
+    results = run(d)
+    assert_each_once(d, results)
+    assert sorted(calls) == list(range(len(d.chunks)))
+    assert d.chunks[1].abandoned and d.chunks[1].batch_id is None
+    assert sorted(r.id for r in results if r.path == 'sync') == sorted(d.chunks[1].items)
+    assert d.stats.batches == len(d.chunks) - 1 and d.stats.moved == len(d.chunks[1].items)
@@ -0,0 +1,35 @@
+import json
+import time
+
+from ai_2025.invoices import Invoice, InvoiceRecord, JsonlSink
+
+
+def record(path: str, ok: bool = True) -> InvoiceRecord:
+    return InvoiceRecord(path=path, invoice=Invoice(nr_faktury=f'FV/{path}') if ok else None,
+                         error=None if ok else 'boom', processed_at=time.time())
+
+
+def test_jsonl_resumes_after_a_partial_last_line(tmp_path):
+    out = tmp_path / 'out.jsonl'
+    lines = [record('a.pdf').model_dump_json(), record('b.pdf', ok=False).model_dump_json()]
+    out.write_text('\n'.join(lines) + '\n' + record('c.pdf').model_dump_json()[:40], encoding='utf-8')
+
+    sink = JsonlSink(out)
+    assert sink.done() == {'a.pdf'}
+    sink.write(record('c.pdf'))
+    sink.write(record('b.pdf'))
+    sink.close()
+
+    assert [json.loads(line)['path'] for line in out.read_text(encoding='utf-8').splitlines()] == \
+        ['a.pdf', 'b.pdf', 'c.pdf', 'b.pdf']
+    sink = JsonlSink(out)
+    assert sink.done() == {'a.pdf', 'b.pdf', 'c.pdf'}
+    sink.close()
+
+
+def test_jsonl_skips_undecodable_lines(tmp_path):
+    out = tmp_path / 'out.jsonl'
+    out.write_text('{"path": "a.pdf", "invo\n' + record('b.pdf').model_dump_json() + '\n', encoding='utf-8')
+    sink = JsonlSink(out)
+    assert sink.done() == {'b.pdf'}
+    sink.close()
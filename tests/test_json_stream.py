@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+from ai_2025.json_stream import KeyExtractor
+
+
+def feed_in_chunks(x: KeyExtractor, text: str, size: int) -> int:
+    """
+    Feeds `text` in pieces of `size` characters until the extractor is done; returns the characters consumed.
+    """
+    for i in range(0, len(text), size):
+        if x.feed(text[i:i + size]):
+            return min(i + size, len(text))
+    return len(text)
+
+
+CHUNK_SIZES = [1, 2, 3, 7, 1000]
+
+
+@pytest.mark.parametrize('size', CHUNK_SIZES)
+@pytest.mark.parametrize('value', [
+    'Naypyidaw',
+    42,
+    -3.5e2,
+    True,
+    None,
+    [1, 2, 3],
+    {'city': 'Naypyidaw', 'country': 'Myanmar'},
+])
+def test_value_types(size, value):
+    x = KeyExtractor('answer')
+    feed_in_chunks(x, json.dumps({'answer': value, 'why': 'because'}), size)
+    assert x.found and x.done
+    assert x.value == value
+
+
+@pytest.mark.parametrize('size', CHUNK_SIZES)
+def test_scalar_closed_by_object_end(size):
+    x = KeyExtractor('answer')
+    feed_in_chunks(x, '{"why": "x", "answer": 17}', size)
+    assert x.found and x.value == 17
+
+
+@pytest.mark.parametrize('size', CHUNK_SIZES)
+@pytest.mark.parametrize('value', [
+    'say "hi"',
+    'back\\slash',
+    'ends with backslash \\',
+    'brace } and bracket ] and comma , inside',
+    'unicode łódź and \n newline',
+])
+def test_escapes_in_value(size, value):
+    x = KeyExtractor('answer')
+    text = json.dumps({'answer': value})
+    feed_in_chunks(x, text, size)
+    assert x.value == value
+    x = KeyExtractor('answer')
+    feed_in_chunks(x, json.dumps({'answer': value}, ensure_ascii=False), size)
+    assert x.value == value
+
+
+@pytest.mark.parametrize('size', CHUNK_SIZES)
+def test_escaped_key(size):
+    x = KeyExtractor('an"swer')
+    feed_in_chunks(x, json.dumps({'answer': 1, 'an"swer': 2}), size)
+    assert x.value == 2
+
+
+@pytest.mark.parametrize('size', CHUNK_SIZES)
+def test_nested_value(size):
+    value = {'a': [1, {'b': '}]"{['}, []], 'c': {'d': {'e': None}}}
+    x = KeyExtractor('answer')
+    feed_in_chunks(x, json.dumps({'answer': value, 'rest': [1, 2]}), size)
+    assert x.value == value
+
+
+@pytest.mark.parametrize('size', CHUNK_SIZES)
+def test_same_key_nested_deeper_is_ignored(size):
+    x = KeyExtractor('answer')
+    feed_in_chunks(x, json.dumps({'meta': {'answer': 'inner'}, 'list': [{'answer': 0}], 'answer': 'outer'}), size)
+    assert x.value == 'outer'
+
+
+@pytest.mark.parametrize('size', CHUNK_SIZES)
+def test_prose_and_code_fence_before_object(size):
+    x = KeyExtractor('answer')
+    feed_in_chunks(x, 'Sure! Here it is:\n```json\n{"answer": "x"}\n```', size)
+    assert x.found and x.value == 'x'
+
+
+def test_stops_reading_after_value():
+    x = KeyExtractor('answer')
+    text = '{"answer": "Naypyidaw", "why": "' + 'long explanation ' * 100 + '"}'
+    consumed = feed_in_chunks(x, text, 5)
+    assert x.value == 'Naypyidaw'
+    assert consumed < 30
+    assert x.feed('anything') is True  # further input is ignored
+
+
+@pytest.mark.parametrize('size', CHUNK_SIZES)
+def test_missing_key(size):
+    x = KeyExtractor('answer')
+    feed_in_chunks(x, json.dumps({'reply': 'x', 'nested': {'answer': 1}}), size)
+    assert x.done and not x.found
+    assert x.value is None
+
+
+def test_incomplete_input():
+    x = KeyExtractor('answer')
+    assert x.feed('{"answer": "Nay') is False
+    assert not x.done and not x.found
+    assert x.buffer == '{"answer": "Nay'
+
+
+@pytest.mark.parametrize('size', CHUNK_SIZES)
+@pytest.mark.parametrize('text', ['{"answer": True, "why": "x"}', '{"answer": None}', "{\"answer\": 'Warsaw'}"])
+def test_python_literal_is_not_found(size, text):
+    x = KeyExtractor('answer')
+    feed_in_chunks(x, text, size)
+    assert x.done and not x.found
+    assert x.value is None
@@ -0,0 +1,127 @@
+import asyncio
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ai_2025.common import AI_MODELS, CallCost, call_ai_model_async, prompt_for_json
+from ai_2025.pricing import BudgetExceeded, CostLedger, RunBudget, active_budget, budget_scope, estimate_call, \
+    run_budget
+
+PROMPT = prompt_for_json('What is the capital of Poland?', 'answer')
+
+
+def estimate(model: str) -> float:
+    return estimate_call(AI_MODELS[model].model_name, PROMPT)
+
+
+def test_admit_reserves_and_settle_records():
+    budget = RunBudget(1.0)
+    model, reserved = budget.admit('gpt-simple', PROMPT)
+    assert model == 'gpt-simple'
+    assert reserved == pytest.approx(estimate('gpt-simple'))
+    assert budget.remaining() == pytest.approx(1.0 - reserved)
+
+    cost = CallCost(prompt_tokens=1000, completion_tokens=100)
+    budget.settle(model, reserved, cost, label='q1')
+    assert budget.remaining() == pytest.approx(1.0 - (1000 * 2 + 100 * 8) / 1e6)
+    assert budget.ledger.calls == 1
+    assert budget.ledger.by_label == {'q1': pytest.approx(budget.ledger.total)}
+
+
+def test_failed_call_releases_the_reservation():
+    budget = RunBudget(1.0)
+    model, reserved = budget.admit('gpt-simple', PROMPT)
+    budget.settle(model, reserved, None)
+    assert budget.remaining() == pytest.approx(1.0)
+    assert budget.ledger.calls == 0
+
+
+def test_downgrade_when_the_model_does_not_fit():
+    budget = RunBudget((estimate('gpt') + estimate('gpt-simple')) / 2)
+    assert budget.admit('gpt', PROMPT)[0] == 'gpt-simple'
+    with pytest.raises(BudgetExceeded):
+        RunBudget(budget.limit_usd, downgrade=False).admit('gpt', PROMPT)
+
+
+def test_refused_when_nothing_fits():
+    budget = RunBudget(estimate('gpt-simple') * 2.5)
+    budget.admit('gpt', PROMPT)  # downgraded
+    budget.admit('gpt', PROMPT)
+    with pytest.raises(BudgetExceeded):
+        budget.admit('gpt', PROMPT)
+
+
+def test_unpriced_model():
+    assert estimate('qwen') is None
+    assert RunBudget(0.01).admit('qwen', PROMPT) == ('qwen', 0.0)
+    with pytest.raises(BudgetExceeded):
+        RunBudget(0.01, strict=True).admit('qwen', PROMPT)
+
+
+def test_concurrent_admissions_never_overbook():
+    budget = RunBudget(estimate('gpt-simple') * 10.5, downgrade=False)
+    barrier = threading.Barrier(32)
+
+    def admit(_):
+        barrier.wait()
+        try:
+            return budget.admit('gpt-simple', PROMPT)
+        except BudgetExceeded:
+            return None
+
+    with ThreadPoolExecutor(32) as pool:
+        admitted = [r for r in pool.map(admit, range(32)) if r is not None]
+    assert len(admitted) == 10
+    assert budget.remaining() >= 0
+
+
+def test_replayed_and_coalesced_calls_cost_nothing():
+    ledger = CostLedger()
+    cost = CallCost(prompt_tokens=1000, completion_tokens=100)
+    ledger.record('gpt-4.1-2025-04-14', cost)
+    ledger.record('gpt-4.1-2025-04-14', cost.model_copy(update={'replayed': True}))
+    ledger.record('gpt-4.1-2025-04-14', cost.model_copy(update={'coalesced': True}))
+    assert ledger.calls == 3
+    assert ledger.total == pytest.approx(0.0028)
+    assert ledger.replayed == pytest.approx(0.0028)
+    assert ledger.coalesced == pytest.approx(0.0028)
+
+
+def test_cached_tokens_are_discounted():
+    ledger = CostLedger()
+    ledger.record('gpt-4.1-2025-04-14', CallCost(prompt_tokens=1000, completion_tokens=0, cached_prompt_tokens=800))
+    assert ledger.total == pytest.approx((200 * 2 + 800 * 0.5) / 1e6)
+    assert ledger.cache_hit_ratio() == pytest.approx(0.8)
+
+
+def test_run_budget():
+    assert math.isinf(run_budget(None).limit_usd)
+    with budget_scope(RunBudget(2.0)) as outer:
+        assert active_budget() is outer
+        assert run_budget(None) is outer
+        assert run_budget(1.0) is not outer
+    assert active_budget() is not outer
+
+
+def test_budget_scope_applies_to_model_calls(standin):
+    standin()
+
+    async def main():
+        with budget_scope(RunBudget(1.0)) as budget:
+            await asyncio.gather(*(call_ai_model_async('gpt-simple', prompt_for_json(f'question {i}', 'answer'),
+                                                       'answer') for i in range(3)))
+        return budget
+
+    budget = asyncio.run(main())
+    assert budget.ledger.calls == 3
+    assert budget.ledger.total > 0
+    assert budget.remaining() == pytest.approx(1.0 - budget.ledger.total)  # no reservation left behind
+
+    async def refused():
+        with budget_scope(RunBudget(estimate('gpt-simple') / 2)):
+            await call_ai_model_async('gpt-simple', PROMPT, 'answer')
+
+    with pytest.raises(BudgetExceeded):
+        asyncio.run(refused())
@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+
+from ai_2025.common import call_ai_model, call_ai_model_async, prompt_for_json
+
+PROMPT = prompt_for_json('What is the capital of Poland?', 'answer')
+
+
+def test_group_call(standin):
+    standin()
+    answer, cost = call_ai_model('simple-any', PROMPT, 'answer')
+    assert answer and cost.prompt_tokens > 0
+
+
+def test_sync_group_call_inside_a_running_loop(standin):
+    standin()
+
+    async def main():
+        with pytest.raises(RuntimeError, match='call_ai_model_async'):
+            call_ai_model('simple-any', PROMPT, 'answer')
+        return await call_ai_model_async('simple-any', PROMPT, 'answer')
+
+    answer, _ = asyncio.run(main())
+    assert answer
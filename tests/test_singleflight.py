@@ -0,0 +1,177 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ai_2025.clients import get_async_client, get_client
+from ai_2025.common import call_ai_model_async, prompt_for_json
+from ai_2025.singleflight import SingleFlight, default_flights, flight_key
+from ai_2025.standin_server import STANDIN_KEY_NAME, Latency
+
+SLOW = Latency(kind='fixed', a=0.3)  # long enough for every caller to join the first one's request
+
+
+def _request(question: str = 'What is the capital of Poland?') -> dict:
+    return {'model': 'gpt-4.1-2025-04-14', 'messages': prompt_for_json(question, 'answer')}
+
+
+def test_flight_key_is_exact_content():
+    board = [{'role': 'user', 'content': 'x| |o\n |x| \n | |o'}]
+    shifted = [{'role': 'user', 'content': 'x| |o\n|x| \n | |o'}]
+    assert flight_key('m', board) != flight_key('m', shifted)
+    assert flight_key('m', [{'role': 'user', 'content': 'def f():\n    return 1'}]) != \
+        flight_key('m', [{'role': 'user', 'content': 'def f():\n  return 1'}])
+    assert flight_key('m', board) == flight_key('m', [{'role': 'user', 'content': '  x| |o\n |x| \n | |o\n'}])
+    assert flight_key('m', board) != flight_key('m', board, {'temperature': 0})
+    assert flight_key('m', board) != flight_key('m', board, stream_key='answer')
+
+
+# SYNC
+
+
+def test_do_coalesces_overlapping_calls(standin):
+    client = get_client(standin(latency=SLOW), STANDIN_KEY_NAME)
+    sf, upstream = SingleFlight(), []
+
+    def fn():
+        upstream.append(1)
+        return client.chat.completions.create(**_request()).id
+
+    barrier = threading.Barrier(5)
+
+    def caller(_):
+        barrier.wait()
+        return sf.do('k', fn)
+
+    with ThreadPoolExecutor(5) as pool:
+        res = list(pool.map(caller, range(5)))
+    assert len(upstream) == 1
+    assert len({r for r, _ in res}) == 1
+    assert sorted(shared for _, shared in res) == [False, True, True, True, True]
+    assert (sf.stats.upstream, sf.stats.coalesced) == (1, 4)
+
+    r, shared = sf.do('k', fn)  # finished flights are not remembered
+    assert not shared and r not in {r for r, _ in res}
+    assert len(upstream) == 2
+
+
+def test_do_error_reaches_every_caller():
+    sf, started = SingleFlight(), threading.Event()
+
+    def fn():
+        started.set()
+        threading.Event().wait(0.2)
+        raise RuntimeError('upstream broke')
+
+    def follower():
+        started.wait()
+        return sf.do('k', fn)
+
+    with ThreadPoolExecutor(3) as pool:
+        leader = pool.submit(sf.do, 'k', fn)
+        followers = [pool.submit(follower) for _ in range(2)]
+        for f in [leader, *followers]:
+            with pytest.raises(RuntimeError, match='upstream broke'):
+                f.result()
+    assert sf.stats.upstream == 1
+    assert sf.do('k', lambda: 1) == (1, False)
+
+
+# ASYNC
+
+
+def test_ado_coalesces_model_calls(standin):
+    standin(latency=SLOW)
+    before = default_flights().stats.model_copy()
+    prompt = prompt_for_json('What is the capital of Poland? (coalesced)', 'answer')
+
+    async def main():
+        return await asyncio.gather(*(call_ai_model_async('gpt-simple', prompt, 'answer') for _ in range(5)))
+
+    res = asyncio.run(main())
+    assert len({answer for answer, _ in res}) == 1
+    assert [cost.coalesced for _, cost in res].count(False) == 1
+    assert len({(cost.prompt_tokens, cost.completion_tokens) for _, cost in res}) == 1
+    after = default_flights().stats
+    assert (after.upstream - before.upstream, after.coalesced - before.coalesced) == (1, 4)
+
+
+def test_ado_bypass_is_not_coalesced(standin):
+    standin(latency=SLOW)
+    prompt = prompt_for_json('What is the capital of Poland? (bypass)', 'answer')
+
+    async def main():
+        return await asyncio.gather(*(call_ai_model_async('gpt-simple', prompt, 'answer', cache_mode='bypass')
+                                      for _ in range(3)))
+
+    assert not any(cost.coalesced for _, cost in asyncio.run(main()))
+
+
+def test_ado_follower_cancellation(standin):
+    url = standin(latency=SLOW)
+    sf, upstream, cancelled = SingleFlight(), [], []
+
+    async def main():
+        client = get_async_client(url, STANDIN_KEY_NAME)
+
+        async def fn():
+            upstream.append(1)
+            try:
+                return (await client.chat.completions.create(**_request())).id
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        async def pair(key: str) -> tuple[asyncio.Task, asyncio.Task]:
+            first = asyncio.create_task(sf.ado(key, fn))
+            await asyncio.sleep(0.05)
+            second = asyncio.create_task(sf.ado(key, fn))
+            await asyncio.sleep(0.05)
+            return first, second
+
+        # a cancelled follower doesn't affect the leader
+        leader, follower = await pair('a')
+        follower.cancel()
+        assert (await leader)[1] is False
+        assert follower.cancelled()
+
+        # a cancelled leader doesn't cancel the request the follower waits for (e.g. a lost hedge)
+        leader, follower = await pair('b')
+        leader.cancel()
+        r, shared = await follower
+        assert shared and r
+        assert leader.cancelled()
+        assert not cancelled
+
+        # when every caller is gone, the request is cancelled
+        leader, follower = await pair('c')
+        leader.cancel()
+        follower.cancel()
+        await asyncio.sleep(0.05)
+        assert cancelled == [1]
+        assert not sf._async
+
+    asyncio.run(main())
+    assert len(upstream) == 3
+
+
+def test_ado_keyed_by_event_loop(standin):
+    url = standin(latency=SLOW)
+    sf, upstream = SingleFlight(), []
+    barrier = threading.Barrier(2)
+
+    async def one():
+        client = get_async_client(url, STANDIN_KEY_NAME)  # clients belong to their loop
+
+        async def fn():
+            upstream.append(1)
+            return (await client.chat.completions.create(**_request())).id
+
+        barrier.wait()
+        return await sf.ado('k', fn)
+
+    with ThreadPoolExecutor(2) as pool:
+        res = list(pool.map(lambda _: asyncio.run(one()), range(2)))
+    assert len(upstream) == 2  # same key, but a task of one loop can't be awaited from another
+    assert [shared for _, shared in res] == [False, False]
@@ -0,0 +1,18 @@
+from ai_2025.common import AI_MODELS, MODEL_GROUPS
+from ai_2025.standin_server import STANDIN_KEY_NAME, use_standin
+
+
+def test_use_standin_resolves_groups_and_drops_rate_limits(monkeypatch):
+    for name in AI_MODELS:
+        monkeypatch.setitem(AI_MODELS, name, AI_MODELS[name])  # restored afterwards
+    members = MODEL_GROUPS['simple-any']
+    use_standin('http://127.0.0.1:1/v1', ['simple-any', members[0]])
+    for name, m in AI_MODELS.items():
+        if name in members:
+            assert (m.base_url, m.key_name, m.rpm, m.tpm) == ('http://127.0.0.1:1/v1', STANDIN_KEY_NAME, None, None)
+        else:
+            assert m.base_url != 'http://127.0.0.1:1/v1'
+
+    use_standin('http://127.0.0.1:2/v1', ['gpt'], rate_limits=True)
+    assert AI_MODELS['gpt'].base_url == 'http://127.0.0.1:2/v1'
+    assert AI_MODELS['gpt'].rpm is not None
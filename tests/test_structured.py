@@ -0,0 +1,55 @@
+import pytest
+from pydantic import BaseModel
+
+from ai_2025 import common
+from ai_2025.common import CallCost, call_ai_model
+from ai_2025.structured import StructureError, parse_structured
+
+
+class Capital(BaseModel):
+    answer: str
+    country: str
+
+
+@pytest.mark.parametrize('content', [
+    '{"answer": "Warsaw"}',
+    '```json\n{"answer": "Warsaw"}\n```',
+    'Sure, here it is: {"answer": "Warsaw"} - hope it helps!',
+    '{"answer": "Warsaw", "why": "it is"} and some chatter',
+])
+def test_parse(content):
+    assert parse_structured(content, 'answer') == 'Warsaw'
+
+
+@pytest.mark.parametrize('content', [
+    '{"answer": True}',
+    "{'answer': 'Warsaw'}",
+    '{"answer": None, "why": "x"}',
+    'Warsaw',
+    '{"reply": "Warsaw"}',
+])
+def test_malformed_is_a_structure_error(content):
+    with pytest.raises(StructureError):
+        parse_structured(content, 'answer')
+
+
+def test_schema_mismatch():
+    assert parse_structured('{"answer": "Warsaw", "country": "Poland"}', 'answer', Capital) == 'Warsaw'
+    with pytest.raises(StructureError):
+        parse_structured('{"answer": "Warsaw"}', 'answer', Capital)
+
+
+def test_python_literal_gets_one_repair_pass(monkeypatch):
+    replies = iter(['{"answer": True}', '{"answer": true}'])
+    calls = []
+
+    def fake_call(client, model_name, messages, params=None, **kwargs):
+        calls.append(messages)
+        return next(replies), CallCost(prompt_tokens=10, completion_tokens=5)
+
+    monkeypatch.setattr(common, 'model_client', lambda config: None)
+    monkeypatch.setattr(common, 'cached_call_model', fake_call)
+    answer, cost = call_ai_model('gpt-simple', common.prompt_for_json('Is Warsaw in Poland?', 'answer'), 'answer')
+    assert answer is True
+    assert len(calls) == 2 and '{"answer": True}' in calls[1][-1]['content']
+    assert (cost.prompt_tokens, cost.completion_tokens) == (20, 10)